@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Incremental batch conversion of many FKB-GML files with gml_to_geojson.py.
+
+A manifest (JSON) remembers, per input file, the SHA-256 of its content,
+the converter version and the converter options it was converted with.
+On the next run only stale files are converted again:
+
+- new files, or files whose content hash changed,
+- files converted with another CONVERTER_VERSION or other options,
+- files whose output has disappeared,
+- files that failed last time (the error is kept in the manifest).
+
+Stale files are converted in parallel, one file per process. Everything
+after `--` is passed on to gml_to_geojson.py unchanged.
+
+Example:
+
+    python dataManipulation/batch_convert.py "input/*.gml" --output-dir output \
+        --workers 8 -- --stream --precision 6
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from file_hash import file_sha256
+from geojson_writer import FORMAT_EXTENSIONS
+from gml_to_geojson import CONVERTER_VERSION, build_arg_parser
+from gml_to_geojson import main as convert_main
+
+MANIFEST_NAME = "manifest.json"
+
+
+def find_inputs(patterns: List[str]) -> List[str]:
+    """
+    Directories (all *.gml inside) and glob patterns -> sorted list of files.
+    """
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.update(glob.glob(os.path.join(pattern, "*.gml")))
+        else:
+            files.update(p for p in glob.glob(pattern) if os.path.isfile(p))
+    return sorted(os.path.abspath(p) for p in files)
+
+
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    # Skriv til en midlertidig fil først, så et avbrudd ikke gir halv manifest
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def output_path(input_path: str, output_dir: str, fmt: str) -> str:
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, stem + FORMAT_EXTENSIONS[fmt])
+
+
+def stale_reason(entry: Optional[dict], digest: str, options: List[str], output: str) -> Optional[str]:
+    """
+    Why a file must be converted again, or None if the manifest entry is current.
+    """
+    if entry is None:
+        return "ny"
+    if entry.get("error"):
+        return "feilet forrige gang"
+    if entry.get("sha256") != digest:
+        return "endret"
+    if entry.get("converter_version") != CONVERTER_VERSION:
+        return "ny konverterer-versjon"
+    if entry.get("options") != options:
+        return "andre valg"
+    if entry.get("output") != output or not os.path.exists(output):
+        return "mangler output"
+    return None
+
+
+def convert_one(job: Tuple[str, str, List[str]]) -> Tuple[str, float, str]:
+    """
+    Runs gml_to_geojson.main for one file in a worker process.
+    The converter's prints are captured so parallel runs don't interleave.
+    """
+    input_path, output, options = job
+    log = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            convert_main(["--input", input_path, "--output", output, *options])
+        except SystemExit as e:
+            # argparse and sys.exit in the converter; must not take the whole batch down
+            if e.code not in (None, 0):
+                lines = log.getvalue().strip().splitlines()
+                raise RuntimeError(lines[-1] if lines else f"avsluttet med kode {e.code}") from None
+        except Exception as e:
+            # Not every exception pickles back to the parent (lxml's XMLSyntaxError doesn't)
+            raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return input_path, time.perf_counter() - start, log.getvalue()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    options: List[str] = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, options = argv[:split], argv[split + 1:]
+
+    ap = argparse.ArgumentParser(
+        description=(
+            "Konverter mange GML-filer med gml_to_geojson.py, men bare de som er endret "
+            "siden forrige kjøring. Valg etter -- sendes videre til gml_to_geojson.py."
+        )
+    )
+    ap.add_argument("inputs", nargs="+", help="Mapper (alle *.gml) eller glob-mønstre")
+    ap.add_argument("--output-dir", required=True, help="Mappe som output skrives til")
+    ap.add_argument("--manifest", default=None, help=f"Manifest-fil (standard: <output-dir>/{MANIFEST_NAME})")
+    ap.add_argument("--workers", type=int, default=1, help="Antall filer som konverteres samtidig (1 = ingen parallellisering)")
+    ap.add_argument("--force", action="store_true", help="Konverter alt på nytt")
+    ap.add_argument("--dry-run", action="store_true", help="Bare vis hva som ville blitt konvertert")
+    args = ap.parse_args(argv)
+
+    # Sjekk valgene for konvertereren en gang, før noe kjøres
+    converter_args = build_arg_parser().parse_args(["--input", "-", "--output", "-", *options])
+    if converter_args.topojson:
+        ap.error("--topojson kan ikke brukes i batch (samme fil for alle input)")
+    if converter_args.split_dir:
+        ap.error("--split-dir kan ikke brukes i batch (samme mappe for alle input); --split-by alene gir én mappe per fil")
+    for flag in ("--input", "--output"):
+        if flag in options:
+            ap.error(f"{flag} settes av batch_convert.py")
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        ap.error("Fant ingen GML-filer")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    entries: Dict[str, dict] = manifest.setdefault("files", {})
+
+    jobs = []
+    pending: Dict[str, dict] = {}
+    for path in inputs:
+        digest = file_sha256(path)
+        output = os.path.abspath(output_path(path, args.output_dir, converter_args.format))
+        reason = "--force" if args.force else stale_reason(entries.get(path), digest, options, output)
+        if reason is None:
+            continue
+        print(f"  {os.path.basename(path)}: {reason}")
+        jobs.append((path, output, options))
+        pending[path] = {
+            "sha256": digest,
+            "size": os.path.getsize(path),
+            "converter_version": CONVERTER_VERSION,
+            "options": options,
+            "output": output,
+        }
+
+    print(f"{len(jobs)} av {len(inputs)} filer må konverteres")
+    if args.dry_run or not jobs:
+        return
+
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(jobs)))) as executor:
+        futures = {executor.submit(convert_one, job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                _path, seconds, log = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"FEIL {os.path.basename(path)}: {e}")
+                entries[path] = {**pending[path], "error": str(e), "converted": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                save_manifest(manifest_path, manifest)
+                continue
+            print(f"--- {os.path.basename(path)} ({seconds:.1f} s)")
+            print(log.rstrip())
+            entries[path] = {**pending[path], "converted": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            # Lagre etter hver fil, så et avbrudd ikke mister ferdige konverteringer
+            save_manifest(manifest_path, manifest)
+
+    print(f"\nKonverterte {len(jobs) - failed} filer på {time.perf_counter() - start:.1f} s ({failed} feilet)")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for gml_to_geojson.py and gtfs_to_geojson.py on synthetic data.
+
+For each converter:
+
+- stages: the pipeline is run in this process with a timer around every
+  stage, so a regression shows up in the stage that caused it
+  (GML: parse, properties, geometry, transform, write;
+   GTFS: shapes, stops, routes, trips, stop_times, routes_features, write)
+- end_to_end: the real CLI in a child process (with any extra flags),
+  with wall time, features/s and the child's peak RSS
+- classify (GML): classify_feature against the XPath-based property and
+  geometry lookup it replaced, on the same parsed tree, with a check that
+  both give the same properties and geometry elements
+
+Input is generated by synthetic_data.py into a work directory (and reused
+when the size parameters are the same). Results go to a JSON file with the
+git commit, so two runs can be compared with --compare.
+
+Example:
+
+    python dataManipulation/benchmark.py --features 50000 --output bench.json
+    python dataManipulation/benchmark.py --features 50000 --compare bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import gml_to_geojson as gml
+import gtfs_to_geojson as gtfs
+from geojson_writer import open_writer
+from profiling import StageTimer
+from synthetic_data import write_fkb_gml, write_gtfs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=HERE, capture_output=True, text=True, check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_child(cmd: List[str]) -> dict:
+    """
+    Runs cmd in a child process; wall time and the child's own peak RSS.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = proc.stderr.read()
+    _pid, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} feilet:\n{stderr.decode(errors='replace')}")
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return {"seconds": round(seconds, 3), "peak_rss_mb": round(rss, 1), "command": cmd[1:]}
+
+
+def bench_gml_stages(path: str, out_path: str) -> dict:
+    """
+    The single-process GML pipeline, stage by stage.
+    """
+    timer = StageTimer()
+
+    with timer("parse"):
+        root = gml.etree.parse(path).getroot()
+        feature_els = gml.find_feature_elements(root)
+        transformer, _src = gml.pick_transformer(root)
+
+    features = 0
+    vertices = 0
+    with open_writer(out_path) as writer:
+        for i, feat_el in enumerate(feature_els):
+            with timer("properties"):
+                geom_els, props = gml.classify_feature(feat_el)
+            with timer("geometry"):
+                source_geom = gml.source_geometry_from_feature(feat_el, geom_els)
+            if source_geom is None:
+                continue
+            vertices += sum(len(a) for a in gml.coordinate_arrays(source_geom))
+            with timer("transform"):
+                geom = gml.transform_geometry(source_geom, transformer)
+            props["id"] = gml.feature_id(feat_el, f"feature_{i}")
+            with timer("write"):
+                writer.write({"type": "Feature", "properties": props, "geometry": geom})
+            features += 1
+
+    total = sum(timer.seconds.values())
+    return {
+        "features": features,
+        "vertices": vertices,
+        "stages": timer.as_dict(),
+        "seconds": round(total, 3),
+        "features_per_s": round(features / total, 1) if total else None,
+    }
+
+
+# The property extraction and geometry lookup from before classify_feature:
+# one XPath scan per geometry type plus two walks over the feature. Kept here
+# as the reference that the one-walk version is measured and checked against.
+XPATH_GEOMETRY = (
+    ".//*[local-name()='Point' or local-name()='LineString' or local-name()='Polygon' "
+    "or local-name()='Curve' or local-name()='Surface' "
+    "or local-name()='MultiSurface' or local-name()='MultiCurve' or local-name()='MultiPoint' "
+    "or local-name()='MultiPolygon']"
+)
+XPATH_GEOMETRY_LOOKUPS = {
+    "MultiSurface": ".//*[local-name()='MultiSurface']",
+    "MultiCurve": ".//*[local-name()='MultiCurve']",
+    "Point": ".//*[local-name()='Point']",
+    gml.LINE_KEY: ".//*[local-name()='LineString'] | .//*[local-name()='Curve']",
+    "Polygon": ".//*[local-name()='Polygon']",
+    "Surface": ".//*[local-name()='Surface']",
+}
+
+
+def _xpath_first(el, expr):
+    res = el.xpath(expr)
+    return res[0] if res else None
+
+
+def xpath_classify_feature(feature_el):
+    """
+    (geometry elements, properties) the way the converter found them before
+    classify_feature; same result, several passes.
+    """
+    strip_ns = gml.strip_ns
+    props = {"featureType": strip_ns(feature_el.tag)}
+    geom = _xpath_first(feature_el, XPATH_GEOMETRY)
+    geom_nodes = set(geom.iter()) if geom is not None else set()
+
+    for el in feature_el.iter():
+        if el is feature_el or el in geom_nodes or len(el) > 0:
+            continue
+        text = (el.text or "").strip()
+        if not text:
+            continue
+        key = strip_ns(el.tag)
+        if key in props and props[key] != text:
+            i = 2
+            while f"{key}_{i}" in props:
+                i += 1
+            props[f"{key}_{i}"] = text
+        else:
+            props[key] = text
+        if key.lower() in ("objekttype", "type", "arealtype", "arealbrukstype", "kode"):
+            props.setdefault("typeLabel", text)
+
+    for key in ("name", "description"):
+        el = _xpath_first(feature_el, f".//*[local-name()='{key}']")
+        if el is not None and (el.text or "").strip():
+            props.setdefault(key, el.text.strip())
+
+    for el in feature_el.iter():
+        if el in geom_nodes or not isinstance(el.tag, str):
+            continue
+        for k, v in (el.attrib or {}).items():
+            k2 = strip_ns(k).lower()
+            if k2 in ("codespace", "href", "type", "kode"):
+                base = strip_ns(el.tag)
+                props.setdefault(f"{base}_{k2}", v)
+                if any(s in base.lower() for s in ("type", "kode", "kategori", "areal", "formål", "idrett")):
+                    props.setdefault("typeLabel", v)
+
+    if "typeLabel" not in props:
+        for k, v in props.items():
+            if any(s in k.lower() for s in ("type", "kode", "kategori", "areal", "formål")) and isinstance(v, str):
+                props["typeLabel"] = v
+                break
+
+    geom_els = {}
+    for key, expr in XPATH_GEOMETRY_LOOKUPS.items():
+        el = _xpath_first(feature_el, expr)
+        if el is not None:
+            geom_els[key] = el
+    return geom_els, props
+
+
+def bench_classify(path: str, repeats: int = 3) -> dict:
+    """
+    classify_feature against xpath_classify_feature on one parsed tree
+    (best of `repeats`), and whether they agree for every feature.
+    """
+    root = gml.etree.parse(path).getroot()
+    feature_els = gml.find_feature_elements(root)
+
+    def best(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for feat_el in feature_els:
+                fn(feat_el)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    mismatches = 0
+    for feat_el in feature_els:
+        old_geom, old_props = xpath_classify_feature(feat_el)
+        new_geom, new_props = gml.classify_feature(feat_el)
+        # classify_feature also notes the other geometry types; compare the ones the lookup used
+        if old_props != new_props or any(new_geom.get(k) is not el for k, el in old_geom.items()):
+            mismatches += 1
+
+    xpath_s = best(xpath_classify_feature)
+    classify_s = best(gml.classify_feature)
+    n = len(feature_els)
+    return {
+        "features": n,
+        "xpath_seconds": round(xpath_s, 3),
+        "classify_seconds": round(classify_s, 3),
+        "xpath_features_per_s": round(n / xpath_s, 1) if xpath_s else None,
+        "classify_features_per_s": round(n / classify_s, 1) if classify_s else None,
+        "speedup": round(xpath_s / classify_s, 2) if classify_s else None,
+        "mismatches": mismatches,
+    }
+
+
+def bench_gtfs_stages(gtfs_dir: str, out_dir: str) -> dict:
+    """
+    The single-process GTFS pipeline, stage by stage.
+    """
+    timer = StageTimer()
+
+    with timer("shapes"):
+        shapes = gtfs.read_shapes(os.path.join(gtfs_dir, "shapes.txt"))
+    with timer("stops"):
+        stops = gtfs.read_stops(os.path.join(gtfs_dir, "stops.txt"))
+    with timer("routes"):
+        route_meta = gtfs.read_routes_min(os.path.join(gtfs_dir, "routes.txt"))
+    with timer("trips"):
+        mapping, trip_to_route = gtfs.read_trips(os.path.join(gtfs_dir, "trips.txt"))
+    with timer("stop_times"):
+        stop_trips, route_stats = gtfs.aggregate_stop_times(
+            os.path.join(gtfs_dir, "stop_times.txt"), trip_to_route, workers=1
+        )
+        gtfs.attach_stop_trip_counts(stops, stop_trips)
+    with timer("routes_features"):
+        routes = gtfs.make_routes_geojson(shapes, mapping, route_meta, route_stats)
+    with timer("write"):
+        gtfs.write_geojson(os.path.join(out_dir, "routes.geojson"), routes)
+        gtfs.write_geojson(os.path.join(out_dir, "stops.geojson"), stops)
+
+    features = len(routes) + len(stops)
+    total = sum(timer.seconds.values())
+    return {
+        "features": features,
+        "vertices": int(len(shapes.xy)),
+        "stages": timer.as_dict(),
+        "seconds": round(total, 3),
+        "features_per_s": round(features / total, 1) if total else None,
+    }
+
+
+def prepare_inputs(args) -> Dict[str, str]:
+    """
+    Generates the synthetic inputs, or reuses them if they already exist.
+    """
+    os.makedirs(args.workdir, exist_ok=True)
+    gml_name = (
+        f"fkb_{args.features}_v{args.vertices}_h{args.holes:g}"
+        f"_m{args.multisurface:g}_p{args.points:g}_l{args.lines:g}.gml"
+    )
+    gml_path = os.path.join(args.workdir, gml_name)
+    if not os.path.exists(gml_path):
+        print(f"Lager {gml_path} ...")
+        write_fkb_gml(
+            gml_path + ".tmp", args.features, args.vertices, args.holes,
+            args.multisurface, args.points, args.lines,
+        )
+        os.replace(gml_path + ".tmp", gml_path)
+
+    gtfs_dir = os.path.join(args.workdir, f"gtfs_{args.shapes}_p{args.shape_points}_s{args.stops}")
+    gtfs_zip = gtfs_dir + ".zip"
+    if not os.path.exists(gtfs_zip):
+        print(f"Lager {gtfs_dir} ...")
+        write_gtfs(gtfs_dir, args.shapes, args.shape_points, args.stops, zip_path=gtfs_zip)
+
+    return {"gml": gml_path, "gtfs_dir": gtfs_dir, "gtfs_zip": gtfs_zip}
+
+
+def print_comparison(current: dict, previous: dict) -> None:
+    print(f"\nSammenlignet med {previous.get('commit') or '?'} ({previous.get('timestamp', '')}):")
+    for name, res in current["results"].items():
+        old = previous.get("results", {}).get(name)
+        if not old:
+            continue
+        rows = [(f"{name}.{k}", old["stages"].get(k), v) for k, v in res["stages"].items()]
+        rows.append((f"{name}.stages_total", old.get("seconds"), res["seconds"]))
+        rows.append((f"{name}.end_to_end", old["end_to_end"]["seconds"], res["end_to_end"]["seconds"]))
+        for label, before, after in rows:
+            if before:
+                print(f"  {label:<28}{before:>9.3f} s → {after:>9.3f} s  ({after / before:>5.2f}x)")
+        if "classify" in old and "classify" in res:
+            rows = [("classify", old["classify"]["classify_seconds"], res["classify"]["classify_seconds"])]
+            for label, before, after in rows:
+                print(f"  {name + '.' + label:<28}{before:>9.3f} s → {after:>9.3f} s  ({after / before:>5.2f}x)")
+        before_rss, after_rss = old["end_to_end"]["peak_rss_mb"], res["end_to_end"]["peak_rss_mb"]
+        print(f"  {name + '.peak_rss':<28}{before_rss:>8.1f} MB → {after_rss:>8.1f} MB")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mål hastighet og minne for gml_to_geojson.py og gtfs_to_geojson.py.")
+    ap.add_argument("--output", default="benchmark_results.json", help="JSON-fil med resultatene")
+    ap.add_argument("--compare", default=None, help="Tidligere resultatfil å sammenligne med")
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "gis_benchmark"))
+    ap.add_argument("--only", choices=("gml", "gtfs"), default=None, help="Bare én av konverterne")
+
+    g = ap.add_argument_group("GML")
+    g.add_argument("--features", type=int, default=20_000)
+    g.add_argument("--vertices", type=int, default=24, help="Punkter per ytterring")
+    g.add_argument("--holes", type=float, default=0.1)
+    g.add_argument("--multisurface", type=float, default=0.1)
+    g.add_argument("--points", type=float, default=0.05)
+    g.add_argument("--lines", type=float, default=0.05)
+    g.add_argument(
+        "--classify-repeats", type=int, default=3,
+        help="Antall runder (beste tid teller) for classify_feature mot XPath",
+    )
+    g.add_argument(
+        "--gml-args", default="--stream",
+        help="Ekstra valg til gml_to_geojson.py i end-to-end-kjøringen (én streng)",
+    )
+
+    t = ap.add_argument_group("GTFS")
+    t.add_argument("--shapes", type=int, default=2000)
+    t.add_argument("--shape-points", type=int, default=200)
+    t.add_argument("--stops", type=int, default=5000)
+    t.add_argument("--gtfs-args", default="", help="Ekstra valg til gtfs_to_geojson.py (én streng)")
+    args = ap.parse_args()
+
+    inputs = prepare_inputs(args)
+    out_dir = os.path.join(args.workdir, "out")
+    os.makedirs(out_dir, exist_ok=True)
+    results = {}
+
+    if args.only in (None, "gml"):
+        print("GML: steg for steg ...")
+        res = bench_gml_stages(inputs["gml"], os.path.join(out_dir, "stages.geojson"))
+        print("GML: classify_feature mot XPath ...")
+        res["classify"] = bench_classify(inputs["gml"], args.classify_repeats)
+        print("GML: end-to-end ...")
+        cmd = [
+            sys.executable, "gml_to_geojson.py", "--input", inputs["gml"],
+            "--output", os.path.join(out_dir, "fkb.geojson"), *args.gml_args.split(),
+        ]
+        res["end_to_end"] = run_child(cmd)
+        res["end_to_end"]["features_per_s"] = round(res["features"] / res["end_to_end"]["seconds"], 1)
+        res["input_bytes"] = os.path.getsize(inputs["gml"])
+        results["gml"] = res
+
+    if args.only in (None, "gtfs"):
+        print("GTFS: steg for steg ...")
+        res = bench_gtfs_stages(inputs["gtfs_dir"], out_dir)
+        print("GTFS: end-to-end ...")
+        cmd = [
+            sys.executable, "gtfs_to_geojson.py", "--gtfs", inputs["gtfs_zip"],
+            "--outdir", out_dir, *args.gtfs_args.split(),
+        ]
+        res["end_to_end"] = run_child(cmd)
+        res["end_to_end"]["features_per_s"] = round(res["features"] / res["end_to_end"]["seconds"], 1)
+        res["input_bytes"] = os.path.getsize(inputs["gtfs_zip"])
+        results["gtfs"] = res
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name, res in results.items():
+        e2e = res["end_to_end"]
+        print(f"\n{name}: {res['features']} features, {res['vertices']} punkter")
+        for stage, seconds in res["stages"].items():
+            print(f"  {stage:<18}{seconds:>9.3f} s")
+        print(f"  {'sum steg':<18}{res['seconds']:>9.3f} s  ({res['features_per_s']} features/s)")
+        print(
+            f"  {'end-to-end':<18}{e2e['seconds']:>9.3f} s  ({e2e['features_per_s']} features/s, "
+            f"maks RSS {e2e['peak_rss_mb']} MB)"
+        )
+        c = res.get("classify")
+        if c:
+            print(
+                f"  {'classify':<18}{c['classify_seconds']:>9.3f} s  ({c['classify_features_per_s']} features/s), "
+                f"XPath {c['xpath_seconds']:.3f} s ({c['xpath_features_per_s']} features/s): "
+                f"{c['speedup']}x, {c['mismatches']} avvik"
+            )
+    print(f"\nSkrev resultater til {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
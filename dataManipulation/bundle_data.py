@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Release bundles of converter output for public/.
+
+public/data/data.zip used to be put together by hand (with __MACOSX junk in
+it), and every deploy served the same GeoJSON under the same name, so
+browsers could never keep it cached. This bundler takes the converter
+outputs (GeoJSON, GeoJSONSeq, FlatGeobuf, TopoJSON, dictionaries, layer
+manifests) and writes, per file:
+
+- a content-hashed copy <stem>.<hash><ext>, where hash is the first
+  HASH_LENGTH hex digits of its SHA-256. The name only changes when the
+  content does, so it can be served with
+  "Cache-Control: public, max-age=31536000, immutable"
+- precompressed variants next to it: .gz (gzip -9) and .br (brotli quality
+  11, if the brotli package is installed), for servers and CDNs that serve
+  precompressed files (nginx gzip_static/brotli_static and the like)
+
+Compression runs in a process pool, one job per file and codec. Files that
+are already in the output directory with the same hash are not compressed
+again.
+
+data.zip (the download the task page links to) is built from the same files
+as data/<original name>, deflate level 9, without __MACOSX or dotfiles and
+with fixed timestamps, so the same data always gives a byte-identical zip.
+
+manifest.json maps every original name to its hashed file, with sizes,
+SHA-256 and feature count, plus the zip.
+
+Example:
+
+    python dataManipulation/bundle_data.py output/arealbruk.geojson output/leiligheter.geojson \
+        --output-dir public/data --zip public/data/data.zip --workers 8
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from file_hash import HASH_BLOCK, file_sha256
+from geojson_writer import FORMAT_EXTENSIONS
+
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(rf"\.[0-9a-f]{{{HASH_LENGTH}}}\.[^.]+$")
+BUNDLE_EXTENSIONS = (*FORMAT_EXTENSIONS.values(), ".topojson", ".json")
+ZIP_DIR = "data"
+# Earliest date a zip entry can have; fixed so the zip only depends on the content
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+CODECS = {"gzip": ".gz", "brotli": ".br"}
+
+
+def is_bundle_output(name: str) -> bool:
+    """
+    True for files a bundle writes itself: the manifest and hashed copies
+    (<stem>.<hash><ext>), so bundling an output directory again doesn't pack them.
+    """
+    return name == MANIFEST_NAME or HASHED_NAME.search(name) is not None
+
+
+def find_inputs(paths: List[str]) -> List[str]:
+    """
+    Files and directories (all bundle files inside, not recursive) -> sorted
+    list of files. Hidden files, __MACOSX and earlier bundle output are skipped.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for name in os.listdir(path):
+                full = os.path.join(path, name)
+                if os.path.isfile(full) and name.endswith(BUNDLE_EXTENSIONS):
+                    files.add(full)
+        elif os.path.isfile(path):
+            files.add(path)
+    return sorted(
+        os.path.abspath(p) for p in files
+        if not os.path.basename(p).startswith(".") and "__MACOSX" not in p.split(os.sep)
+        and not is_bundle_output(os.path.basename(p))
+    )
+
+
+def hashed_name(name: str, digest: str) -> str:
+    """
+    arealbruk.geojson -> arealbruk.<hash>.geojson
+    """
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def feature_count(path: str) -> Optional[int]:
+    """
+    Number of features in a GeoJSON/GeoJSONSeq/FlatGeobuf/TopoJSON file, else None.
+    """
+    try:
+        if path.endswith(FORMAT_EXTENSIONS["flatgeobuf"]):
+            from flatgeobuf import FlatGeobufReader
+
+            with FlatGeobufReader(path) as reader:
+                return int(reader.features_count)
+        if path.endswith(FORMAT_EXTENSIONS["geojsonseq"]):
+            with open(path, "r", encoding="utf-8") as f:
+                return sum(1 for line in f if line.strip().lstrip("\x1e"))
+        if path.endswith((".geojson", ".topojson", ".json")):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("type") == "FeatureCollection":
+                return len(data.get("features", []))
+            if data.get("type") == "Topology":
+                return sum(len(o.get("geometries", [])) for o in data.get("objects", {}).values())
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def brotli_available() -> bool:
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def compress_file(job: Tuple[str, str, str]) -> Tuple[str, int, float]:
+    """
+    Compresses src to dst with codec ("gzip" or "brotli") in a worker process.
+    Writes to a temporary file first, so an interrupted run never leaves a
+    half file under a hashed (= "finished") name.
+    """
+    src, dst, codec = job
+    start = time.perf_counter()
+    tmp = dst + ".tmp"
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        if codec == "gzip":
+            # mtime=0 and no file name: same input gives the same bytes
+            with gzip.GzipFile(filename="", mode="wb", fileobj=fout, compresslevel=9, mtime=0) as gz:
+                shutil.copyfileobj(fin, gz, HASH_BLOCK)
+        else:
+            import brotli
+
+            compressor = brotli.Compressor(quality=11)
+            for block in iter(lambda: fin.read(HASH_BLOCK), b""):
+                fout.write(compressor.process(block))
+            fout.write(compressor.finish())
+    os.replace(tmp, dst)
+    return dst, os.path.getsize(dst), time.perf_counter() - start
+
+
+def write_zip(path: str, files: List[Tuple[str, str]]) -> None:
+    """
+    Deterministic zip of (source path, name in zip) pairs.
+    """
+    tmp = path + ".tmp"
+    with zipfile.ZipFile(tmp, "w") as zf:
+        for src, arcname in files:
+            info = zipfile.ZipInfo(arcname, date_time=ZIP_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with open(src, "rb") as fin:
+                zf.writestr(info, fin.read(), compresslevel=9)
+    os.replace(tmp, path)
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def bundled_files(entry: dict) -> List[str]:
+    """
+    All file names a manifest entry refers to (hashed copy and compressed variants).
+    """
+    return [entry["file"]] + [entry[codec]["file"] for codec in CODECS if codec in entry]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description=(
+            "Lag en release-bunt av konverterte filer: innholds-hashede kopier med "
+            "ferdig gzip/brotli-komprimerte varianter, data.zip og manifest.json."
+        )
+    )
+    ap.add_argument("inputs", nargs="+", help="Filer, eller mapper (alle .geojson/.geojsonl/.fgb/.topojson/.json)")
+    ap.add_argument("--output-dir", required=True, help="Mappe bunten skrives til")
+    ap.add_argument("--zip", default=None, help="Zip-fil med alle filene under data/ (standard: <output-dir>/data.zip)")
+    ap.add_argument("--no-zip", action="store_true", help="Ikke lag zip-fil")
+    ap.add_argument("--no-brotli", action="store_true", help="Bare gzip (brotli krever pakken brotli)")
+    ap.add_argument("--workers", type=int, default=1, help="Antall filer som komprimeres samtidig (1 = ingen parallellisering)")
+    ap.add_argument("--prune", action="store_true", help="Slett hashede filer fra forrige bunt som ikke er med lenger")
+    args = ap.parse_args(argv)
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        ap.error("Fant ingen filer å pakke")
+    names: Dict[str, str] = {}
+    for path in inputs:
+        name = os.path.basename(path)
+        if name in names:
+            ap.error(f"To filer heter {name}: {names[name]} og {path}")
+        names[name] = path
+
+    codecs = ["gzip"]
+    if not args.no_brotli:
+        if brotli_available():
+            codecs.append("brotli")
+        else:
+            print("Fant ikke brotli-pakken (pip install brotli); lager bare .gz")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    previous = load_manifest(manifest_path)
+
+    entries: Dict[str, dict] = {}
+    jobs = []
+    for name, path in names.items():
+        digest = file_sha256(path)
+        filename = hashed_name(name, digest)
+        target = os.path.join(args.output_dir, filename)
+        if not os.path.exists(target):
+            # Via a temporary file: a file under the hashed name must be complete
+            shutil.copyfile(path, target + ".tmp")
+            os.replace(target + ".tmp", target)
+        entry = entries[name] = {
+            "file": filename,
+            "bytes": os.path.getsize(path),
+            "sha256": digest,
+            "features": feature_count(path),
+        }
+        for codec in codecs:
+            compressed = filename + CODECS[codec]
+            entry[codec] = {"file": compressed}
+            dst = os.path.join(args.output_dir, compressed)
+            if os.path.exists(dst):
+                entry[codec]["bytes"] = os.path.getsize(dst)
+            else:
+                jobs.append((target, dst, codec))
+
+    print(f"{len(names)} filer, {len(jobs)} komprimeringer å gjøre ({', '.join(codecs)})")
+    start = time.perf_counter()
+    sizes: Dict[str, int] = {}
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(jobs)))) as executor:
+            # De største filene først, så ikke én stor brotli-jobb blir liggende igjen til slutt
+            jobs.sort(key=lambda job: (-os.path.getsize(job[0]), job[2] != "brotli"))
+            for dst, size, seconds in executor.map(compress_file, jobs):
+                sizes[os.path.basename(dst)] = size
+                print(f"  {os.path.basename(dst):<48}{size:>12} bytes  ({seconds:.1f} s)")
+    for entry in entries.values():
+        for codec in codecs:
+            if "bytes" not in entry[codec]:
+                entry[codec]["bytes"] = sizes[entry[codec]["file"]]
+
+    manifest = {
+        "version": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "hash_length": HASH_LENGTH,
+        "files": entries,
+    }
+
+    if not args.no_zip:
+        zip_path = args.zip or os.path.join(args.output_dir, "data.zip")
+        write_zip(zip_path, [(path, f"{ZIP_DIR}/{name}") for name, path in names.items()])
+        manifest["zip"] = {
+            "file": os.path.relpath(zip_path, args.output_dir),
+            "bytes": os.path.getsize(zip_path),
+            "sha256": file_sha256(zip_path),
+            "entries": [f"{ZIP_DIR}/{name}" for name in names],
+        }
+
+    if args.prune:
+        keep = {f for entry in entries.values() for f in bundled_files(entry)}
+        for entry in previous.get("files", {}).values():
+            for filename in bundled_files(entry):
+                path = os.path.join(args.output_dir, filename)
+                if filename not in keep and os.path.exists(path):
+                    os.remove(path)
+                    print(f"  slettet {filename}")
+
+    save_manifest(manifest_path, manifest)
+
+    print(f"\nSkrev bunt til {args.output_dir} på {time.perf_counter() - start:.1f} s")
+    print(f"  {'fil':<28}{'features':>9}{'bytes':>12}{'gzip':>12}{'brotli':>12}")
+    for name, entry in entries.items():
+        features = "" if entry["features"] is None else entry["features"]
+        br = entry["brotli"]["bytes"] if "brotli" in entry else ""
+        print(f"  {name:<28}{features:>9}{entry['bytes']:>12}{entry['gzip']['bytes']:>12}{br:>12}")
+    if "zip" in manifest:
+        print(f"  {os.path.basename(zip_path):<28}{'':>9}{manifest['zip']['bytes']:>12}")
+    print(f"Skrev {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Build-time dissolve (union) of polygons per category (used by
+gml_to_geojson.py --dissolve).
+
+The app's dissolve tool (src/utils/dissolve.js) unions thousands of FKB
+polygons with Turf in the browser. Here the same result is computed once,
+in the projected source CRS, and written as an extra layer with one
+(Multi)Polygon feature per value of the category key, with the same
+properties the app's dissolve gives ({key: value}) plus feature_count and
+area_m2.
+
+Every category is unioned with GEOS' cascaded union (shapely.union_all,
+itself a tree union over an STR-tree), the categories side by side in a
+process pool. A category with more than `chunk_size` polygons is split
+further when there are workers to spare:
+
+1. its polygons are sorted along a Z-order curve, so neighbours end up in
+   the same chunk
+2. the chunks are unioned in parallel
+3. the partial results are unioned the same way, level by level, until
+   one geometry per category is left
+
+With one worker a category is never split: merging the partial results
+costs more than it saves when the chunks can't run at the same time.
+"""
+from __future__ import annotations
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import shapely
+
+# Largest category unioned as one job when there are several workers;
+# later levels union this many partial results per job
+DEFAULT_CHUNK_SIZE = 10_000
+MISSING = "__MISSING__"
+
+
+def to_shapely(geom: Optional[dict]):
+    """
+    Polygon/MultiPolygon from the converter's source geometry (numpy rings), else None.
+    """
+    if geom is None:
+        return None
+    t = geom["type"]
+    if t == "Polygon":
+        polys = [geom["coordinates"]]
+    elif t == "MultiPolygon":
+        polys = geom["coordinates"]
+    else:
+        return None
+    parts = [shapely.Polygon(rings[0], rings[1:]) for rings in polys if len(rings) and len(rings[0]) >= 4]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else shapely.MultiPolygon(parts)
+
+
+def z_order(geoms: np.ndarray) -> np.ndarray:
+    """
+    Order of the geometries along a Z-order (Morton) curve of their bbox centers.
+    """
+    bounds = shapely.bounds(geoms)
+    cx = (bounds[:, 0] + bounds[:, 2]) / 2
+    cy = (bounds[:, 1] + bounds[:, 3]) / 2
+
+    def cells(v):
+        span = v.max() - v.min()
+        return ((v - v.min()) / span * 0xFFFF).astype(np.uint64) if span > 0 else np.zeros(len(v), np.uint64)
+
+    def spread(v):
+        v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+        v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+        v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+        return v
+
+    code = spread(cells(cx)) | (spread(cells(cy)) << np.uint64(1))
+    return np.argsort(code, kind="stable")
+
+
+def _union_chunk(job: Tuple[str, np.ndarray]):
+    key, geoms = job
+    invalid = ~shapely.is_valid(geoms)
+    if invalid.any():
+        geoms = geoms.copy()
+        geoms[invalid] = shapely.make_valid(geoms[invalid])
+    return key, shapely.union_all(geoms)
+
+
+def union_groups(
+    groups: Dict[str, List],
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, object]:
+    """
+    {category: [shapely polygons]} -> {category: unioned geometry}.
+    """
+    if workers <= 1:
+        chunk_size = max([chunk_size] + [len(g) for g in groups.values()])
+
+    level: Dict[str, np.ndarray] = {}
+    for key, geoms in groups.items():
+        arr = np.asarray(geoms, dtype=object)
+        level[key] = arr[z_order(arr)] if len(arr) > chunk_size else arr
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            jobs = [
+                (key, geoms[i:i + chunk_size])
+                for key, geoms in level.items()
+                if len(geoms) > 1
+                for i in range(0, len(geoms), chunk_size)
+            ]
+            if not jobs:
+                break
+            results = executor.map(_union_chunk, jobs) if executor else map(_union_chunk, jobs)
+            merged: Dict[str, list] = {key: [] for key, geoms in level.items() if len(geoms) > 1}
+            for key, geom in results:
+                merged[key].append(geom)
+            for key, geoms in merged.items():
+                level[key] = np.asarray(geoms, dtype=object)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # One geometry left per category. Union results are valid; a category of
+    # one polygon never went through _union_chunk, so it is checked here
+    out = {}
+    for key, geoms in level.items():
+        geom = geoms[0]
+        if len(groups[key]) == 1 and not shapely.is_valid(geom):
+            geom = shapely.make_valid(geom)
+        out[key] = geom
+    return out
+
+
+def polygonal(geom):
+    """
+    Only the polygon parts (make_valid/union can leave lines or points behind).
+    """
+    if geom.geom_type in ("Polygon", "MultiPolygon"):
+        return geom
+    parts = [g for g in shapely.get_parts(geom) if g.geom_type in ("Polygon", "MultiPolygon")]
+    if not parts:
+        return None
+    return shapely.union_all(parts)
+
+
+def dissolve_features(
+    properties: List[dict],
+    geoms: List[Optional[dict]],
+    key: str,
+    transformer,
+    metric: bool = True,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> List[dict]:
+    """
+    Dissolved GeoJSON features (in the transformer's target CRS), one per
+    value of properties[key], sorted by that value. Non-polygon features are
+    left out. area_m2 is only set when the source CRS is metric.
+    """
+    groups: Dict[str, list] = {}
+    for props, geom in zip(properties, geoms):
+        shape = to_shapely(geom)
+        if shape is None:
+            continue
+        value = props.get(key)
+        groups.setdefault(MISSING if value is None else str(value), []).append(shape)
+
+    counts = {k: len(v) for k, v in groups.items()}
+    unioned = union_groups(groups, workers, chunk_size)
+
+    def reproject(xy):
+        x, y = transformer.transform(xy[:, 0], xy[:, 1])
+        return np.column_stack([x, y])
+
+    features = []
+    for value in sorted(unioned):
+        geom = polygonal(unioned[value])
+        if geom is None or geom.is_empty:
+            continue
+        props = {key: value, "feature_count": counts[value]}
+        if metric:
+            props["area_m2"] = round(float(geom.area), 1)
+        features.append({
+            "type": "Feature",
+            "properties": props,
+            "geometry": json.loads(shapely.to_geojson(shapely.transform(geom, reproject))),
+        })
+    return features
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Content hash of a file, shared by batch_convert.py (manifest), geometry_cache.py
+(cache key) and bundle_data.py (hashed file names), so all three always agree
+on what "the same file" means.
+"""
+from __future__ import annotations
+
+import hashlib
+
+HASH_BLOCK = 1 << 20
+
+
+def file_sha256(path: str) -> str:
+    """
+    Hex SHA-256 of the file content, read in HASH_BLOCK pieces.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
@@ -0,0 +1,727 @@
+#!/usr/bin/env python3
+"""
+FlatGeobuf writer/reader with a packed Hilbert R-tree (https://flatgeobuf.org).
+
+A .fgb file is: magic bytes, a size-prefixed Header flatbuffer, the spatial
+index (packed R-tree, 40 bytes per node) and then the size-prefixed Feature
+flatbuffers, sorted along a Hilbert curve. The front end can read the header
+and index with HTTP range requests and then fetch only the features inside
+the map viewport.
+
+The writer has the same interface as geojson_writer.FeatureWriter, but it has
+to see every feature before anything is written (features are sorted by the
+Hilbert value of their bbox), so it buffers the geometries until close().
+
+Usage (local bbox query, prints the matching features as GeoJSONSeq):
+
+    python dataManipulation/flatgeobuf.py routes.fgb --bbox 10.38 63.42 10.41 63.44
+"""
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import flatbuffers
+import numpy as np
+from flatbuffers import number_types as N
+from flatbuffers.table import Table
+
+from geojson_writer import round_geometry
+
+MAGIC = bytes([0x66, 0x67, 0x62, 0x03, 0x66, 0x67, 0x62, 0x00])
+DEFAULT_NODE_SIZE = 16
+HILBERT_MAX = (1 << 16) - 1
+
+# GeometryType (header.fbs)
+GEOMETRY_TYPES = {
+    "Point": 1,
+    "LineString": 2,
+    "Polygon": 3,
+    "MultiPoint": 4,
+    "MultiLineString": 5,
+    "MultiPolygon": 6,
+}
+GEOMETRY_NAMES = {v: k for k, v in GEOMETRY_TYPES.items()}
+
+# ColumnType (header.fbs); only the types the converters produce
+COL_BOOL = 2
+COL_LONG = 7
+COL_DOUBLE = 10
+COL_STRING = 11
+COL_JSON = 12
+
+NODE_DTYPE = np.dtype([
+    ("min_x", "<f8"),
+    ("min_y", "<f8"),
+    ("max_x", "<f8"),
+    ("max_y", "<f8"),
+    ("offset", "<u8"),
+])
+
+
+# ----------------- Packed Hilbert R-tree -----------------
+
+def hilbert(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Hilbert curve index of 16-bit grid coordinates (same algorithm as flatbush/flatgeobuf).
+    """
+    x = x.astype(np.uint64)
+    y = y.astype(np.uint64)
+    m = np.uint64(0xFFFF)
+
+    a = x ^ y
+    b = m ^ a
+    c = m ^ (x | y)
+    d = x & (y ^ m)
+
+    A = a | (b >> np.uint64(1))
+    B = (a >> np.uint64(1)) ^ a
+    C = ((c >> np.uint64(1)) ^ (b & (d >> np.uint64(1)))) ^ c
+    D = ((a & (c >> np.uint64(1))) ^ (d >> np.uint64(1))) ^ d
+
+    for shift in (2, 4):
+        s = np.uint64(shift)
+        a, b, c, d = A, B, C, D
+        A = (a & (a >> s)) ^ (b & (b >> s))
+        B = (a & (b >> s)) ^ (b & ((a ^ b) >> s))
+        C = C ^ ((a & (c >> s)) ^ (b & (d >> s)))
+        D = D ^ ((b & (c >> s)) ^ ((a ^ b) & (d >> s)))
+
+    s = np.uint64(8)
+    a, b, c, d = A, B, C, D
+    C = C ^ ((a & (c >> s)) ^ (b & (d >> s)))
+    D = D ^ ((b & (c >> s)) ^ ((a ^ b) & (d >> s)))
+
+    a = C ^ (C >> np.uint64(1))
+    b = D ^ (D >> np.uint64(1))
+
+    i0 = x ^ y
+    i1 = b | (m ^ (i0 | a))
+
+    def interleave(v):
+        v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+        v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+        v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+        return v
+
+    return ((interleave(i1) << np.uint64(1)) | interleave(i0)) & np.uint64(0xFFFFFFFF)
+
+
+def hilbert_order(bboxes: np.ndarray, extent: Sequence[float]) -> np.ndarray:
+    """
+    Feature order along the Hilbert curve, from the centres of their bboxes.
+    """
+    min_x, min_y, max_x, max_y = extent
+    width = (max_x - min_x) or 1.0
+    height = (max_y - min_y) or 1.0
+    cx = (bboxes[:, 0] + bboxes[:, 2]) / 2
+    cy = (bboxes[:, 1] + bboxes[:, 3]) / 2
+    hx = np.nan_to_num(np.floor(HILBERT_MAX * (cx - min_x) / width), posinf=0, neginf=0)
+    hy = np.nan_to_num(np.floor(HILBERT_MAX * (cy - min_y) / height), posinf=0, neginf=0)
+    h = hilbert(np.clip(hx, 0, HILBERT_MAX), np.clip(hy, 0, HILBERT_MAX))
+    return np.argsort(h, kind="stable")
+
+
+def level_bounds(num_items: int, node_size: int) -> List[Tuple[int, int]]:
+    """
+    [start, end) of each tree level in the node array. Level 0 is the leaves
+    (stored last), the last level is the root (node 0).
+    """
+    n = num_items
+    num_nodes = n
+    level_num_nodes = [n]
+    while True:
+        n = math.ceil(n / node_size)
+        num_nodes += n
+        level_num_nodes.append(n)
+        if n == 1:
+            break
+
+    bounds = []
+    n = num_nodes
+    for size in level_num_nodes:
+        bounds.append((n - size, n))
+        n -= size
+    return bounds
+
+
+def build_index(bboxes: np.ndarray, offsets: np.ndarray, node_size: int) -> np.ndarray:
+    """
+    Packed R-tree over already sorted feature bboxes.
+    Leaf offset = byte offset of the feature in the data section,
+    inner node offset = node index of its first child.
+    """
+    bounds = level_bounds(len(bboxes), node_size)
+    nodes = np.zeros(bounds[0][1], dtype=NODE_DTYPE)
+
+    start, end = bounds[0]
+    leaves = nodes[start:end]
+    leaves["min_x"], leaves["min_y"] = bboxes[:, 0], bboxes[:, 1]
+    leaves["max_x"], leaves["max_y"] = bboxes[:, 2], bboxes[:, 3]
+    leaves["offset"] = offsets
+
+    for (start, end), (parent_start, parent_end) in zip(bounds[:-1], bounds[1:]):
+        children = nodes[start:end]
+        firsts = np.arange(0, end - start, node_size)
+        parents = nodes[parent_start:parent_end]
+        parents["min_x"] = np.minimum.reduceat(children["min_x"], firsts)
+        parents["min_y"] = np.minimum.reduceat(children["min_y"], firsts)
+        parents["max_x"] = np.maximum.reduceat(children["max_x"], firsts)
+        parents["max_y"] = np.maximum.reduceat(children["max_y"], firsts)
+        parents["offset"] = start + firsts
+
+    return nodes
+
+
+def search_index(
+    nodes: np.ndarray,
+    num_items: int,
+    node_size: int,
+    bbox: Sequence[float],
+) -> List[Tuple[int, int]]:
+    """
+    (feature byte offset, feature index) for all leaves that intersect bbox.
+    """
+    min_x, min_y, max_x, max_y = bbox
+    bounds = level_bounds(num_items, node_size)
+    leaf_start = len(nodes) - num_items
+
+    results = []
+    queue = [(0, len(bounds) - 1)]
+    while queue:
+        node_index, level = queue.pop()
+        end = min(node_index + node_size, bounds[level][1])
+        block = nodes[node_index:end]
+        hit = (
+            (block["max_x"] >= min_x) & (block["min_x"] <= max_x)
+            & (block["max_y"] >= min_y) & (block["min_y"] <= max_y)
+        )
+        for pos in np.flatnonzero(hit):
+            node = block[pos]
+            if node_index >= leaf_start:
+                results.append((int(node["offset"]), node_index + int(pos) - leaf_start))
+            else:
+                queue.append((int(node["offset"]), level - 1))
+
+    results.sort()
+    return results
+
+
+# ----------------- Geometry / properties -----------------
+
+def _flatten(geom: dict):
+    """
+    GeoJSON geometry -> (type id, xy float64 array, ends or None, parts or None).
+    """
+    t = geom["type"]
+    c = geom["coordinates"]
+    if t == "Point":
+        return GEOMETRY_TYPES[t], np.asarray(c[:2], dtype="<f8"), None, None
+    if t in ("LineString", "MultiPoint"):
+        return GEOMETRY_TYPES[t], np.asarray([p[:2] for p in c], dtype="<f8").ravel(), None, None
+    if t in ("Polygon", "MultiLineString"):
+        rings = [np.asarray([p[:2] for p in ring], dtype="<f8").reshape(-1, 2) for ring in c]
+        ends = np.cumsum([len(r) for r in rings]).astype("<u4") if len(rings) > 1 else None
+        xy = np.concatenate(rings).ravel() if rings else np.empty(0, dtype="<f8")
+        return GEOMETRY_TYPES[t], xy, ends, None
+    if t == "MultiPolygon":
+        parts = [_flatten({"type": "Polygon", "coordinates": poly}) for poly in c]
+        return GEOMETRY_TYPES[t], None, None, parts
+    raise ValueError(f"Geometritypen støttes ikke i FlatGeobuf-writeren: {t}")
+
+
+def _bbox(flat) -> Tuple[float, float, float, float]:
+    _t, xy, _ends, parts = flat
+    if parts is not None:
+        boxes = [_bbox(p) for p in parts]
+        return (
+            min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes),
+        )
+    if xy is None or not len(xy):
+        return (math.inf, math.inf, -math.inf, -math.inf)
+    pts = xy.reshape(-1, 2)
+    return (float(pts[:, 0].min()), float(pts[:, 1].min()), float(pts[:, 0].max()), float(pts[:, 1].max()))
+
+
+def _column_type(values) -> int:
+    kinds = set()
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            kinds.add("bool")
+        elif isinstance(v, int):
+            kinds.add("int")
+        elif isinstance(v, float):
+            kinds.add("float")
+        elif isinstance(v, str):
+            kinds.add("str")
+        else:
+            kinds.add("json")
+    if kinds == {"bool"}:
+        return COL_BOOL
+    if kinds == {"int"}:
+        return COL_LONG
+    if kinds and kinds <= {"int", "float"}:
+        return COL_DOUBLE
+    if kinds == {"json"}:
+        return COL_JSON
+    return COL_STRING
+
+
+def _encode_properties(props: dict, columns: Dict[str, Tuple[int, int]]) -> bytes:
+    out = bytearray()
+    for key, value in props.items():
+        if value is None:
+            continue
+        index, col_type = columns[key]
+        out += struct.pack("<H", index)
+        if col_type == COL_BOOL:
+            out += struct.pack("<B", 1 if value else 0)
+        elif col_type == COL_LONG:
+            out += struct.pack("<q", value)
+        elif col_type == COL_DOUBLE:
+            out += struct.pack("<d", value)
+        else:
+            if col_type == COL_JSON or not isinstance(value, str):
+                value = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+            data = value.encode("utf-8")
+            out += struct.pack("<I", len(data)) + data
+    return bytes(out)
+
+
+def _estimate_size(flat, props: dict) -> int:
+    """
+    Approximate size of the feature in the file (for reports before close()).
+    """
+    _t, xy, ends, parts = flat
+    size = 32
+    if parts is not None:
+        size += sum(_estimate_size(p, {}) for p in parts)
+    else:
+        size += 8 * len(xy) + (4 * len(ends) if ends is not None else 0)
+    for value in props.values():
+        if isinstance(value, str):
+            size += 6 + len(value.encode("utf-8"))
+        elif value is not None:
+            size += 10
+    return size
+
+
+def estimate_feature_size(feature: dict, precision: Optional[int] = None) -> int:
+    """
+    What FlatGeobufWriter.write returns for the feature.
+    """
+    geom = feature.get("geometry")
+    if geom is None:
+        return 0
+    if precision is not None:
+        geom = round_geometry(geom, precision)
+    return _estimate_size(_flatten(geom), feature.get("properties") or {})
+
+
+def _build_geometry(b: flatbuffers.Builder, flat) -> int:
+    gtype, xy, ends, parts = flat
+
+    parts_off = None
+    if parts is not None:
+        offs = [_build_geometry(b, p) for p in parts]
+        b.StartVector(4, len(offs), 4)
+        for off in reversed(offs):
+            b.PrependUOffsetTRelative(off)
+        parts_off = b.EndVector()
+
+    xy_off = b.CreateNumpyVector(xy) if xy is not None and len(xy) else None
+    ends_off = b.CreateNumpyVector(ends) if ends is not None else None
+
+    b.StartObject(8)
+    if ends_off is not None:
+        b.PrependUOffsetTRelativeSlot(0, ends_off, 0)
+    if xy_off is not None:
+        b.PrependUOffsetTRelativeSlot(1, xy_off, 0)
+    b.PrependUint8Slot(6, gtype, 0)
+    if parts_off is not None:
+        b.PrependUOffsetTRelativeSlot(7, parts_off, 0)
+    return b.EndObject()
+
+
+def encode_feature(flat, props_bytes: bytes) -> bytes:
+    b = flatbuffers.Builder(256)
+    geom_off = _build_geometry(b, flat) if flat is not None else None
+    props_off = b.CreateNumpyVector(np.frombuffer(props_bytes, dtype=np.uint8)) if props_bytes else None
+    b.StartObject(3)
+    if geom_off is not None:
+        b.PrependUOffsetTRelativeSlot(0, geom_off, 0)
+    if props_off is not None:
+        b.PrependUOffsetTRelativeSlot(1, props_off, 0)
+    b.FinishSizePrefixed(b.EndObject())
+    return bytes(b.Output())
+
+
+def encode_header(
+    name: str,
+    envelope: Sequence[float],
+    geometry_type: int,
+    columns: List[Tuple[str, int]],
+    features_count: int,
+    node_size: int,
+    epsg: Optional[int],
+) -> bytes:
+    b = flatbuffers.Builder(1024)
+
+    col_offs = []
+    for col_name, col_type in columns:
+        name_off = b.CreateString(col_name)
+        b.StartObject(11)
+        b.PrependUOffsetTRelativeSlot(0, name_off, 0)
+        b.PrependUint8Slot(1, col_type, 0)
+        col_offs.append(b.EndObject())
+    b.StartVector(4, len(col_offs), 4)
+    for off in reversed(col_offs):
+        b.PrependUOffsetTRelative(off)
+    columns_off = b.EndVector()
+
+    crs_off = None
+    if epsg:
+        org_off = b.CreateString("EPSG")
+        b.StartObject(6)
+        b.PrependUOffsetTRelativeSlot(0, org_off, 0)
+        b.PrependInt32Slot(1, epsg, 0)
+        crs_off = b.EndObject()
+
+    name_off = b.CreateString(name)
+    envelope_off = b.CreateNumpyVector(np.asarray(envelope, dtype="<f8")) if envelope else None
+
+    b.StartObject(14)
+    b.PrependUOffsetTRelativeSlot(0, name_off, 0)
+    if envelope_off is not None:
+        b.PrependUOffsetTRelativeSlot(1, envelope_off, 0)
+    b.PrependUint8Slot(2, geometry_type, 0)
+    b.PrependUOffsetTRelativeSlot(7, columns_off, 0)
+    b.PrependUint64Slot(8, features_count, 0)
+    b.PrependUint16Slot(9, node_size, DEFAULT_NODE_SIZE)
+    if crs_off is not None:
+        b.PrependUOffsetTRelativeSlot(10, crs_off, 0)
+    b.FinishSizePrefixed(b.EndObject())
+    return bytes(b.Output())
+
+
+class FlatGeobufWriter:
+    """
+    Same interface as geojson_writer.FeatureWriter. Geometries are kept as
+    compact numpy arrays until close(), where the features are Hilbert-sorted
+    and written together with the packed R-tree index.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        precision: Optional[int] = None,
+        name: str = "",
+        epsg: Optional[int] = 4326,
+        node_size: int = DEFAULT_NODE_SIZE,
+    ):
+        self.path = path
+        self.precision = precision
+        self.name = name
+        self.epsg = epsg
+        self.node_size = node_size
+        self.count = 0
+        self._flats = []
+        self._props = []
+        self._bboxes = []
+        self._closed = False
+
+    def write(self, feature: dict) -> int:
+        """
+        Buffers one feature. Returns an estimate of its size in the file.
+        """
+        geom = feature.get("geometry")
+        if geom is not None and self.precision is not None:
+            geom = round_geometry(geom, self.precision)
+        flat = _flatten(geom) if geom is not None else None
+        props = feature.get("properties") or {}
+
+        self._flats.append(flat)
+        self._props.append(props)
+        self._bboxes.append(_bbox(flat) if flat is not None else (math.inf, math.inf, -math.inf, -math.inf))
+        self.count += 1
+        return _estimate_size(flat, props) if flat is not None else 0
+
+    def write_all(self, features) -> int:
+        for feature in features:
+            self.write(feature)
+        return self.count
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+
+        # Columns in order of first appearance
+        values: Dict[str, list] = {}
+        for props in self._props:
+            for k, v in props.items():
+                values.setdefault(k, []).append(v)
+        columns = [(k, _column_type(vs)) for k, vs in values.items()]
+        column_lookup = {k: (i, t) for i, (k, t) in enumerate(columns)}
+
+        types = {f[0] for f in self._flats if f is not None}
+        geometry_type = types.pop() if len(types) == 1 else 0
+
+        bboxes = np.asarray(self._bboxes, dtype=np.float64).reshape(-1, 4)
+        finite = np.isfinite(bboxes).all(axis=1)
+        if finite.any():
+            envelope = [
+                float(bboxes[finite, 0].min()), float(bboxes[finite, 1].min()),
+                float(bboxes[finite, 2].max()), float(bboxes[finite, 3].max()),
+            ]
+        else:
+            envelope = None
+
+        order = hilbert_order(bboxes, envelope) if envelope else np.arange(len(bboxes))
+        encoded = [
+            encode_feature(self._flats[i], _encode_properties(self._props[i], column_lookup))
+            for i in order
+        ]
+        sizes = np.array([len(e) for e in encoded], dtype=np.uint64)
+        offsets = np.zeros(len(encoded), dtype=np.uint64)
+        if len(sizes):
+            np.cumsum(sizes[:-1], out=offsets[1:])
+
+        node_size = self.node_size if self.count else 0
+        header = encode_header(
+            self.name, envelope, geometry_type, columns, self.count, node_size, self.epsg
+        )
+
+        # Temporary file first, so an interrupted write never leaves a half .fgb
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(MAGIC)
+                f.write(header)
+                if self.count:
+                    f.write(build_index(bboxes[order], offsets, node_size).tobytes())
+                for e in encoded:
+                    f.write(e)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        os.replace(tmp, self.path)
+
+        self._flats = self._props = self._bboxes = []
+
+    def abort(self) -> None:
+        """
+        Drops the buffered features without writing anything.
+        """
+        self._closed = True
+        self._flats = self._props = self._bboxes = []
+
+    def __enter__(self) -> "FlatGeobufWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# ----------------- Reader -----------------
+
+def _field(tab: Table, slot: int) -> int:
+    return tab.Offset(4 + 2 * slot)
+
+
+def _scalar(tab: Table, slot: int, flags, default):
+    o = _field(tab, slot)
+    return tab.Get(flags, o + tab.Pos) if o else default
+
+
+def _string(tab: Table, slot: int) -> Optional[str]:
+    o = _field(tab, slot)
+    return tab.String(o + tab.Pos).decode("utf-8") if o else None
+
+
+def _subtable(tab: Table, slot: int) -> Optional[Table]:
+    o = _field(tab, slot)
+    return Table(tab.Bytes, tab.Indirect(o + tab.Pos)) if o else None
+
+
+def _table_vector(tab: Table, slot: int) -> List[Table]:
+    o = _field(tab, slot)
+    if not o:
+        return []
+    start = tab.Vector(o)
+    return [Table(tab.Bytes, tab.Indirect(start + 4 * i)) for i in range(tab.VectorLen(o))]
+
+
+def _numpy_vector(tab: Table, slot: int, flags) -> Optional[np.ndarray]:
+    o = _field(tab, slot)
+    return tab.GetVectorAsNumpy(flags, o) if o else None
+
+
+def _decode_geometry(tab: Table, gtype: int) -> dict:
+    gtype = _scalar(tab, 6, N.Uint8Flags, 0) or gtype
+    name = GEOMETRY_NAMES.get(gtype)
+
+    if name == "MultiPolygon":
+        return {
+            "type": name,
+            "coordinates": [_decode_geometry(p, GEOMETRY_TYPES["Polygon"])["coordinates"] for p in _table_vector(tab, 7)],
+        }
+
+    xy = _numpy_vector(tab, 1, N.Float64Flags)
+    pts = xy.reshape(-1, 2).tolist() if xy is not None else []
+
+    if name == "Point":
+        return {"type": name, "coordinates": pts[0] if pts else []}
+    if name in ("LineString", "MultiPoint"):
+        return {"type": name, "coordinates": pts}
+
+    ends = _numpy_vector(tab, 0, N.Uint32Flags)
+    ends = ends.tolist() if ends is not None else [len(pts)]
+    parts = []
+    prev = 0
+    for end in ends:
+        parts.append(pts[prev:end])
+        prev = end
+    return {"type": name, "coordinates": parts}
+
+
+class FlatGeobufReader:
+    """
+    Reads a .fgb file through mmap. query(bbox) walks the R-tree index, so
+    only the features whose bbox overlaps the query are decoded.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:3] != MAGIC[:3]:
+            raise ValueError(f"{path} er ikke en FlatGeobuf-fil")
+
+        header_size = struct.unpack_from("<I", self._mm, 8)[0]
+        header = Table(self._mm, 12 + struct.unpack_from("<I", self._mm, 12)[0])
+
+        self.name = _string(header, 0)
+        envelope = _numpy_vector(header, 1, N.Float64Flags)
+        self.envelope = envelope.tolist() if envelope is not None else None
+        self.geometry_type = _scalar(header, 2, N.Uint8Flags, 0)
+        self.columns = [
+            (_string(c, 0), _scalar(c, 1, N.Uint8Flags, 0)) for c in _table_vector(header, 7)
+        ]
+        self.features_count = _scalar(header, 8, N.Uint64Flags, 0)
+        self.node_size = _scalar(header, 9, N.Uint16Flags, DEFAULT_NODE_SIZE)
+        crs = _subtable(header, 10)
+        # EPSG code of the coordinates, None if the file doesn't say
+        self.epsg = (_scalar(crs, 1, N.Int32Flags, 0) or None) if crs is not None else None
+
+        self._index_start = 12 + header_size
+        if self.node_size and self.features_count:
+            num_nodes = level_bounds(self.features_count, self.node_size)[0][1]
+        else:
+            num_nodes = 0
+        self._data_start = self._index_start + num_nodes * NODE_DTYPE.itemsize
+        self._nodes = np.frombuffer(
+            self._mm, dtype=NODE_DTYPE, count=num_nodes, offset=self._index_start
+        )
+
+    def _feature_at(self, offset: int) -> Tuple[dict, int]:
+        pos = self._data_start + offset
+        size = struct.unpack_from("<I", self._mm, pos)[0]
+        root = Table(self._mm, pos + 4 + struct.unpack_from("<I", self._mm, pos + 4)[0])
+
+        geom_tab = _subtable(root, 0)
+        geometry = _decode_geometry(geom_tab, self.geometry_type) if geom_tab is not None else None
+
+        props = {}
+        raw = _numpy_vector(root, 1, N.Uint8Flags)
+        if raw is not None:
+            buf = raw.tobytes()
+            i = 0
+            while i < len(buf):
+                col = struct.unpack_from("<H", buf, i)[0]
+                i += 2
+                name, col_type = self.columns[col]
+                if col_type == COL_BOOL:
+                    props[name] = bool(buf[i])
+                    i += 1
+                elif col_type == COL_LONG:
+                    props[name] = struct.unpack_from("<q", buf, i)[0]
+                    i += 8
+                elif col_type == COL_DOUBLE:
+                    props[name] = struct.unpack_from("<d", buf, i)[0]
+                    i += 8
+                else:
+                    n = struct.unpack_from("<I", buf, i)[0]
+                    text = buf[i + 4:i + 4 + n].decode("utf-8")
+                    props[name] = json.loads(text) if col_type == COL_JSON else text
+                    i += 4 + n
+
+        feature = {"type": "Feature", "properties": props, "geometry": geometry}
+        return feature, 4 + size
+
+    def __iter__(self) -> Iterator[dict]:
+        offset = 0
+        for _ in range(self.features_count):
+            feature, size = self._feature_at(offset)
+            offset += size
+            yield feature
+
+    def query(self, bbox: Sequence[float]) -> Iterator[dict]:
+        """
+        Features whose bbox overlaps (min_x, min_y, max_x, max_y).
+        """
+        if not len(self._nodes):
+            # No index: read everything and filter
+            min_x, min_y, max_x, max_y = bbox
+            for feature in self:
+                if feature["geometry"] is None:
+                    continue
+                fx0, fy0, fx1, fy1 = _bbox(_flatten(feature["geometry"]))
+                if fx1 >= min_x and fx0 <= max_x and fy1 >= min_y and fy0 <= max_y:
+                    yield feature
+            return
+        for offset, _index in search_index(self._nodes, self.features_count, self.node_size, bbox):
+            yield self._feature_at(offset)[0]
+
+    def close(self) -> None:
+        self._nodes = None
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "FlatGeobufReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Les en FlatGeobuf-fil, evt. bare features i en bbox.")
+    ap.add_argument("path", help=".fgb-fil")
+    ap.add_argument("--bbox", type=float, nargs=4, metavar=("MINX", "MINY", "MAXX", "MAXY"))
+    ap.add_argument("--count", action="store_true", help="Skriv bare ut antall treff")
+    args = ap.parse_args()
+
+    with FlatGeobufReader(args.path) as reader:
+        features = reader.query(args.bbox) if args.bbox else iter(reader)
+        if args.count:
+            print(sum(1 for _ in features))
+            return
+        for feature in features:
+            print(json.dumps(feature, ensure_ascii=False, separators=(",", ":")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Shared output layer for the converters (gml_to_geojson.py, gtfs_to_geojson.py).
+
+Features are written one at a time, so the converters never have to hold
+the whole FeatureCollection in memory. Three formats:
+
+- "geojson":    one compact FeatureCollection (no indent, no extra spaces)
+- "geojsonseq": newline-delimited GeoJSON, one Feature per line
+- "flatgeobuf": binary FlatGeobuf with a packed Hilbert R-tree (see flatgeobuf.py)
+
+Coordinates can be rounded to a fixed number of decimals with `precision`
+(6 decimals in lon/lat is roughly 10 cm).
+
+LayeredWriter splits the features into one file per layer (e.g. per
+featureType) with an index.json manifest next to them.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+FORMATS = ("geojson", "geojsonseq", "flatgeobuf")
+
+FORMAT_EXTENSIONS = {
+    "geojson": ".geojson",
+    "geojsonseq": ".geojsonl",
+    "flatgeobuf": ".fgb",
+}
+
+
+def round_coordinates(coords, precision: int):
+    """
+    Rounds a (nested) GeoJSON coordinate list to `precision` decimals.
+    """
+    if not coords:
+        return coords
+    if isinstance(coords[0], (int, float)):
+        return [round(v, precision) for v in coords]
+    return [round_coordinates(c, precision) for c in coords]
+
+
+def round_geometry(geom: Optional[dict], precision: Optional[int]) -> Optional[dict]:
+    if geom is None or precision is None:
+        return geom
+    if geom.get("type") == "GeometryCollection":
+        return {
+            **geom,
+            "geometries": [round_geometry(g, precision) for g in geom.get("geometries", [])],
+        }
+    return {**geom, "coordinates": round_coordinates(geom["coordinates"], precision)}
+
+
+def feature_text(feature: dict, precision: Optional[int] = None) -> str:
+    """
+    A feature as the text formats write it: compact JSON, rounded to `precision`.
+    """
+    if precision is not None:
+        feature = {**feature, "geometry": round_geometry(feature.get("geometry"), precision)}
+        if feature.get("bbox") is not None:
+            feature["bbox"] = round_coordinates(feature["bbox"], precision)
+    return json.dumps(feature, ensure_ascii=False, separators=(",", ":"))
+
+
+class FeatureWriter:
+    """
+    Writes GeoJSON features incrementally to `path`. Everything goes to
+    `path`.tmp, which close() renames to `path`; if the with block fails the
+    temporary file is removed, so a failed run never leaves a cut-off file.
+
+        with FeatureWriter("out.geojson", fmt="geojsonseq", precision=6) as w:
+            for feature in features:
+                w.write(feature)
+    """
+
+    def __init__(self, path: str, fmt: str = "geojson", precision: Optional[int] = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Ukjent format: {fmt} (bruk en av {', '.join(FORMATS)})")
+        self.path = path
+        self.fmt = fmt
+        self.precision = precision
+        self.count = 0
+        self._tmp = path + ".tmp"
+        self._f = open(self._tmp, "w", encoding="utf-8")
+        if fmt == "geojson":
+            self._f.write('{"type":"FeatureCollection","features":[\n')
+
+    def write(self, feature: dict) -> int:
+        """
+        Writes one feature and returns its size in bytes (without separators).
+        """
+        text = feature_text(feature, self.precision)
+        if self.fmt == "geojson":
+            if self.count:
+                self._f.write(",\n")
+            self._f.write(text)
+        else:
+            self._f.write(text)
+            self._f.write("\n")
+        self.count += 1
+        return len(text.encode("utf-8"))
+
+    def write_all(self, features: Iterable[dict]) -> int:
+        for feature in features:
+            self.write(feature)
+        return self.count
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        if self.fmt == "geojson":
+            self._f.write("\n]}\n")
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        """
+        Drops what has been written; `path` is left as it was.
+        """
+        if self._f.closed:
+            return
+        self._f.close()
+        os.remove(self._tmp)
+
+    def __enter__(self) -> "FeatureWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def open_writer(path: str, fmt: str = "geojson", precision: Optional[int] = None, epsg: Optional[int] = 4326):
+    """
+    FeatureWriter for the text formats, FlatGeobufWriter for "flatgeobuf".
+    Both have write()/write_all()/close()/abort() and work as context managers.
+    `epsg` is the CRS of the coordinates; only FlatGeobuf stores it.
+    """
+    if fmt == "flatgeobuf":
+        # Imported here so the text formats don't need the flatbuffers package
+        from flatgeobuf import FlatGeobufWriter
+
+        return FlatGeobufWriter(path, precision=precision, epsg=epsg)
+    return FeatureWriter(path, fmt=fmt, precision=precision)
+
+
+def feature_size(feature: dict, fmt: str = "geojson", precision: Optional[int] = None) -> int:
+    """
+    What write(feature) on open_writer(path, fmt, precision) would return, without writing.
+    """
+    if fmt == "flatgeobuf":
+        from flatgeobuf import estimate_feature_size
+
+        return estimate_feature_size(feature, precision)
+    return len(feature_text(feature, precision).encode("utf-8"))
+
+
+def coordinates_bbox(coords, bbox: Optional[List[float]] = None) -> Optional[List[float]]:
+    """
+    [minx, miny, maxx, maxy] of a (nested) GeoJSON coordinate list, grown
+    from `bbox` if given. Returns bbox unchanged for empty coordinates.
+    """
+    if not coords:
+        return bbox
+    if isinstance(coords[0], (int, float)):
+        x, y = coords[0], coords[1]
+        if bbox is None:
+            return [x, y, x, y]
+        if x < bbox[0]:
+            bbox[0] = x
+        if y < bbox[1]:
+            bbox[1] = y
+        if x > bbox[2]:
+            bbox[2] = x
+        if y > bbox[3]:
+            bbox[3] = y
+        return bbox
+    for c in coords:
+        bbox = coordinates_bbox(c, bbox)
+    return bbox
+
+
+def geometry_bbox(geom: Optional[dict], bbox: Optional[List[float]] = None) -> Optional[List[float]]:
+    if geom is None:
+        return bbox
+    if geom.get("type") == "GeometryCollection":
+        for g in geom.get("geometries", []):
+            bbox = geometry_bbox(g, bbox)
+        return bbox
+    return coordinates_bbox(geom.get("coordinates"), bbox)
+
+
+def merge_bbox(a: Optional[List[float]], b: Optional[List[float]]) -> Optional[List[float]]:
+    if a is None or b is None:
+        return b if a is None else a
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def layer_filename(value) -> str:
+    """
+    A safe file name (without extension) for a layer value, e.g. "Åpen fastmark" -> "Åpen_fastmark".
+    """
+    name = re.sub(r"[^\w.-]+", "_", str(value)).strip("._")
+    return name or "ukjent"
+
+
+class LayeredWriter:
+    """
+    Fans features out to one file per value of properties[key] (e.g. featureType)
+    in `directory`, while streaming. close() writes a manifest (index.json) with
+    each layer's file, feature count, bbox and byte size, so the app can load only
+    the layers it needs.
+
+    Features without the key go to the layer "ukjent". If the with block
+    fails, no layer file or manifest is written (see abort()).
+    """
+
+    MANIFEST_NAME = "index.json"
+
+    def __init__(
+        self,
+        directory: str,
+        key: str,
+        fmt: str = "geojson",
+        precision: Optional[int] = None,
+        source: Optional[str] = None,
+        epsg: Optional[int] = 4326,
+    ):
+        self.directory = directory
+        self.key = key
+        self.fmt = fmt
+        self.precision = precision
+        self.source = source
+        self.epsg = epsg
+        self.count = 0
+        self.manifest: Optional[dict] = None
+        self.manifest_path = os.path.join(directory, self.MANIFEST_NAME)
+        self._layers: Dict[str, dict] = {}
+        self._files: set = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def _layer(self, value: str) -> dict:
+        layer = self._layers.get(value)
+        if layer is None:
+            # Two values can give the same file name (e.g. "a b" and "a_b")
+            stem = base = layer_filename(value)
+            i = 2
+            while stem.lower() in self._files:
+                stem = f"{base}_{i}"
+                i += 1
+            self._files.add(stem.lower())
+            filename = stem + FORMAT_EXTENSIONS[self.fmt]
+            layer = self._layers[value] = {
+                "file": filename,
+                "writer": open_writer(
+                    os.path.join(self.directory, filename), self.fmt, self.precision, self.epsg
+                ),
+                "bbox": None,
+            }
+        return layer
+
+    def write(self, feature: dict, value=None) -> int:
+        """
+        Writes the feature to its layer. `value` overrides properties[key]
+        (needed when the properties are dictionary-encoded).
+        """
+        if value is None:
+            value = (feature.get("properties") or {}).get(self.key)
+        layer = self._layer("ukjent" if value is None or value == "" else str(value))
+        bbox = feature.get("bbox")
+        if bbox is not None:
+            layer["bbox"] = merge_bbox(layer["bbox"], list(bbox[:4]))
+        else:
+            layer["bbox"] = geometry_bbox(feature.get("geometry"), layer["bbox"])
+        self.count += 1
+        return layer["writer"].write(feature)
+
+    def write_all(self, features: Iterable[dict]) -> int:
+        for feature in features:
+            self.write(feature)
+        return self.count
+
+    def close(self) -> dict:
+        """
+        Closes every layer file and writes the manifest. Returns the manifest.
+        """
+        if self.manifest is not None:
+            return self.manifest
+        layers = []
+        bbox = None
+        for value, layer in sorted(self._layers.items()):
+            writer = layer["writer"]
+            writer.close()
+            path = os.path.join(self.directory, layer["file"])
+            layers.append({
+                "name": value,
+                "file": layer["file"],
+                "features": writer.count,
+                "bbox": layer["bbox"],
+                "bytes": os.path.getsize(path),
+            })
+            bbox = merge_bbox(bbox, layer["bbox"])
+
+        manifest = {
+            "split_by": self.key,
+            "format": self.fmt,
+            "source": self.source,
+            "crs": f"EPSG:{self.epsg}" if self.epsg else None,
+            "features": self.count,
+            "bbox": bbox,
+            "layers": layers,
+        }
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path)
+        self.manifest = manifest
+        return manifest
+
+    def abort(self) -> None:
+        """
+        Drops every layer file that is being written; the manifest is not written.
+        """
+        for layer in self._layers.values():
+            layer["writer"].abort()
+        self._layers = {}
+
+    def __enter__(self) -> "LayeredWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def write_features(
+    path: str,
+    features: Iterable[dict],
+    fmt: str = "geojson",
+    precision: Optional[int] = None,
+) -> int:
+    """
+    Writes all features to `path` and returns how many were written.
+    """
+    with open_writer(path, fmt=fmt, precision=precision) as w:
+        return w.write_all(features)
+
+
+def add_output_arguments(ap) -> None:
+    """
+    Adds --format / --precision to an argparse parser (same flags in both converters).
+    """
+    ap.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="geojson",
+        help=(
+            "geojson = kompakt FeatureCollection, geojsonseq = én feature per linje, "
+            "flatgeobuf = binær .fgb med romlig indeks"
+        ),
+    )
+    ap.add_argument(
+        "--precision",
+        type=int,
+        default=None,
+        help="Rund av lon/lat til så mange desimaler (6 ≈ 10 cm). Standard: ingen avrunding",
+    )
+
+
+def replace_extension(path: str, fmt: str) -> str:
+    """
+    Swaps a .geojson/.geojsonl extension for the one that matches `fmt`.
+    """
+    for ext in FORMAT_EXTENSIONS.values():
+        if path.endswith(ext):
+            return path[: -len(ext)] + FORMAT_EXTENSIONS[fmt]
+    return path
+
+
+def read_features(path: str) -> Iterator[dict]:
+    """
+    Reads back features written by open_writer (format from the file extension).
+    """
+    if path.endswith(FORMAT_EXTENSIONS["flatgeobuf"]):
+        from flatgeobuf import FlatGeobufReader
+
+        with FlatGeobufReader(path) as reader:
+            yield from reader
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(FORMAT_EXTENSIONS["geojsonseq"]):
+            for line in f:
+                line = line.strip().lstrip("\x1e")
+                if line:
+                    yield json.loads(line)
+            return
+        yield from json.load(f).get("features", [])
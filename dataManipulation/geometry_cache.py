@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Intermediate geometry cache for gml_to_geojson.py --cache.
+
+The same FKB file is often exported several times with different output
+options (precision, --keep-keys, --split-by, --simplify, format). Parsing
+the XML and reprojecting every vertex is the expensive part and gives the
+same result every time, so the first run stores the converted features in a
+directory of flat binary buffers, and later runs read them back with mmap
+instead of touching the XML:
+
+    coords.f64          float64 (n_vertices, 2), the target CRS
+    source.f64          float64 (n_vertices, 2), the source CRS (for simplify/dissolve)
+    ring_offsets.i64    int64 (n_rings + 1): vertices of ring r are [o[r], o[r+1])
+    part_offsets.i64    int64 (n_parts + 1): rings of part p
+    feature_offsets.i64 int64 (n_features + 1): parts of feature f
+    types.u8            uint8 (n_features,): index into GEOMETRY_TYPES
+    bbox.f64            float64 (n_features, 4), NaN when the feature had no bbox
+    properties.jsonl    one JSON object per line (the properties table)
+    meta.json           counts, options and converter stats; written last
+
+A part is one polygon (exterior + holes) or one line; a Point is one part
+with one ring of one vertex. The buffers are raw little-endian arrays (like
+the data section of a .npy file) and are opened with np.memmap, so the
+coordinates are never copied as a whole.
+
+The directory name holds a key made from the SHA-256 of the input file, the
+converter version and the options that change what is cached (target CRS,
+measures, filters). Another input or other options give a new directory, so
+a stale cache is never read.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import shutil
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from file_hash import file_sha256
+
+CACHE_VERSION = 1
+META_NAME = "meta.json"
+GEOMETRY_TYPES = ("Point", "LineString", "Polygon", "MultiLineString", "MultiPolygon")
+_TYPE_CODES = {t: i for i, t in enumerate(GEOMETRY_TYPES)}
+NO_GEOMETRY = 255
+# Arrays kept in memory before they are appended to the files
+FLUSH_ARRAYS = 50_000
+# Features turned into lists at a time when reading
+READ_BATCH = 1000
+
+
+def cache_directory(cache_dir: str, input_path: str, options: dict) -> str:
+    """
+    <cache_dir>/<input stem>-<key>, where key covers the input content and options.
+    """
+    key = json.dumps(
+        {"cache_version": CACHE_VERSION, "sha256": file_sha256(input_path), **options},
+        sort_keys=True,
+    )
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(cache_dir, f"{stem}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}")
+
+
+def geometry_parts(geom: dict) -> List[list]:
+    """
+    [[ring, ...], ...] for a GeoJSON geometry (lists) or a source geometry (numpy).
+    """
+    t = geom["type"]
+    c = geom["coordinates"]
+    if t == "Point":
+        return [[c if isinstance(c, np.ndarray) else [c]]]
+    if t == "LineString":
+        return [[c]]
+    if t == "Polygon":
+        return [c]
+    if t == "MultiLineString":
+        return [[line] for line in c]
+    return c
+
+
+class GeometryCacheWriter:
+    """
+    Writes features as they are converted. Everything goes to <directory>.tmp,
+    which is renamed to directory by close(), so a cache that exists is complete.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.tmp = directory + ".tmp"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self._files = {
+            name: open(os.path.join(self.tmp, name), "wb")
+            for name in (
+                "coords.f64", "source.f64", "ring_offsets.i64", "part_offsets.i64",
+                "feature_offsets.i64", "types.u8", "bbox.f64",
+            )
+        }
+        self._properties = open(os.path.join(self.tmp, "properties.jsonl"), "w", encoding="utf-8")
+        self._coords: List[np.ndarray] = []
+        self._source: List[np.ndarray] = []
+        self._rings: List[int] = []
+        self._parts: List[int] = []
+        self._features: List[int] = []
+        self._types: List[int] = []
+        self._bbox: List[list] = []
+        self.vertices = 0
+        self.rings = 0
+        self.parts = 0
+        self.count = 0
+        # Every offset table starts at 0
+        np.zeros(1, "<i8").tofile(self._files["ring_offsets.i64"])
+        np.zeros(1, "<i8").tofile(self._files["part_offsets.i64"])
+        np.zeros(1, "<i8").tofile(self._files["feature_offsets.i64"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # Interrupted: never leave a half-written cache behind
+        if exc_type is not None:
+            self.abort()
+        return False
+
+    def write(self, feature: dict, source_geom: Optional[dict]) -> None:
+        geom = feature.get("geometry")
+        parts = geometry_parts(geom) if geom is not None else []
+        source_parts = geometry_parts(source_geom) if source_geom is not None else None
+        for p, part in enumerate(parts):
+            for r, ring in enumerate(part):
+                xy = np.asarray(ring, dtype=np.float64).reshape(-1, 2)
+                self._coords.append(xy)
+                if source_parts is not None:
+                    self._source.append(np.asarray(source_parts[p][r], dtype=np.float64).reshape(-1, 2))
+                else:
+                    self._source.append(np.full_like(xy, np.nan))
+                self.vertices += len(xy)
+                self._rings.append(self.vertices)
+            self.rings += len(part)
+            self._parts.append(self.rings)
+        self.parts += len(parts)
+        self._features.append(self.parts)
+        self._types.append(_TYPE_CODES[geom["type"]] if geom is not None else NO_GEOMETRY)
+        self._bbox.append(feature.get("bbox") or [np.nan] * 4)
+        self._properties.write(
+            json.dumps(feature.get("properties") or {}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        )
+        self.count += 1
+        if len(self._coords) >= FLUSH_ARRAYS:
+            self._flush()
+
+    def _flush(self) -> None:
+        f = self._files
+        if self._coords:
+            np.concatenate(self._coords).astype("<f8").tofile(f["coords.f64"])
+            np.concatenate(self._source).astype("<f8").tofile(f["source.f64"])
+        np.asarray(self._rings, "<i8").tofile(f["ring_offsets.i64"])
+        np.asarray(self._parts, "<i8").tofile(f["part_offsets.i64"])
+        np.asarray(self._features, "<i8").tofile(f["feature_offsets.i64"])
+        np.asarray(self._types, "u1").tofile(f["types.u8"])
+        np.asarray(self._bbox, "<f8").reshape(-1, 4).tofile(f["bbox.f64"])
+        for buf in (self._coords, self._source, self._rings, self._parts, self._features, self._types, self._bbox):
+            buf.clear()
+
+    def close(self, meta: dict) -> int:
+        """
+        Writes the rest and meta.json, moves the cache in place and returns its size in bytes.
+        """
+        self._flush()
+        for f in self._files.values():
+            f.close()
+        self._properties.close()
+        meta = {
+            **meta,
+            "cache_version": CACHE_VERSION,
+            "features": self.count,
+            "parts": self.parts,
+            "rings": self.rings,
+            "vertices": self.vertices,
+        }
+        with open(os.path.join(self.tmp, META_NAME), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(self.tmp, self.directory)
+        return sum(e.stat().st_size for e in os.scandir(self.directory))
+
+    def abort(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._properties.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def _memmap(path: str, dtype: str, shape_tail=()) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.empty((0, *shape_tail), dtype=dtype)
+    # Plain ndarray view of the mapping: no copy, and no np.memmap overhead per slice
+    arr = np.memmap(path, dtype=dtype, mode="r").view(np.ndarray)
+    return arr.reshape(-1, *shape_tail) if shape_tail else arr
+
+
+class GeometryCache:
+    """
+    Reads a cache written by GeometryCacheWriter.
+
+        cache = GeometryCache(directory)
+        for feature, source_geom in cache.features(with_source=True):
+            ...
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, META_NAME), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        def path(name):
+            return os.path.join(directory, name)
+
+        self.coords = _memmap(path("coords.f64"), "<f8", (2,))
+        self.source = _memmap(path("source.f64"), "<f8", (2,))
+        self.ring_offsets = _memmap(path("ring_offsets.i64"), "<i8")
+        self.part_offsets = _memmap(path("part_offsets.i64"), "<i8")
+        self.feature_offsets = _memmap(path("feature_offsets.i64"), "<i8")
+        self.types = _memmap(path("types.u8"), "u1")
+        self.bbox = _memmap(path("bbox.f64"), "<f8", (4,))
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, META_NAME))
+
+    def __len__(self) -> int:
+        return int(self.meta["features"])
+
+    def features(self, with_source: bool = False, batch: int = READ_BATCH) -> Iterator:
+        """
+        The features in file order; (feature, source geometry) with with_source.
+        Offsets and coordinates are turned into lists `batch` features at a time,
+        which is much cheaper than indexing the mapped arrays per ring.
+        Source geometries are numpy views into the mapped file.
+        """
+        n = len(self)
+        with open(os.path.join(self.directory, "properties.jsonl"), "r", encoding="utf-8") as props_file:
+            for start in range(0, n, batch):
+                stop = min(n, start + batch)
+                fo = self.feature_offsets[start:stop + 1].tolist()
+                po = self.part_offsets[fo[0]:fo[-1] + 1].tolist()
+                ro = self.ring_offsets[po[0]:po[-1] + 1].tolist()
+                v0 = ro[0]
+                coords = self.coords[v0:ro[-1]].tolist()
+                types = self.types[start:stop].tolist()
+                bboxes = self.bbox[start:stop].tolist()
+
+                for k in range(stop - start):
+                    props = json.loads(props_file.readline())
+                    code = types[k]
+                    parts = po[fo[k] - fo[0]:fo[k + 1] - fo[0] + 1]
+                    rings = ro[parts[0] - po[0]:parts[-1] - po[0] + 1]
+                    geom = source_geom = None
+                    if code != NO_GEOMETRY:
+                        t = GEOMETRY_TYPES[code]
+                        geom = _geometry(t, [coords[a - v0:b - v0] for a, b in zip(rings, rings[1:])], parts)
+                        if with_source:
+                            xy = self.source
+                            source_geom = _geometry(t, [xy[a:b] for a, b in zip(rings, rings[1:])], parts)
+
+                    feature = {"type": "Feature", "properties": props, "geometry": geom}
+                    bbox = bboxes[k]
+                    if not math.isnan(bbox[0]):
+                        feature["bbox"] = bbox
+                    yield (feature, source_geom) if with_source else feature
+
+
+def _geometry(t: str, rings: list, parts: List[int]) -> dict:
+    """
+    Geometry of type t from its rings (lists or numpy views); parts are the
+    feature's part offsets into the ring table.
+    """
+    if t == "Point":
+        point = rings[0]
+        return {"type": t, "coordinates": point if isinstance(point, np.ndarray) else point[0]}
+    if t in ("LineString",):
+        return {"type": t, "coordinates": rings[0]}
+    if t in ("Polygon", "MultiLineString"):
+        return {"type": t, "coordinates": rings}
+    first = parts[0]
+    return {
+        "type": t,
+        "coordinates": [rings[a - first:b - first] for a, b in zip(parts, parts[1:])],
+    }
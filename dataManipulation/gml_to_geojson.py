@@ -1,7 +1,22 @@
-import json
+import argparse
+import os
 import re
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from itertools import chain
+from sys import intern
+
+import numpy as np
 from lxml import etree
-from pyproj import Transformer
+from pyproj import CRS, Transformer
+
+from geojson_writer import LayeredWriter, add_output_arguments, feature_size, open_writer
+from property_dictionary import DEFAULT_MAX_VALUES, PropertyDictionary, dictionary_path, prune_properties
+from profiling import Progress, StageTimer, add_profiling_arguments, profile_run
+from simplify import Topology, count_vertices, tolerance_for_zoom
+from topojson_writer import DEFAULT_QUANTIZATION, build_topojson, topology_stats, write_topojson
 
 # =========================================================
 # Endre til filer du vil bruke
@@ -9,11 +24,16 @@ from pyproj import Transformer
 INPUT_GML = "dataManipulation/input/Basisdata_5001_Trondheim_5972_FKB-Arealbruk_GML.gml"
 OUTPUT_GEOJSON = "dataManipulation/output/output.geojson"
 
+# Øk denne når output endrer seg for samme input og valg
+# (batch_convert.py konverterer da alle filer på nytt)
+CONVERTER_VERSION = "5"
+
 # =========================================================
 # KOORDINATSYSTEM (enkelt)
 # - prøver å lese EPSG fra GML (srsName)
 # - hvis den ikke finner: antar EPSG:25832 (vanlig i Norge)
-# - target er alltid EPSG:4326 (lon/lat) for webkart/Turf
+# - features med egen srsName reprojiseres fra sitt eget CRS
+# - target er EPSG:4326 (lon/lat) for webkart/Turf, med mindre --target-crs sier noe annet
 # =========================================================
 DEFAULT_SOURCE_EPSG = "EPSG:25832"
 TARGET_EPSG = "EPSG:4326"
@@ -22,7 +42,31 @@ TARGET_EPSG = "EPSG:4326"
 GML32_ID = "{http://www.opengis.net/gml/3.2}id"
 GML31_ID = "{http://www.opengis.net/gml}id"
 
+# featureMember (GML) og member (WFS 2.0), uansett namespace
+MEMBER_TAGS = ("{*}featureMember", "{*}member")
+
+EMPTY_XY = np.empty((0, 2), dtype=np.float64)
+
+# Geometrielementer (local-name). Første av disse i en feature er geometri-subtreet
+# som ikke skal med i properties.
+GEOMETRY_NAMES = frozenset((
+    "Point", "LineString", "Polygon", "Curve", "Surface",
+    "MultiSurface", "MultiCurve", "MultiPoint", "MultiPolygon",
+))
+GEOMETRY_TAGS = tuple("{*}" + n for n in sorted(GEOMETRY_NAMES))
+LINE_KEY = "LineString|Curve"
+
+# Cache for strip_ns (de samme tag-ene går igjen i alle features)
+_local_names = {}
+
+# Antall features per jobb ved --workers
+DEFAULT_CHUNK_SIZE = 500
+
+# Stegtider for --profile (gjør ingenting før profile_run slår den på)
+TIMER = StageTimer(enabled=False)
+
 
+@lru_cache(maxsize=256)
 def epsg_from_srsname(srs):
     """
     Prøver å hente EPSG-kode fra f.eks:
@@ -55,173 +99,477 @@ def pick_transformer(root):
     src = epsg_from_srsname(any_srs[0]) if any_srs else None
     src = src or DEFAULT_SOURCE_EPSG
 
-    transformer = Transformer.from_crs(src, TARGET_EPSG, always_xy=True)
-    return transformer, src
+    return get_transformer(src), src
+
+
+# ----------------- CRS per feature -----------------
+# En fil kan blande CRS (srsName per geometri), så CRS-oppslagene under huskes
+# per CRS i stedet for å regnes ut for hver feature.
+
+@lru_cache(maxsize=32)
+def get_transformer(source, target=TARGET_EPSG):
+    """
+    Transformer fra source til target (always_xy).
+    Å sette opp en Transformer er tregt, så det gjøres én gang per (source, target).
+    """
+    return Transformer.from_crs(source, target, always_xy=True)
+
+
+@lru_cache(maxsize=32)
+def same_crs(a, b):
+    """
+    True hvis a og b er samme CRS; da trenger ikke punktene reprojiseres.
+    """
+    return a == b or CRS.from_user_input(a).equals(CRS.from_user_input(b), ignore_axis_order=True)
+
+
+@lru_cache(maxsize=32)
+def crs_is_metric(source):
+    """
+    True hvis CRS-et er projisert og i meter (da gir areal/lengde mening).
+    """
+    crs = CRS.from_user_input(source)
+    return bool(
+        crs.is_projected and crs.axis_info and crs.axis_info[0].unit_name in ("metre", "meter")
+    )
+
+
+def epsg_code(crs):
+    """
+    "EPSG:4326" -> 4326 (FlatGeobuf lagrer CRS som heltall)
+    """
+    return int(crs.split(":")[1])
+
+
+def ancestor_crs(el, srs=None, dim=None):
+    """
+    (srsName, srsDimension) fra el eller nærmeste forelder som har dem; None der ingen har.
+    """
+    while el is not None and (srs is None or dim is None):
+        if srs is None:
+            srs = el.get("srsName")
+        if dim is None:
+            dim = el.get("srsDimension")
+        el = el.getparent()
+    return srs, dim
+
+
+def feature_crs(geom_els, default_src, inherited=(None, None)):
+    """
+    (kilde-CRS, srsDimension) for én feature.
+    Begge leses fra første geometri-element, ellers nærmeste forelder som har dem
+    (feature, featureMember, rot). inherited er ancestor_crs for forelderen til
+    featuren, for features som er serialisert uten foreldrene sine (--workers).
+    Uten srsName brukes default_src. Uten srsDimension er dimensjonen None, og
+    parse_coords gjetter ut fra antall tall (et 2D-CRS kan fortsatt ha 3D-posList).
+    """
+    srs, dim = ancestor_crs(next(iter(geom_els.values()), None))
+    srs = srs if srs is not None else inherited[0]
+    dim = dim if dim is not None else inherited[1]
+    src = epsg_from_srsname(srs) or default_src
+    return src, int(dim) if dim and dim.isdigit() else None
 
 
 def parse_numbers(text):
-    return [float(v) for v in (text or "").strip().split() if v.strip()]
+    return np.array((text or "").split(), dtype=np.float64)
 
 
-def parse_coords(nums, transformer):
+def parse_coords(nums, dim=None):
     """
-    Støtter både 2D (x y x y ...) og 3D (x y z x y z ...)
+    Støtter både 2D (x y x y ...) og 3D (x y z x y z ...); dim er srsDimension.
+    Uten dim, eller hvis antallet tall ikke går opp, gjettes 3D når antallet går
+    opp i 3 og ellers 2D.
+    Returnerer en (n, 2)-array med x/y i kilde-CRS (z kastes).
     """
     if len(nums) < 2:
-        return []
-    dim = 3 if len(nums) % 3 == 0 else 2
+        return EMPTY_XY
+    if not dim or dim < 2 or len(nums) % dim:
+        dim = 3 if len(nums) % 3 == 0 else 2
+    usable = len(nums) - len(nums) % dim
+    return nums[:usable].reshape(-1, dim)[:, :2]
+
+
+def poslist_coords(poslist, dim=None):
+    """
+    Koordinatene i en gml:posList. srsDimension på selve posList vinner over dim.
+    """
+    own = poslist.get("srsDimension")
+    return parse_coords(parse_numbers(poslist.text), int(own) if own and own.isdigit() else dim)
+
+
+def close_ring(xy):
+    if len(xy) and not np.array_equal(xy[0], xy[-1]):
+        xy = np.vstack([xy, xy[:1]])
+    return xy
+
+
+def first_tag(el, *tags):
+    """
+    Første etterkommer med en av tag-ene (f.eks. "{*}posList"), ellers None.
+    lxml filtrerer på tag i C, så dette er mye raskere enn en XPath med local-name().
+    """
+    return next(el.iterdescendants(*tags), None)
+
+
+def coordinate_arrays(geom):
+    """
+    Alle koordinat-arrayene i en (kilde-)geometri, i rekkefølge.
+    """
+    t = geom["type"]
+    c = geom["coordinates"]
+    if t in ("Point", "LineString"):
+        return [c]
+    if t in ("Polygon", "MultiLineString"):
+        return list(c)
+    if t == "MultiPolygon":
+        return [ring for poly in c for ring in poly]
+    return []
+
+
+def transform_geometry(geom, transformer):
+    """
+    Reprojiserer en geometri fra parse_*-funksjonene (numpy-arrays i kilde-CRS)
+    til vanlig GeoJSON med lister.
+    Alle ringer/deler slås sammen, så det blir ett transform-kall per feature
+    i stedet for ett per punkt.
+    """
+    return transform_geometry_and_bbox(geom, transformer)[0]
+
+
+def transform_geometry_and_bbox(geom, transformer, extra_xy=EMPTY_XY):
+    """
+    Som transform_geometry, men gir (geometri, bbox, extra):
+    - bbox: [minlon, minlat, maxlon, maxlat] av de reprojiserte punktene (None hvis tom)
+    - extra: punktene i extra_xy (f.eks. centroiden) reprojisert i samme kall
+    """
+    if geom is None:
+        return None, None, EMPTY_XY
+
+    xy = stack_geometry(geom, extra_xy)
+    if len(xy):
+        lon, lat = transformer.transform(xy[:, 0], xy[:, 1])
+        xy = np.column_stack([lon, lat])
+    return unstack_geometry(geom, xy, len(extra_xy))
+
+
+def stack_geometry(geom, extra_xy=EMPTY_XY):
+    """
+    Alle punktene i geometrien, med extra_xy bakerst, som én (n, 2)-array.
+    """
+    parts = coordinate_arrays(geom)
+    return np.concatenate(parts + [extra_xy]) if parts else extra_xy
+
+
+def unstack_geometry(geom, lonlat, n_extra=0):
+    """
+    Motsatt av stack_geometry: lager GeoJSON med samme struktur som geom av de
+    (reprojiserte) punktene i lonlat. Gir (geometri, bbox, de n_extra siste punktene).
+    """
+    n = len(lonlat) - n_extra
+    extra = lonlat[n:]
+    lonlat = lonlat[:n]
+    bbox = None
+    if n:
+        bbox = [*lonlat.min(axis=0).tolist(), *lonlat.max(axis=0).tolist()]
+    coords = lonlat.tolist()
+
+    # Del opp igjen i samme struktur som før
+    parts = coordinate_arrays(geom)
     out = []
-    for i in range(0, len(nums), dim):
-        x = nums[i]
-        y = nums[i + 1]
-        lon, lat = transformer.transform(x, y)
-        out.append([lon, lat])
-    return out
+    pos = 0
+    for part in parts:
+        out.append(coords[pos:pos + len(part)])
+        pos += len(part)
+
+    t = geom["type"]
+    if t == "Point":
+        return {"type": t, "coordinates": out[0][0]}, bbox, extra
+    if t in ("LineString",):
+        return {"type": t, "coordinates": out[0]}, bbox, extra
+    if t in ("Polygon", "MultiLineString"):
+        return {"type": t, "coordinates": out}, bbox, extra
+
+    polys = []
+    pos = 0
+    for poly in geom["coordinates"]:
+        polys.append(out[pos:pos + len(poly)])
+        pos += len(poly)
+    return {"type": t, "coordinates": polys}, bbox, extra
+
+
+def reproject_source_geometry(geom, transformer):
+    """
+    Kildegeometri (numpy-arrays) reprojisert, i samme form som fra parse_*-funksjonene.
+    """
+    xy = stack_geometry(geom)
+    if not len(xy):
+        return geom
+    x, y = transformer.transform(xy[:, 0], xy[:, 1])
+    xy = np.column_stack([x, y])
+
+    parts = []
+    pos = 0
+    for part in coordinate_arrays(geom):
+        parts.append(xy[pos:pos + len(part)])
+        pos += len(part)
+
+    t = geom["type"]
+    if t in ("Point", "LineString"):
+        return {"type": t, "coordinates": parts[0]}
+    if t in ("Polygon", "MultiLineString"):
+        return {"type": t, "coordinates": parts}
+    polys = []
+    pos = 0
+    for poly in geom["coordinates"]:
+        polys.append(parts[pos:pos + len(poly)])
+        pos += len(poly)
+    return {"type": t, "coordinates": polys}
+
+
+# ----------------- Areal, omkrets og centroid (--no-measures slår av) -----------------
+# Regnes i kilde-CRS (EPSG:25832 er i meter, se crs_is_metric), der det er billig og eksakt,
+# så appen slipper å regne areal/bbox med Turf i nettleseren.
+
+def ring_sums(xy):
+    """
+    (dobbelt signert areal, lengde, sum (x_i + x_i+1) * kryss, sum (y_i + y_i+1) * kryss)
+    for én lukket ring. xy bør være flyttet nær origo (bedre presisjon).
+    """
+    x0 = xy[:-1, 0]
+    y0 = xy[:-1, 1]
+    x1 = xy[1:, 0]
+    y1 = xy[1:, 1]
+    cross = x0 * y1 - x1 * y0
+    length = np.hypot(x1 - x0, y1 - y0).sum()
+    return cross.sum(), length, ((x0 + x1) * cross).sum(), ((y0 + y1) * cross).sum()
 
 
-def close_ring(coords):
-    if coords and coords[0] != coords[-1]:
-        coords.append(coords[0])
-    return coords
+def line_sums(xy):
+    """
+    (lengde, sum av segmentmidtpunkt * segmentlengde) for én linje.
+    """
+    mid = (xy[:-1] + xy[1:]) / 2
+    seg = np.hypot(*(xy[1:] - xy[:-1]).T)
+    return seg.sum(), (mid * seg[:, None]).sum(axis=0)
+
 
+def geometry_measures(geom, metric=True):
+    """
+    Areal (m²), omkrets/lengde (m) og centroid for en kildegeometri.
+    Gir (properties-dict, centroid som (1, 2)-array i kilde-CRS).
+    Hver ring/linje regnes med numpy i én operasjon (ingen løkke per punkt):
+    - polygon: shoelace per ring, hull trekkes fra; arealvektet centroid
+    - linje: lengdevektet midtpunkt av segmentene
+    - punkt: gjennomsnittet
+    """
+    t = geom["type"]
+    c = geom["coordinates"]
+    if t == "Point":
+        return {}, c[:1]
+    if t == "MultiPolygon":
+        rings = [(ring, i == 0) for poly in c for i, ring in enumerate(poly) if len(ring)]
+    elif t == "Polygon":
+        rings = [(ring, i == 0) for i, ring in enumerate(c) if len(ring)]
+    elif t == "LineString":
+        rings = [(c, False)] if len(c) else []
+    else:
+        rings = [(line, False) for line in c if len(line)]
+    if not rings:
+        return {}, EMPTY_XY
+
+    origin = rings[0][0][0]
+    props = {}
+    total_len = 0.0
+
+    if t in ("Polygon", "MultiPolygon"):
+        area2 = cx = cy = 0.0
+        for ring, outer in rings:
+            ring_area2, length, sx, sy = ring_sums(ring - origin)
+            # Ytterring teller positivt og hull negativt, uansett hvilken vei ringen går
+            sign = (1.0 if outer else -1.0) * (1.0 if ring_area2 >= 0 else -1.0)
+            area2 += sign * ring_area2
+            cx += sign * sx
+            cy += sign * sy
+            total_len += length
+        area = area2 / 2
+        if metric:
+            props["area_m2"] = round(float(area), 1)
+            props["perimeter_m"] = round(float(total_len), 2)
+        if area > 0:
+            centroid = np.array([cx, cy]) / (6 * area)
+        else:
+            # Flate uten areal: bare snitt av punktene
+            centroid = np.concatenate([r for r, _o in rings]).mean(axis=0) - origin
+    else:
+        weighted = np.zeros(2)
+        for line, _outer in rings:
+            length, mid = line_sums(line - origin)
+            total_len += length
+            weighted += mid
+        if metric:
+            props["length_m"] = round(float(total_len), 2)
+        # Lengdevektet midtpunkt av segmentene
+        if total_len > 0:
+            centroid = weighted / total_len
+        else:
+            centroid = np.concatenate([r for r, _o in rings]).mean(axis=0) - origin
 
-def first(el, xpath_expr):
-    res = el.xpath(xpath_expr)
-    return res[0] if res else None
+    return props, (centroid + origin).reshape(1, 2)
 
 
 # ----------------- Geometri-parsing (robust, men enkel) -----------------
+# parse_*-funksjonene gir geometri med numpy-arrays i kilde-CRS.
+# Reprojisering skjer samlet i transform_geometry.
 
-def parse_point(point_el, transformer):
+def parse_point(point_el):
     # gml:pos
-    pos = first(point_el, ".//*[local-name()='pos']")
+    pos = first_tag(point_el, "{*}pos")
     if pos is not None and (pos.text or "").strip():
         nums = parse_numbers(pos.text)
-        lon, lat = transformer.transform(nums[0], nums[1])
-        return {"type": "Point", "coordinates": [lon, lat]}
+        return {"type": "Point", "coordinates": nums[:2].reshape(1, 2)}
 
     # gml:coordinates (eldre)
-    coords_el = first(point_el, ".//*[local-name()='coordinates']")
+    coords_el = first_tag(point_el, "{*}coordinates")
     if coords_el is not None and (coords_el.text or "").strip():
         # "x,y x,y"
         parts = coords_el.text.strip().split()
         if parts:
             x, y = parts[0].split(",")[:2]
-            lon, lat = transformer.transform(float(x), float(y))
-            return {"type": "Point", "coordinates": [lon, lat]}
+            return {"type": "Point", "coordinates": np.array([[float(x), float(y)]])}
 
     return None
 
 
-def parse_linestring_like(ls_el, transformer):
+def parse_linestring_like(ls_el, dim=None):
     # posList
-    poslist = first(ls_el, ".//*[local-name()='posList']")
+    poslist = first_tag(ls_el, "{*}posList")
     if poslist is not None and (poslist.text or "").strip():
-        nums = parse_numbers(poslist.text)
-        coords = parse_coords(nums, transformer)
-        return {"type": "LineString", "coordinates": coords}
+        return {"type": "LineString", "coordinates": poslist_coords(poslist, dim)}
 
     # repeated pos
-    poses = ls_el.xpath(".//*[local-name()='pos']")
+    poses = list(ls_el.iterdescendants("{*}pos"))
     if poses:
-        coords = []
-        for p in poses:
-            if not (p.text or "").strip():
-                continue
-            nums = parse_numbers(p.text)
-            lon, lat = transformer.transform(nums[0], nums[1])
-            coords.append([lon, lat])
-        return {"type": "LineString", "coordinates": coords}
+        pts = [parse_numbers(p.text)[:2] for p in poses if (p.text or "").strip()]
+        xy = np.array(pts, dtype=np.float64).reshape(-1, 2)
+        return {"type": "LineString", "coordinates": xy}
 
     return None
 
 
-def parse_polygon_like(poly_el, transformer):
+def parse_polygon_like(poly_el, dim=None):
     rings = []
 
     # exterior ring
-    ext = first(poly_el, ".//*[local-name()='exterior']")
+    ext = first_tag(poly_el, "{*}exterior")
     if ext is None:
         return None
-    ext_poslist = first(ext, ".//*[local-name()='posList']")
+    ext_poslist = first_tag(ext, "{*}posList")
     if ext_poslist is None or not (ext_poslist.text or "").strip():
         return None
 
-    ext_coords = close_ring(parse_coords(parse_numbers(ext_poslist.text), transformer))
-    rings.append(ext_coords)
+    rings.append(close_ring(poslist_coords(ext_poslist, dim)))
 
     # interior rings (holes)
-    interiors = poly_el.xpath(".//*[local-name()='interior']")
+    interiors = poly_el.iterdescendants("{*}interior")
     for interior in interiors:
-        poslist = first(interior, ".//*[local-name()='posList']")
+        poslist = first_tag(interior, "{*}posList")
         if poslist is None or not (poslist.text or "").strip():
             continue
-        rings.append(close_ring(parse_coords(parse_numbers(poslist.text), transformer)))
+        rings.append(close_ring(poslist_coords(poslist, dim)))
 
     return {"type": "Polygon", "coordinates": rings}
 
 
-def parse_surface(surface_el, transformer):
+def parse_surface(surface_el, dim=None):
     """
     FKB/GML bruker ofte gml:Surface med patches.
     Jeg leter etter én ring med posList (ytterring).
     """
     # Finn første posList inne i surface (typisk LinearRing i patches)
-    poslist = first(surface_el, ".//*[local-name()='posList']")
+    poslist = first_tag(surface_el, "{*}posList")
     if poslist is None or not (poslist.text or "").strip():
         return None
-    outer = close_ring(parse_coords(parse_numbers(poslist.text), transformer))
+    outer = close_ring(poslist_coords(poslist, dim))
     return {"type": "Polygon", "coordinates": [outer]}
 
 
-def geometry_from_feature(feature_el, transformer):
+def find_geometry_elements(feature_el):
+    """
+    Første element av hver geometritype i featuren, i én gjennomgang.
+    Nøkkelen LINE_KEY er første LineString eller Curve (det som kommer først).
+    """
+    geom_els = {}
+    for el in feature_el.iterdescendants(*GEOMETRY_TAGS):
+        note_geometry_element(geom_els, local_name(el.tag), el)
+    return geom_els
+
+
+def note_geometry_element(geom_els, name, el):
+    if name not in geom_els:
+        geom_els[name] = el
+    if name in ("LineString", "Curve") and LINE_KEY not in geom_els:
+        geom_els[LINE_KEY] = el
+
+
+def source_geometry_from_feature(feature_el, geom_els=None, dim=None):
     """
     Finn geometri uansett prefix/namespace.
     Støtter vanlige typer i FKB-ish GML.
+    Koordinatene er fortsatt i kilde-CRS (numpy-arrays).
+    geom_els kan komme fra classify_feature, så slipper jeg å gå gjennom treet på nytt.
+    dim: srsDimension for posList som ikke har den selv (se feature_crs).
     """
+    if geom_els is None:
+        geom_els = find_geometry_elements(feature_el)
+
     # Multi* først
-    multi_surface = first(feature_el, ".//*[local-name()='MultiSurface']")
+    multi_surface = geom_els.get("MultiSurface")
     if multi_surface is not None:
         polys = []
-        surfaces = multi_surface.xpath(".//*[local-name()='Surface']")
-        for s in surfaces:
-            g = parse_surface(s, transformer)
+        for s in multi_surface.iterdescendants("{*}Surface"):
+            g = parse_surface(s, dim)
             if g and g["type"] == "Polygon":
                 polys.append(g["coordinates"])
         if polys:
             return {"type": "MultiPolygon", "coordinates": polys}
 
-    multi_curve = first(feature_el, ".//*[local-name()='MultiCurve']")
+    multi_curve = geom_els.get("MultiCurve")
     if multi_curve is not None:
         lines = []
-        curves = multi_curve.xpath(".//*[local-name()='Curve'] | .//*[local-name()='LineString']")
-        for c in curves:
-            g = parse_linestring_like(c, transformer)
+        for c in multi_curve.iterdescendants("{*}Curve", "{*}LineString"):
+            g = parse_linestring_like(c, dim)
             if g and g["type"] == "LineString":
                 lines.append(g["coordinates"])
         if lines:
             return {"type": "MultiLineString", "coordinates": lines}
 
     # Enkelt-geometrier
-    point_el = first(feature_el, ".//*[local-name()='Point']")
+    point_el = geom_els.get("Point")
     if point_el is not None:
-        return parse_point(point_el, transformer)
+        return parse_point(point_el)
 
-    ls_el = first(feature_el, ".//*[local-name()='LineString'] | .//*[local-name()='Curve']")
+    ls_el = geom_els.get(LINE_KEY)
     if ls_el is not None:
-        return parse_linestring_like(ls_el, transformer)
+        return parse_linestring_like(ls_el, dim)
 
-    poly_el = first(feature_el, ".//*[local-name()='Polygon']")
+    poly_el = geom_els.get("Polygon")
     if poly_el is not None:
-        return parse_polygon_like(poly_el, transformer)
+        return parse_polygon_like(poly_el, dim)
 
-    surface_el = first(feature_el, ".//*[local-name()='Surface']")
+    surface_el = geom_els.get("Surface")
     if surface_el is not None:
-        return parse_surface(surface_el, transformer)
+        return parse_surface(surface_el, dim)
 
     return None
 
 
+def geometry_from_feature(feature_el, transformer):
+    """
+    Geometrien til featuren som GeoJSON (reprojisert med transformer).
+    """
+    return transform_geometry(source_geometry_from_feature(feature_el), transformer)
+
+
 def feature_id(feature_el, fallback):
     return (
         feature_el.get(GML32_ID)
@@ -257,84 +605,106 @@ def find_feature_elements(root):
 def strip_ns(tag):
     return tag.split("}", 1)[-1] if "}" in tag else tag
 
-def extract_properties(feature_el):
+def local_name(tag):
+    name = _local_names.get(tag)
+    if name is None:
+        name = _local_names[tag] = strip_ns(tag)
+    return name
+
+
+def classify_feature(feature_el):
     """
-    Henter:
-    - Leaf-tekstfelter (som før)
-    - 'featureType' = elementnavnet til selve feature (veldig nyttig)
-    - prøver å hente type/kode fra vanlige felt i FKB/GML
+    Går gjennom feature-treet én gang og samler både
+    - første geometri-element av hver type (til source_geometry_from_feature)
+    - properties (se extract_properties)
+
+    Geometri-subtreet (første element med geometrinavn) tas ikke med i
+    properties. Jeg teller hvor mange noder det har, og hopper over så mange
+    videre i gjennomgangen (iter() går i dokumentrekkefølge).
     """
     props = {}
 
     # featureType: navnet på feature-elementet (f.eks. ArealbrukFlate / Idrettsanlegg)
     props["featureType"] = strip_ns(feature_el.tag)
 
-    # Ikke ta med geometri-subtreet
-    geom = first(
-        feature_el,
-        ".//*[local-name()='Point' or local-name()='LineString' or local-name()='Polygon' "
-        "or local-name()='Curve' or local-name()='Surface' "
-        "or local-name()='MultiSurface' or local-name()='MultiCurve' or local-name()='MultiPoint' or local-name()='MultiPolygon']"
-    )
-    geom_nodes = set(geom.iter()) if geom is not None else set()
+    geom_els = {}
+    geom_root = None
+    geom_left = 0
+    name_el = None
+    desc_el = None
+    attr_hits = []
 
-    # 1) Leaf-tekstfelter
     for el in feature_el.iter():
-        if el is feature_el:
-            continue
-        if el in geom_nodes:
-            continue
-        if len(el) > 0:
-            continue
+        in_geom = geom_left > 0
+        if in_geom:
+            geom_left -= 1
 
-        text = (el.text or "").strip()
-        if not text:
+        tag = el.tag
+        if not isinstance(tag, str):
             continue
 
-        key = strip_ns(el.tag)
+        if el is not feature_el:
+            name = local_name(tag)
 
-        # Kollisjonshåndtering
-        if key in props and props[key] != text:
-            i = 2
-            while f"{key}_{i}" in props:
-                i += 1
-            props[f"{key}_{i}"] = text
-        else:
-            props[key] = text
+            if name in GEOMETRY_NAMES:
+                note_geometry_element(geom_els, name, el)
+                if geom_root is None:
+                    # Ikke ta med geometri-subtreet
+                    geom_root = el
+                    geom_left = sum(1 for _ in el.iter()) - 1
+                    in_geom = True
+
+            # gml:name / gml:description (første i hele featuren, som før)
+            if name == "name" and name_el is None:
+                name_el = el
+            elif name == "description" and desc_el is None:
+                desc_el = el
+
+            if in_geom:
+                continue
 
-        # Hvis feltet ser ut som "kode"/"type", legg det også i en mer standard nøkkel
-        lk = key.lower()
-        if lk in ("objekttype", "type", "arealtype", "arealbrukstype", "kode"):
-            props.setdefault("typeLabel", text)
+            # 1) Leaf-tekstfelter
+            if len(el) == 0:
+                # intern: like verdier (koder, codeSpace-URL-er, datoer) deler ett str-objekt
+                text = intern((el.text or "").strip())
+                if text:
+                    key = name
+
+                    # Kollisjonshåndtering
+                    if key in props and props[key] != text:
+                        i = 2
+                        while f"{key}_{i}" in props:
+                            i += 1
+                        props[f"{key}_{i}"] = text
+                    else:
+                        props[key] = text
+
+                    # Hvis feltet ser ut som "kode"/"type", legg det også i en mer standard nøkkel
+                    if key.lower() in ("objekttype", "type", "arealtype", "arealbrukstype", "kode"):
+                        props.setdefault("typeLabel", text)
+
+        # Attributter tas til slutt (steg 3), men samles opp her
+        for k, v in el.attrib.items():
+            k2 = local_name(k).lower()
+            if k2 in ("codespace", "href", "type", "kode"):
+                attr_hits.append((local_name(tag), k2, intern(v)))
 
     # 2) Prøv å hente gml:name / gml:description (ofte fylt)
-    gml_name = first(feature_el, ".//*[local-name()='name']")
-    if gml_name is not None and (gml_name.text or "").strip():
-        props.setdefault("name", gml_name.text.strip())
+    if name_el is not None and (name_el.text or "").strip():
+        props.setdefault("name", name_el.text.strip())
 
-    gml_desc = first(feature_el, ".//*[local-name()='description']")
-    if gml_desc is not None and (gml_desc.text or "").strip():
-        props.setdefault("description", gml_desc.text.strip())
+    if desc_el is not None and (desc_el.text or "").strip():
+        props.setdefault("description", desc_el.text.strip())
 
     # 3) Ta med "kode"-info hvis den ligger i attributter (codeSpace / href etc.)
     # (Vanlig: <app:arealbrukstype codeSpace="...">123</app:arealbrukstype>)
-    for el in feature_el.iter():
-        if el in geom_nodes:
-            continue
-        if not isinstance(el.tag, str):
-            continue
+    for base, k2, v in attr_hits:
+        props.setdefault(f"{base}_{k2}", v)
 
-        # ser etter codeSpace/xlink:href eller andre attributter
-        for k, v in (el.attrib or {}).items():
-            k2 = strip_ns(k).lower()
-            if k2 in ("codespace", "href", "type", "kode"):
-                base = strip_ns(el.tag)
-                props.setdefault(f"{base}_{k2}", v)
-
-                # Hvis dette elementet høres ut som en klassifisering: putt i typeLabel også
-                base_l = base.lower()
-                if any(s in base_l for s in ("type", "kode", "kategori", "areal", "formål", "idrett")):
-                    props.setdefault("typeLabel", v)
+        # Hvis dette elementet høres ut som en klassifisering: putt i typeLabel også
+        base_l = base.lower()
+        if any(s in base_l for s in ("type", "kode", "kategori", "areal", "formål", "idrett")):
+            props.setdefault("typeLabel", v)
 
     # 4) Hvis jeg fortsatt ikke har en god "typeLabel", prøv en heuristikk:
     # velg første property som inneholder "type/kode" i nøkkelen
@@ -345,47 +715,906 @@ def extract_properties(feature_el):
                 props["typeLabel"] = v
                 break
 
-    return props
+    return geom_els, props
+
 
+def extract_properties(feature_el):
+    """
+    Henter:
+    - Leaf-tekstfelter (som før)
+    - 'featureType' = elementnavnet til selve feature (veldig nyttig)
+    - prøver å hente type/kode fra vanlige felt i FKB/GML
+    """
+    return classify_feature(feature_el)[1]
 
 
+# ----------------- Filtrering før konvertering (--bbox, --include-types, --exclude-types) -----------------
+# Avgjøres uten properties, geometri eller reprojisering: featureType fra tag-en,
+# og bbox fra gml:boundedBy eller min/maks av tallene i pos/posList.
+# Da koster features som filtreres bort nesten ingenting.
 
-def main():
-    tree = etree.parse(INPUT_GML)
-    root = tree.getroot()
+def feature_envelope(feat_el, default_src):
+    """
+    (minx, miny, maxx, maxy, CRS) for featuren, uten å bygge geometrien:
+    featurens egen gml:boundedBy/gml:Envelope hvis den finnes, ellers min/maks
+    av alle pos/posList. Gir None hvis featuren ikke har koordinater.
+    """
+    bounded = feat_el.find("{*}boundedBy")
+    env = first_tag(bounded, "{*}Envelope") if bounded is not None else None
+    if env is not None:
+        lower = first_tag(env, "{*}lowerCorner")
+        upper = first_tag(env, "{*}upperCorner")
+        if lower is not None and upper is not None:
+            lo = parse_numbers(lower.text)
+            hi = parse_numbers(upper.text)
+            if len(lo) >= 2 and len(hi) >= 2:
+                src = epsg_from_srsname(env.get("srsName")) or default_src
+                return lo[0], lo[1], hi[0], hi[1], src
+
+    src, dim = feature_crs(find_geometry_elements(feat_el), default_src)
+    parts = []
+    for el in feat_el.iterdescendants("{*}posList", "{*}pos"):
+        if not (el.text or "").strip():
+            continue
+        if local_name(el.tag) == "posList":
+            parts.append(poslist_coords(el, dim))
+        else:
+            parts.append(parse_numbers(el.text)[:2].reshape(-1, 2))
+    if not parts:
+        return None
+    xy = np.concatenate(parts)
+    if not len(xy):
+        return None
+    (minx, miny), (maxx, maxy) = xy.min(axis=0), xy.max(axis=0)
+    return minx, miny, maxx, maxy, src
 
-    transformer, detected_src = pick_transformer(root)
-    print(f"Bruker kilde-CRS: {detected_src}  →  {TARGET_EPSG}")
 
-    feature_els = find_feature_elements(root)
-    print(f"Fant {len(feature_els)} feature-elementer i fila")
+@lru_cache(maxsize=32)
+def bbox_in_crs(bbox, bbox_crs, src):
+    """
+    bbox (minx, miny, maxx, maxy i bbox_crs) som bbox i src.
+    Kantene tettes med punkter, så en bbox i grader dekker hele området i UTM.
+    """
+    if same_crs(bbox_crs, src):
+        return bbox
+    return get_transformer(bbox_crs, src).transform_bounds(*bbox, densify_pts=21)
+
+
+def make_feature_filter(default_src, include_types=None, exclude_types=None, bbox=None, bbox_crs=None):
+    """
+    Lager keep(feat_el) -> bool, eller None hvis ingenting skal filtreres.
+    include_types/exclude_types: featureType (elementnavnet uten namespace).
+    bbox: (minx, miny, maxx, maxy) i bbox_crs ("source" = default_src);
+    features beholdes hvis bbox-en deres overlapper.
+    """
+    if not (include_types or exclude_types or bbox):
+        return None
+    include = frozenset(include_types) if include_types else None
+    exclude = frozenset(exclude_types or ())
+    if bbox is not None:
+        bbox = tuple(float(v) for v in bbox)
+        bbox_crs = default_src if bbox_crs in (None, "source") else bbox_crs
+
+    def keep(feat_el):
+        ftype = local_name(feat_el.tag)
+        if (include is not None and ftype not in include) or ftype in exclude:
+            return False
+        if bbox is None:
+            return True
+        env = feature_envelope(feat_el, default_src)
+        if env is None:
+            return False
+        minx, miny, maxx, maxy, src = env
+        bminx, bminy, bmaxx, bmaxy = bbox_in_crs(bbox, bbox_crs, src)
+        return not (maxx < bminx or minx > bmaxx or maxy < bminy or miny > bmaxy)
+
+    return keep
+
+
+def prepare_feature(feat_el, index, default_src=DEFAULT_SOURCE_EPSG, measures=True, inherited=(None, None)):
+    """
+    Første halvdel av konverteringen, alt som trenger XML-elementet:
+    properties, kildegeometri, kilde-CRS (srsName på featuren, ellers default_src)
+    og mål (regnet i featurens eget CRS, se geometry_measures).
+    inherited: se feature_crs.
+    Gir (properties, kildegeometri, kilde-CRS, centroid, id), eller None hvis
+    jeg ikke finner geometri. Reprojiseringen gjøres i finish_features.
+    """
+    with TIMER("extract_properties"):
+        geom_els, props = classify_feature(feat_el)
+    src, dim = feature_crs(geom_els, default_src, inherited)
+
+    with TIMER("geometry_from_feature"):
+        source_geom = source_geometry_from_feature(feat_el, geom_els, dim)
+    if source_geom is None:
+        return None
+
+    centroid = EMPTY_XY
+    if measures:
+        with TIMER("measures"):
+            measured, centroid = geometry_measures(source_geom, crs_is_metric(src))
+        props.update(measured)
 
-    features = []
-    skipped = 0
+    return props, source_geom, src, centroid, feature_id(feat_el, f"feature_{index}")
 
-    for i, feat_el in enumerate(feature_els):
-        geom = geometry_from_feature(feat_el, transformer)
-        if geom is None:
-            skipped += 1
+
+def finish_features(prepared, target_crs=TARGET_EPSG, measures=True, keep_keys=None, keep_source_crs=None):
+    """
+    Andre halvdel: reprojiserer en liste fra prepare_feature og lager GeoJSON-features.
+    Punktene til alle features med samme kilde-CRS slås sammen til ett transform-kall,
+    og features som allerede er i target_crs reprojiseres ikke.
+    Gir [(feature, kildegeometri) eller None] i samme rekkefølge.
+    keep_source_crs: kildegeometrier i et annet CRS reprojiseres til dette, så
+    forenkling/TopoJSON/dissolve får alle geometriene i samme CRS.
+    """
+    by_crs = defaultdict(list)
+    for i, item in enumerate(prepared):
+        if item is not None:
+            by_crs[item[2]].append(i)
+
+    points = [None] * len(prepared)
+    with TIMER("transform"):
+        for src, indices in by_crs.items():
+            stacks = [stack_geometry(prepared[i][1], prepared[i][3]) for i in indices]
+            xy = np.concatenate(stacks)
+            if len(xy) and not same_crs(src, target_crs):
+                x, y = get_transformer(src, target_crs).transform(xy[:, 0], xy[:, 1])
+                xy = np.column_stack([x, y])
+                TIMER.count("vertices_transformed", len(xy))
+            pos = 0
+            for i, stack in zip(indices, stacks):
+                points[i] = xy[pos:pos + len(stack)]
+                pos += len(stack)
+
+        out = []
+        for item, lonlat in zip(prepared, points):
+            if item is None:
+                out.append(None)
+                continue
+            props, source_geom, src, centroid, fid = item
+            geom, bbox, centroid = unstack_geometry(source_geom, lonlat, len(centroid))
+
+            if len(centroid):
+                props["centroid_lon"] = round(float(centroid[0, 0]), 7)
+                props["centroid_lat"] = round(float(centroid[0, 1]), 7)
+
+            props["id"] = fid  # behold id uansett
+            if keep_keys is not None:
+                props = prune_properties(props, keep_keys)
+
+            feature = {
+                "type": "Feature",
+                "properties": props,
+                "geometry": geom
+            }
+            if measures and bbox is not None:
+                feature["bbox"] = bbox
+            if keep_source_crs is not None and not same_crs(src, keep_source_crs):
+                source_geom = reproject_source_geometry(source_geom, get_transformer(src, keep_source_crs))
+            out.append((feature, source_geom))
+    return out
+
+
+def convert_feature_with_source(
+    feat_el, index, default_src=DEFAULT_SOURCE_EPSG, target_crs=TARGET_EPSG, measures=True, keep_keys=None,
+):
+    """
+    Som convert_feature, men gir (feature, kildegeometri).
+    Kildegeometrien (numpy, kilde-CRS) brukes av steg som må jobbe i meter,
+    f.eks. forenkling. Gir (None, None) hvis jeg ikke finner geometri.
+    measures=True legger til areal/omkrets/lengde, centroid og bbox
+    (se geometry_measures). keep_keys: behold bare disse properties (+ id).
+    """
+    prepared = prepare_feature(feat_el, index, default_src, measures)
+    return finish_features([prepared], target_crs, measures, keep_keys)[0] or (None, None)
+
+
+def convert_feature(
+    feat_el, index, default_src=DEFAULT_SOURCE_EPSG, target_crs=TARGET_EPSG, measures=True, keep_keys=None,
+):
+    """
+    Lager ett GeoJSON-feature av et feature-element.
+    Returnerer None hvis jeg ikke finner geometri.
+    """
+    return convert_feature_with_source(feat_el, index, default_src, target_crs, measures, keep_keys)[0]
+
+
+def iter_streamed_features(path):
+    """
+    Streaming-variant av find_feature_elements (for filer som ikke får plass i RAM).
+    Leser fila med iterparse og gir (feature_el, root) for hvert
+    featureMember/member. Elementet tømmes når neste feature hentes,
+    så minnebruken holder seg omtrent konstant uansett filstørrelse.
+    """
+    seen_feature_member = False
+
+    for _event, member in etree.iterparse(
+        path, events=("end",), tag=MEMBER_TAGS, huge_tree=True
+    ):
+        # Samme prioritet som find_feature_elements: featureMember før *:member
+        if strip_ns(member.tag) == "featureMember":
+            seen_feature_member = True
+        elif seen_feature_member:
             continue
 
-        fid = feature_id(feat_el, f"feature_{i}")
+        # member inne i en annen member er en del av en feature, ikke en ny feature
+        if next(member.iterancestors(*MEMBER_TAGS), None) is not None:
+            continue
+
+        children = [c for c in member if isinstance(c.tag, str)]
+        if children:
+            yield children[0], member.getroottree().getroot()
+
+        # Frigjør minnet: tøm elementet og fjern søsken som allerede er behandlet
+        member.clear(keep_tail=True)
+        parent = member.getparent()
+        if parent is not None:
+            while member.getprevious() is not None:
+                del parent[0]
+
+
+def iter_feature_elements(input_gml, stream, progress=None):
+    """
+    Gir (feature_el, root) for alle features i fila.
+    stream=True: iterparse (konstant minne), ellers parses hele fila først.
+    progress (valgfri) får vite hvor mye som gjenstår: antall features,
+    eller hvor langt i fila iterparse har kommet.
+    """
+    if stream:
+        with open(input_gml, "rb") as f:
+            if progress is not None:
+                size = os.fstat(f.fileno()).st_size
+                progress.fraction = lambda: f.tell() / size if size else 1.0
+            # Ved --stream skjer selve parsingen her, så den telles med i dette steget
+            yield from TIMER.iterate("find_feature_elements", iter_streamed_features(f))
+        return
+
+    with TIMER("parse"):
+        root = etree.parse(input_gml).getroot()
+    with TIMER("find_feature_elements"):
+        feature_els = find_feature_elements(root)
+    print(f"Fant {len(feature_els)} feature-elementer i fila")
+    if progress is not None:
+        progress.total = len(feature_els)
+    for feat_el in feature_els:
+        yield feat_el, root
 
-        props = extract_properties(feat_el)
-        props["id"] = fid  # behold id uansett
 
-        features.append({
-            "type": "Feature",
-            "properties": props,
-            "geometry": geom
-        })
+def count_crs(prepared, counts):
+    """
+    Teller features per kilde-CRS (for rapporten når fila blander CRS).
+    """
+    for item in prepared:
+        if item is not None:
+            counts[item[2]] = counts.get(item[2], 0) + 1
+    return counts
+
+
+# ----------------- Parallell konvertering (--workers) -----------------
+# Hver prosess får serialisert XML for en bit (chunk) av features.
+# Transformere lages ved behov og huskes per CRS i hver prosess (get_transformer).
+
+_worker_default_src = DEFAULT_SOURCE_EPSG
+_worker_target_crs = TARGET_EPSG
+_worker_parser = None
+_worker_keep_source = False
+_worker_measures = True
+_worker_keep_keys = None
+
+
+def _init_worker(default_src, target_crs, keep_source, profile=False, measures=True, keep_keys=None):
+    global _worker_default_src, _worker_target_crs, _worker_parser, _worker_keep_source
+    global _worker_measures, _worker_keep_keys
+    _worker_default_src = default_src
+    _worker_target_crs = target_crs
+    _worker_parser = etree.XMLParser(huge_tree=True)
+    _worker_keep_source = keep_source
+    _worker_measures = measures
+    _worker_keep_keys = keep_keys
+    TIMER.enabled = profile
+
+
+def _convert_chunk(chunk):
+    indices, xml_list, inherited_list = chunk
+    prepared = []
+    for index, xml, inherited in zip(indices, xml_list, inherited_list):
+        with TIMER("parse_chunk"):
+            feat_el = etree.fromstring(xml, _worker_parser)
+        prepared.append(prepare_feature(feat_el, index, _worker_default_src, _worker_measures, inherited))
+
+    done = finish_features(
+        prepared, _worker_target_crs, _worker_measures, _worker_keep_keys,
+        _worker_default_src if _worker_keep_source else None,
+    )
+    features = [item if _worker_keep_source else item[0] for item in done if item is not None]
+    skipped = len(done) - len(features)
+    # Stegtidene fra denne prosessen sendes med resultatet (None uten --profile)
+    return features, skipped, count_crs(prepared, {}), TIMER.take()
 
-    geojson = {"type": "FeatureCollection", "features": features}
 
-    with open(OUTPUT_GEOJSON, "w", encoding="utf-8") as f:
-        json.dump(geojson, f, ensure_ascii=False, indent=2)
+def iter_xml_chunks(feature_els, chunk_size):
+    """
+    Serialiserer (indeks, feature_el)-par i biter på chunk_size.
+    Indeksene (plassen i fila) sendes med, så feature_{i}-id-ene blir de
+    samme som når alt kjøres i én prosess, også når noen er filtrert bort.
+    srsName/srsDimension fra featureMember og rot forsvinner med serialiseringen,
+    så de leses her (ancestor_crs) og sendes med hver feature.
+    """
+    indices = []
+    chunk = []
+    inherited = []
+    for i, feat_el in feature_els:
+        indices.append(i)
+        with TIMER("serialize_chunk"):
+            chunk.append(etree.tostring(feat_el, encoding="utf-8", with_tail=False))
+            inherited.append(ancestor_crs(feat_el.getparent()))
+        if len(chunk) >= chunk_size:
+            yield indices, chunk, inherited
+            indices = []
+            chunk = []
+            inherited = []
+    if chunk:
+        yield indices, chunk, inherited
+
+
+def map_ordered(executor, fn, items, window):
+    """
+    Som executor.map, men med maks `window` jobber i lufta om gangen.
+    Da leses ikke hele fila inn i køen (viktig sammen med --stream),
+    og resultatene kommer i samme rekkefølge som input.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def convert_features(
+    elements, stats, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, keep_source=False, measures=True,
+    keep_keys=None, target_crs=TARGET_EPSG, select=None,
+):
+    """
+    Konverterer (feature_el, root)-par til GeoJSON-features i target_crs, i fil-rekkefølge.
+    Teller funnet/hoppet over i stats, kilde-CRS for features uten egen srsName i
+    stats["source_crs"] og antall features per kilde-CRS i stats["crs"].
+    keep_source=True gir (feature, kildegeometri) i stedet for bare feature;
+    kildegeometriene er da alle i stats["source_crs"].
+    measures=False: ikke legg til areal/centroid/bbox.
+    keep_keys: behold bare disse properties (+ id).
+    select: valg til make_feature_filter (include_types, exclude_types, bbox, bbox_crs);
+    features som filtreres bort telles i stats["filtered"].
+    Reprojiseringen gjøres samlet for chunk_size features om gangen.
+    """
+    elements = iter(elements)
+    first_item = next(elements, None)
+    if first_item is None:
+        return
+
+    # Ved --stream finnes bare det som er lest så langt i treet, så dette blir
+    # uansett første srsName i dokumentet
+    _transformer, detected_src = pick_transformer(first_item[1])
+    if same_crs(detected_src, target_crs):
+        print(f"Bruker kilde-CRS: {detected_src}  (samme som målet, reprojiserer ikke)")
+    else:
+        print(f"Bruker kilde-CRS: {detected_src}  →  {target_crs}")
+    stats["source_crs"] = detected_src
+    stats["crs"] = {}
+    stats["filtered"] = 0
+    keep_source_crs = detected_src if keep_source else None
+    keep = make_feature_filter(detected_src, **(select or {}))
+
+    def feature_els():
+        # Filteret kjøres her, før properties/geometri og før serialisering til andre prosesser
+        for i, (feat_el, _root) in enumerate(chain([first_item], elements)):
+            stats["found"] += 1
+            if keep is not None:
+                with TIMER("filter"):
+                    kept = keep(feat_el)
+                if not kept:
+                    stats["filtered"] += 1
+                    continue
+            yield i, feat_el
+
+    if workers <= 1:
+        batch = []
+        for i, feat_el in feature_els():
+            batch.append(prepare_feature(feat_el, i, detected_src, measures))
+            if len(batch) < chunk_size:
+                continue
+            yield from finish_batch(batch, stats, target_crs, measures, keep_keys, keep_source_crs)
+            batch = []
+        yield from finish_batch(batch, stats, target_crs, measures, keep_keys, keep_source_crs)
+        return
+
+    chunks = iter_xml_chunks(feature_els(), chunk_size)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker,
+        initargs=(detected_src, target_crs, keep_source, TIMER.enabled, measures, keep_keys),
+    ) as executor:
+        for features, skipped, crs, timings in map_ordered(executor, _convert_chunk, chunks, workers * 2):
+            stats["skipped"] += skipped
+            for src, n in crs.items():
+                stats["crs"][src] = stats["crs"].get(src, 0) + n
+            TIMER.merge(timings)
+            yield from features
+
+
+def finish_batch(batch, stats, target_crs, measures, keep_keys, keep_source_crs):
+    """
+    finish_features for én bit i hovedprosessen, med telling i stats.
+    """
+    count_crs(batch, stats["crs"])
+    for item in finish_features(batch, target_crs, measures, keep_keys, keep_source_crs):
+        if item is None:
+            stats["skipped"] += 1
+        else:
+            yield item if keep_source_crs is not None else item[0]
+
+
+def variant_path(output, suffix):
+    """
+    output.geojson -> output.<suffix>.geojson
+    """
+    stem, ext = os.path.splitext(output)
+    return f"{stem}.{suffix}{ext}"
+
+
+def write_simplified_variants(args, collected, source_crs, topology):
+    """
+    Forenkler geometriene (topologibevarende, i kilde-CRS) og skriver én fil per
+    toleranse ved siden av hovedfila. Skriver også en rapport per featureType
+    med antall punkter og bytes før/etter.
+    collected: liste med (properties, kildegeometri, bytes i hovedfila med vanlige
+    properties, også med --dict-properties)
+    """
+    transformer = get_transformer(source_crs, args.target_crs)
+
+    variants = [(f"simplified_{t:g}m", t) for t in args.simplify]
+    if args.simplify_zooms:
+        # Toleransen for en zoom avhenger av breddegraden; bruk første feature
+        # (alltid i grader, uansett --target-crs)
+        lat = next(
+            (transform_geometry(g, get_transformer(source_crs)) for _p, g, _n in collected if g is not None),
+            {"type": "Point", "coordinates": [0.0, 60.0]},
+        )
+        lat = first_coordinate(lat)[1]
+        variants += [(f"z{z}", tolerance_for_zoom(z, lat)) for z in args.simplify_zooms]
+
+    for suffix, tolerance in variants:
+        path = variant_path(args.output, suffix)
+        report = defaultdict(lambda: [0, 0, 0, 0, 0])  # features, punkter før/etter, bytes før/etter
+
+        with open_writer(path, args.format, args.precision, epsg_code(args.target_crs)) as writer:
+            for (props, source_geom, nbytes), simple in zip(collected, topology.simplified(tolerance)):
+                row = report[props["featureType"]]
+                row[0] += 1
+                row[1] += count_vertices(source_geom)
+                row[3] += nbytes
+                if simple is None:
+                    continue  # for liten til å overleve forenklingen
+                row[2] += count_vertices(simple)
+                row[4] += writer.write({
+                    "type": "Feature",
+                    "properties": props,
+                    "geometry": transform_geometry(simple, transformer),
+                })
+
+        print(f"\nSkrev {writer.count} features til {path} (toleranse {tolerance:.2f} m)")
+        print(f"  {'featureType':<28}{'features':>9}{'punkter':>18}{'bytes':>24}")
+        for ftype, (n, v0, v1, b0, b1) in sorted(report.items()):
+            print(
+                f"  {ftype:<28}{n:>9}"
+                f"{v0:>9} → {v1:<7}{b0:>11} → {b1:<10}"
+                f"({percent_smaller(v0, v1)} / {percent_smaller(b0, b1)} mindre)"
+            )
+
+
+def write_topojson_output(args, collected, source_crs, topology):
+    """
+    Skriver TopoJSON med delte kanter lagret én gang (kvantisert og delta-kodet),
+    og sammenligner størrelsen med hovedfila.
+    Hvert unike punkt reprojiseres bare én gang, selv om det brukes av flere ringer.
+    """
+    transformer = get_transformer(source_crs, args.target_crs)
+    geoms = [g for _p, g, _n in collected]
+    name = os.path.splitext(os.path.basename(args.topojson))[0]
+
+    topo = build_topojson(
+        geoms,
+        [p for p, _g, _n in collected],
+        transformer,
+        name,
+        quantization=args.quantization,
+        precision=args.precision,
+        topology=topology,
+    )
+    size = write_topojson(args.topojson, topo)
+    stats = topology_stats(topology, geoms)
+    main_size = os.path.getsize(args.output)
+
+    print(f"\nSkrev {len(collected)} features til {args.topojson} (TopoJSON)")
+    print(
+        f"  punkter: {stats['vertices']} i GeoJSON → {stats['unique_vertices']} unike "
+        f"({percent_smaller(stats['vertices'], stats['unique_vertices'])} færre å reprojisere)"
+    )
+    print(f"  kanter:  {stats['arcs']}, hvorav {stats['shared_arcs']} delt mellom flere features")
+    print(
+        f"  bytes:   {main_size} ({os.path.basename(args.output)}) → {size} "
+        f"({percent_smaller(main_size, size)} mindre)"
+    )
+
+
+def write_dissolved(args, collected, source_crs):
+    """
+    Slår sammen flatene per verdi av hver --dissolve-nøkkel (i kilde-CRS, parallelt)
+    og skriver ett ekstra lag per nøkkel ved siden av hovedfila.
+    """
+    # Importeres her, så vanlig konvertering ikke trenger shapely
+    from dissolve import dissolve_features
+
+    transformer = get_transformer(source_crs, args.target_crs)
+    props = [p for p, _g, _n in collected]
+    geoms = [g for _p, g, _n in collected]
+
+    for key in args.dissolve:
+        features = dissolve_features(
+            props, geoms, key, transformer,
+            metric=crs_is_metric(source_crs), workers=args.workers,
+        )
+        path = variant_path(args.output, f"dissolved_{key}")
+        with open_writer(path, args.format, args.precision, epsg_code(args.target_crs)) as writer:
+            writer.write_all(features)
+        print(f"\nSkrev {writer.count} sammenslåtte flater (dissolve per {key}) til {path}")
+        for feature in features:
+            p = feature["properties"]
+            print(f"  {str(p[key]):<28}{p['feature_count']:>9} flater")
+
+
+def first_coordinate(geom):
+    c = geom["coordinates"]
+    while isinstance(c[0], list):
+        c = c[0]
+    return c
+
+
+def percent_smaller(before, after):
+    if not before:
+        return "0%"
+    return f"{100 * (before - after) / before:.0f}%"
+
+
+def build_arg_parser():
+    ap = argparse.ArgumentParser(
+        description="Konverter FKB/GML til GeoJSON (EPSG:4326)."
+    )
+    ap.add_argument("--input", default=INPUT_GML, help="GML-fil som skal konverteres")
+    ap.add_argument("--output", default=OUTPUT_GEOJSON, help="GeoJSON-fil som skrives")
+    ap.add_argument(
+        "--target-crs",
+        default=TARGET_EPSG,
+        help=(
+            f"CRS det skrives i (standard {TARGET_EPSG}). Features som allerede er i dette "
+            "CRS-et reprojiseres ikke. GeoJSON skal egentlig være EPSG:4326"
+        ),
+    )
+    ap.add_argument(
+        "--bbox",
+        type=float,
+        nargs=4,
+        default=None,
+        metavar=("MINX", "MINY", "MAXX", "MAXY"),
+        help="Bare features med bbox som overlapper dette området (f.eks. sentrum i stedet for hele kommunen)",
+    )
+    ap.add_argument(
+        "--bbox-crs",
+        default=None,
+        help="CRS for --bbox: EPSG-kode, eller 'source' for kilde-CRS i fila (standard: --target-crs)",
+    )
+    ap.add_argument(
+        "--include-types",
+        nargs="+",
+        default=None,
+        metavar="FEATURETYPE",
+        help="Bare disse featureType-ene (elementnavnet, f.eks. Alpinbakke Idrettsanlegg)",
+    )
+    ap.add_argument(
+        "--exclude-types",
+        nargs="+",
+        default=None,
+        metavar="FEATURETYPE",
+        help="Hopp over disse featureType-ene",
+    )
+    ap.add_argument(
+        "--stream",
+        action="store_true",
+        help="Les fila med iterparse og skriv features fortløpende (konstant minnebruk)",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Antall prosesser som konverterer features (1 = ingen parallellisering)",
+    )
+    ap.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Antall features per jobb som sendes til en prosess, og per samlet reprojisering",
+    )
+    ap.add_argument(
+        "--simplify",
+        type=float,
+        nargs="+",
+        default=[],
+        metavar="METER",
+        help="Skriv i tillegg forenklede varianter med disse toleransene (meter, i kilde-CRS)",
+    )
+    ap.add_argument(
+        "--simplify-zooms",
+        type=int,
+        nargs="+",
+        default=[],
+        metavar="ZOOM",
+        help="Skriv forenklede varianter tilpasset disse zoomnivåene (toleranse = 1 piksel)",
+    )
+    ap.add_argument(
+        "--topojson",
+        default=None,
+        metavar="FIL",
+        help="Skriv i tillegg TopoJSON med delte kanter lagret én gang",
+    )
+    ap.add_argument(
+        "--quantization",
+        type=int,
+        default=DEFAULT_QUANTIZATION,
+        help="Rutenett for TopoJSON-koordinater (Q x Q over bbox). 0 = ingen kvantisering",
+    )
+    ap.add_argument(
+        "--cache",
+        default=None,
+        metavar="MAPPE",
+        help=(
+            "Mellomlagre konverterte features (binært, i mål-CRS) i denne mappa. Neste kjøring på samme fil "
+            "med samme CRS/filter leser derfra i stedet for å parse XML (f.eks. for ny --precision/--keep-keys)"
+        ),
+    )
+    ap.add_argument(
+        "--no-measures",
+        action="store_true",
+        help=(
+            "Ikke legg til area_m2/perimeter_m (flater), length_m (linjer), "
+            "centroid_lon/centroid_lat og bbox på hver feature"
+        ),
+    )
+    ap.add_argument(
+        "--dissolve",
+        nargs="+",
+        choices=("featureType", "typeLabel"),
+        default=[],
+        metavar="NØKKEL",
+        help=(
+            "Skriv i tillegg sammenslåtte flater (dissolve) per featureType/typeLabel "
+            "til <output>.dissolved_<NØKKEL> (krever shapely)"
+        ),
+    )
+    ap.add_argument(
+        "--keep-keys",
+        nargs="+",
+        default=None,
+        metavar="NØKKEL",
+        help="Behold bare disse properties (id beholdes alltid, og featureType med --simplify), f.eks. featureType typeLabel name",
+    )
+    ap.add_argument(
+        "--dict-properties",
+        action="store_true",
+        help=(
+            "Lagre like tekstverdier én gang i en felles ordbok (<output>.dictionary.json) "
+            "og skriv heltallskoder i features"
+        ),
+    )
+    ap.add_argument(
+        "--dict-max-values",
+        type=int,
+        default=DEFAULT_MAX_VALUES,
+        help="Maks antall ulike verdier per nøkkel i ordboka; resten skrives som vanlig tekst",
+    )
+    ap.add_argument(
+        "--split-by",
+        choices=("featureType", "typeLabel"),
+        default=None,
+        help="Skriv i tillegg én fil per featureType/typeLabel, med manifest (index.json)",
+    )
+    ap.add_argument(
+        "--split-dir",
+        default=None,
+        metavar="MAPPE",
+        help="Mappe for filene fra --split-by (standard: output uten filendelse)",
+    )
+    add_output_arguments(ap)
+    add_profiling_arguments(ap)
+    return ap
+
+
+def open_layers(args):
+    """
+    LayeredWriter for --split-by, ellers en tom context (None).
+    """
+    if not args.split_by:
+        return nullcontext(None)
+    directory = args.split_dir or os.path.splitext(args.output)[0]
+    return LayeredWriter(
+        directory, args.split_by, fmt=args.format, precision=args.precision,
+        source=os.path.basename(args.input), epsg=epsg_code(args.target_crs),
+    )
+
+
+def print_layers(manifest, directory):
+    print(f"\nDelte opp i {len(manifest['layers'])} lag etter {manifest['split_by']} i {directory}")
+    for layer in manifest["layers"]:
+        print(f"  {layer['file']:<40}{layer['features']:>9} features{layer['bytes']:>13} bytes")
+
+
+def main(argv=None):
+    ap = build_arg_parser()
+    args = ap.parse_args(argv)
+    target = epsg_from_srsname(args.target_crs)
+    if target is None:
+        ap.error(f"--target-crs: fant ingen EPSG-kode i {args.target_crs!r}")
+    args.target_crs = target
+    if args.bbox is not None:
+        if args.bbox[0] > args.bbox[2] or args.bbox[1] > args.bbox[3]:
+            ap.error("--bbox: MINX/MINY må være mindre enn MAXX/MAXY")
+        if args.bbox_crs is None:
+            args.bbox_crs = args.target_crs
+        elif args.bbox_crs != "source":
+            bbox_crs = epsg_from_srsname(args.bbox_crs)
+            if bbox_crs is None:
+                ap.error(f"--bbox-crs: fant ingen EPSG-kode i {args.bbox_crs!r}")
+            args.bbox_crs = bbox_crs
+    with profile_run(args, TIMER, "gml_to_geojson") as info:
+        run(args, info)
+
+
+def open_geometry_cache(args):
+    """
+    (GeometryCache, None) hvis --cache har en ferdig cache for denne fila med disse valgene,
+    (None, GeometryCacheWriter) hvis den må lages i denne kjøringen, ellers (None, None).
+    """
+    if not args.cache:
+        return None, None
+    # Importeres her, så vanlig konvertering ikke trenger cache-modulen
+    from geometry_cache import GeometryCache, GeometryCacheWriter, cache_directory
+
+    # Bare valg som endrer selve features; format, presisjon, --keep-keys osv. brukes ved eksport
+    options = {
+        "converter_version": CONVERTER_VERSION,
+        "target_crs": args.target_crs,
+        "measures": not args.no_measures,
+        "include_types": args.include_types,
+        "exclude_types": args.exclude_types,
+        "bbox": args.bbox,
+        "bbox_crs": args.bbox_crs,
+    }
+    with TIMER("cache_key"):
+        directory = cache_directory(args.cache, args.input, options)
+    if GeometryCache.exists(directory):
+        return GeometryCache(directory), None
+    os.makedirs(args.cache, exist_ok=True)
+    return None, GeometryCacheWriter(directory)
+
+
+def run(args, info):
+    stats = {"found": 0, "skipped": 0}
+    keep_source = bool(args.simplify or args.simplify_zooms or args.topojson or args.dissolve)
+    progress = Progress(enabled=args.progress)
+    keep_keys = None
+    if args.keep_keys:
+        # Nøkkelen det deles opp etter må være med, og forenklingsrapporten grupperer på featureType
+        keep_keys = list(args.keep_keys) + ([args.split_by] if args.split_by else []) + args.dissolve
+        if args.simplify or args.simplify_zooms:
+            keep_keys.append("featureType")
+
+    cache, cache_writer = open_geometry_cache(args)
+    # Cachen lagrer alle properties, så --keep-keys brukes først ved eksport
+    prune_keys = keep_keys if args.cache else None
+    paired = keep_source or cache_writer is not None
+    if cache is not None:
+        print(f"Leser geometri-cache {cache.directory} ({len(cache)} features), hopper over XML og reprojisering")
+        stats.update(cache.meta["stats"])
+        progress.total = len(cache)
+        features = cache.features(with_source=keep_source)
+    else:
+        elements = iter_feature_elements(args.input, args.stream, progress)
+        features = convert_features(
+            elements, stats, args.workers, args.chunk_size, paired, measures=not args.no_measures,
+            keep_keys=None if args.cache else keep_keys, target_crs=args.target_crs,
+            select={
+                "include_types": args.include_types, "exclude_types": args.exclude_types,
+                "bbox": args.bbox, "bbox_crs": args.bbox_crs,
+            },
+        )
+    dictionary = PropertyDictionary(args.dict_max_values) if args.dict_properties else None
+
+    # Forenkling og TopoJSON trenger alle geometriene samtidig (delte kanter mellom naboer)
+    collected = []
+
+    with open_writer(args.output, args.format, args.precision, epsg_code(args.target_crs)) as writer, \
+            open_layers(args) as layers, cache_writer or nullcontext():
+        for item in features:
+            feature, source_geom = item if paired else (item, None)
+            if cache_writer is not None:
+                with TIMER("cache"):
+                    cache_writer.write(feature, source_geom)
+            if prune_keys is not None:
+                feature = {**feature, "properties": prune_properties(feature["properties"], prune_keys)}
+            props = feature["properties"]
+            if dictionary is not None:
+                with TIMER("dictionary"):
+                    feature = {**feature, "properties": dictionary.encode(props)}
+            with TIMER("serialize"):
+                nbytes = writer.write(feature)
+                if layers is not None:
+                    layers.write(feature, props.get(args.split_by))
+            if keep_source:
+                if args.workers > 1 or cache is not None:
+                    # Fra andre prosesser (og cachen) kommer hver verdi som egen str; del dem igjen
+                    props = {k: intern(v) if isinstance(v, str) else v for k, v in props.items()}
+                if dictionary is not None and (args.simplify or args.simplify_zooms):
+                    # Forenklingsrapporten skal sammenligne likt: variantene har vanlige properties
+                    nbytes = feature_size({**feature, "properties": props}, args.format, args.precision)
+                collected.append((props, source_geom, nbytes))
+            progress.update(writer.count if cache is not None else stats["found"])
+        written = writer.count
+    progress.finish(writer.count if cache is not None else stats["found"])
+
+    if cache_writer is not None:
+        with TIMER("cache"):
+            size = cache_writer.close({"input": os.path.abspath(args.input), "stats": stats})
+        print(f"Skrev geometri-cache til {cache_writer.directory} ({size / 1e6:.1f} MB)")
+
+    if args.stream:
+        print(f"Fant {stats['found']} feature-elementer i fila")
+    print(f" Skrev {written} features til {args.output} (hoppet over {stats['skipped']})")
+    if stats.get("filtered"):
+        print(f"Filtrerte bort {stats['filtered']} features (--bbox/--include-types/--exclude-types)")
+    if len(stats.get("crs", {})) > 1:
+        counts = ", ".join(f"{src} ({n})" for src, n in sorted(stats["crs"].items()))
+        print(f"Fila blander kilde-CRS: {counts}")
+    if layers is not None:
+        print_layers(layers.manifest, layers.directory)
+
+    if dictionary is not None:
+        path = dictionary_path(args.output)
+        size = dictionary.write(path)
+        d = dictionary.stats()
+        print(
+            f"Skrev ordbok til {path} ({size} bytes): {d['values']} verdier for {d['keys']} nøkler, "
+            f"{d['encoded']} kodede og {d['literal']} vanlige verdier i features"
+        )
+        if layers is not None:
+            # Lagene bruker de samme kodene
+            dictionary.write(os.path.join(layers.directory, "dictionary.json"))
+    info.update(
+        input=args.input, found=stats["found"], features=written, skipped=stats["skipped"],
+        filtered=stats.get("filtered", 0),
+    )
 
-    print(f" Skrev {len(features)} features til {OUTPUT_GEOJSON} (hoppet over {skipped})")
+    if collected and (args.simplify or args.simplify_zooms or args.topojson):
+        print("Bygger topologi (delte kanter) ...")
+        with TIMER("topology"):
+            topology = Topology([g for _p, g, _n in collected])
+        if args.simplify or args.simplify_zooms:
+            with TIMER("simplify"):
+                write_simplified_variants(args, collected, stats["source_crs"], topology)
+        if args.topojson:
+            with TIMER("topojson"):
+                write_topojson_output(args, collected, stats["source_crs"], topology)
+    if collected and args.dissolve:
+        with TIMER("dissolve"):
+            write_dissolved(args, collected, stats["source_crs"])
 
 
 if __name__ == "__main__":
@@ -2,48 +2,240 @@
 from __future__ import annotations
 
 import csv
-import json
+import hashlib
+import io
+import math
 import os
-from collections import defaultdict
-from typing import Dict, List, Tuple, Optional
+import time
+import zipfile
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from typing import IO, Callable, Dict, Iterator, List, Tuple, Optional, Union
 
+import numpy as np
 
-def read_shapes(shapes_path: str) -> Dict[str, List[Tuple[int, float, float]]]:
+from geojson_writer import add_output_arguments, replace_extension, write_features
+from profiling import Progress, StageTimer, add_profiling_arguments, profile_run
+from simplify import douglas_peucker_mask
+
+
+# Rows per bulk read of shapes.txt. Each block is converted to NumPy columns
+# in one go, so there is never a Python object per point for the whole file.
+SHAPES_BLOCK_ROWS = 500_000
+
+# Rows per stop_times.txt block sent to a worker process. At most
+# 2 * workers blocks are in flight, which bounds memory for any feed size.
+STOP_TIMES_BLOCK_ROWS = 200_000
+
+# Meters per degree of latitude (spherical earth; plenty for dedup tolerances)
+METERS_PER_DEGREE = 111_320.0
+
+# A file path, or an already opened text file (e.g. a member of a GTFS zip)
+PathOrFile = Union[str, IO[str]]
+
+# Stage times for --profile (a no-op until profile_run turns it on)
+TIMER = StageTimer(enabled=False)
+
+
+@contextmanager
+def open_text(source: PathOrFile) -> Iterator[IO[str]]:
     """
-    Returns dict: shape_id -> list of (sequence, lon, lat) sorted by sequence.
-    Keeps ONLY what we need for geometry.
+    Opens a path as GTFS text (UTF-8, BOM tolerated); open files pass through.
+    """
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8-sig", newline="") as f:
+            yield f
+    else:
+        yield source
+
+
+@contextmanager
+def open_gtfs_file(gtfs: str, name: str) -> Iterator[Optional[IO[str]]]:
+    """
+    Opens `name` (e.g. "trips.txt") from a GTFS directory or zip file.
+    Zip members are read directly from the archive. Yields None if the feed
+    has no such file.
+    """
+    if os.path.isdir(gtfs):
+        path = os.path.join(gtfs, name)
+        if not os.path.exists(path):
+            yield None
+            return
+        with open_text(path) as f:
+            yield f
+        return
+
+    with zipfile.ZipFile(gtfs) as zf:
+        # Some feeds put the files in a sub folder inside the zip
+        member = next((m for m in zf.namelist() if os.path.basename(m) == name), None)
+        if member is None:
+            yield None
+            return
+        with zf.open(member) as raw:
+            yield io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+
+def read_fraction(f: IO[str]) -> Optional[Callable[[], float]]:
+    """
+    For --progress: a function giving how far into the file f we have read
+    (0..1), or None when the size is unknown (e.g. a zip member).
+    """
+    raw = getattr(f, "buffer", None)
+    try:
+        size = os.fstat(raw.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    return lambda: raw.tell() / size if size else 1.0
+
+
+class ShapeTable:
+    """
+    Columnar shapes.txt: all points of all shapes in one (n, 2) lon/lat array,
+    grouped by shape and sorted by shape_pt_sequence.
+
+    Points of shape i are xy[offsets[i]:offsets[i + 1]]. Shapes keep the
+    order in which they first appear in the file.
+    """
+
+    def __init__(self, shape_ids: List[str], offsets: np.ndarray, xy: np.ndarray):
+        self.shape_ids = shape_ids
+        self.offsets = offsets
+        self.xy = xy
+
+    def __len__(self) -> int:
+        return len(self.shape_ids)
+
+    def coords(self, i: int) -> np.ndarray:
+        return self.xy[self.offsets[i]:self.offsets[i + 1]]
+
+    def items(self) -> Iterator[Tuple[str, np.ndarray]]:
+        """
+        (shape_id, (n, 2) view into xy) for every shape.
+        """
+        for i, sid in enumerate(self.shape_ids):
+            yield sid, self.xy[self.offsets[i]:self.offsets[i + 1]]
+
+
+def _group_shapes(code: np.ndarray, seq: np.ndarray, xy: np.ndarray, n_shapes: int):
+    """
+    Sorts the columns by (shape, sequence) and returns (offsets, xy).
+    Feeds are usually written shape by shape with increasing sequence; then
+    nothing is sorted at all. Otherwise one stable argsort groups the shapes,
+    and only shapes whose sequence is not monotonic get sorted on their own.
+    """
+    if len(code) and np.any(code[1:] < code[:-1]):
+        order = np.argsort(code, kind="stable")
+        code, seq, xy = code[order], seq[order], xy[order]
+
+    offsets = np.zeros(n_shapes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(code, minlength=n_shapes), out=offsets[1:])
+
+    unsorted = (seq[1:] < seq[:-1]) & (code[1:] == code[:-1])
+    for c in np.unique(code[1:][unsorted]):
+        a, b = offsets[c], offsets[c + 1]
+        order = np.argsort(seq[a:b], kind="stable")
+        xy[a:b] = xy[a:b][order]
+
+    return offsets, xy
+
+
+def read_header(f) -> List[str]:
+    return [h.strip() for h in next(csv.reader([f.readline()]), [])]
+
+
+def iter_text_blocks(f, block_rows: int) -> Iterator[str]:
+    """
+    The rest of a text file in blocks of `block_rows` lines.
     """
-    shapes: Dict[str, List[Tuple[int, float, float]]] = defaultdict(list)
+    while True:
+        lines = list(islice(f, block_rows))
+        if not lines:
+            return
+        yield "".join(lines)
+
 
-    with open(shapes_path, "r", encoding="utf-8-sig", newline="") as f:
-      reader = csv.DictReader(f)
-      required = {"shape_id", "shape_pt_sequence", "shape_pt_lat", "shape_pt_lon"}
-      missing = required - set(reader.fieldnames or [])
-      if missing:
-          raise ValueError(f"shapes.txt mangler kolonner: {missing}")
+def split_columns(text: str, columns: List[int], ncols: int) -> List[list]:
+    """
+    The requested columns of a block of CSV lines, as lists of strings.
+    Blocks without quotes are split with plain str.split (fast path);
+    anything else (quoted fields, blank or ragged lines) goes through csv.
+    """
+    if '"' not in text:
+        fields = text.replace("\r", "").replace("\n", ",").split(",")
+        if text.endswith("\n"):
+            fields.pop()
+        if len(fields) % ncols == 0 and len(fields) // ncols == text.count("\n") + (not text.endswith("\n")):
+            return [fields[i::ncols] for i in columns]
 
-      for row in reader:
-          sid = row["shape_id"].strip()
-          seq = int(row["shape_pt_sequence"])
-          lat = float(row["shape_pt_lat"])
-          lon = float(row["shape_pt_lon"])
-          shapes[sid].append((seq, lon, lat))
+    rows = [row for row in csv.reader(text.splitlines()) if row]
+    return [[row[i] if i < len(row) else "" for row in rows] for i in columns]
+
+
+def iter_column_blocks(f, columns: List[int], ncols: int, block_rows: int) -> Iterator[List[list]]:
+    """
+    Reads the rest of a CSV file in blocks and yields the requested columns per block.
+    """
+    for text in iter_text_blocks(f, block_rows):
+        yield split_columns(text, columns, ncols)
 
-    # sort each shape by sequence
-    for sid in list(shapes.keys()):
-        shapes[sid].sort(key=lambda t: t[0])
 
-    return shapes
+def read_shapes(shapes_path: PathOrFile) -> ShapeTable:
+    """
+    Reads shapes.txt into a ShapeTable.
+    Keeps ONLY what we need for geometry.
+    """
+    codes: Dict[str, int] = {}
+    shape_ids: List[str] = []
+    code_blocks, seq_blocks, xy_blocks = [], [], []
+
+    with open_text(shapes_path) as f:
+        header = read_header(f)
+        required = {"shape_id", "shape_pt_sequence", "shape_pt_lat", "shape_pt_lon"}
+        missing = required - set(header)
+        if missing:
+            raise ValueError(f"shapes.txt mangler kolonner: {missing}")
+        columns = [header.index(c) for c in ("shape_id", "shape_pt_sequence", "shape_pt_lon", "shape_pt_lat")]
+
+        for sids, seqs, lons, lats in iter_column_blocks(f, columns, len(header), SHAPES_BLOCK_ROWS):
+            # shape_id -> integer code, in order of first appearance in the file
+            raw, first, inverse = np.unique(np.array(sids), return_index=True, return_inverse=True)
+            local = np.empty(len(raw), dtype=np.int64)
+            for j in np.argsort(first, kind="stable"):
+                sid = str(raw[j]).strip()
+                if sid not in codes:
+                    codes[sid] = len(shape_ids)
+                    shape_ids.append(sid)
+                local[j] = codes[sid]
+
+            code_blocks.append(local[inverse.ravel()])
+            seq_blocks.append(np.array(seqs, dtype=np.int64))
+            xy_blocks.append(np.column_stack([
+                np.array(lons, dtype=np.float64),
+                np.array(lats, dtype=np.float64),
+            ]))
+
+    if not code_blocks:
+        return ShapeTable([], np.zeros(1, dtype=np.int64), np.empty((0, 2)))
+
+    offsets, xy = _group_shapes(
+        np.concatenate(code_blocks),
+        np.concatenate(seq_blocks),
+        np.concatenate(xy_blocks),
+        len(shape_ids),
+    )
+    return ShapeTable(shape_ids, offsets, xy)
 
 
-def read_stops(stops_path: str) -> List[dict]:
+def read_stops(stops_path: PathOrFile) -> List[dict]:
     """
     Returns a list of stop features (GeoJSON Feature objects).
     Keeps ONLY what we need: stop_id, stop_name, geometry.
     """
     feats: List[dict] = []
 
-    with open(stops_path, "r", encoding="utf-8-sig", newline="") as f:
+    with open_text(stops_path) as f:
         reader = csv.DictReader(f)
         required = {"stop_id", "stop_name", "stop_lat", "stop_lon"}
         missing = required - set(reader.fieldnames or [])
@@ -71,15 +263,15 @@ def read_stops(stops_path: str) -> List[dict]:
     return feats
 
 
-def read_routes_min(routes_path: str) -> Dict[str, dict]:
+def read_routes_min(routes_path: PathOrFile) -> Dict[str, dict]:
     """
     Reads routes.txt and returns route metadata dict by route_id.
     Keeps ONLY what you likely need for analysis/labels.
-    NOTE: Without trips.txt, we can't map route_id <-> shape_id.
+    NOTE: route_id <-> shape_id comes from trips.txt (see read_trips).
     """
     out: Dict[str, dict] = {}
 
-    with open(routes_path, "r", encoding="utf-8-sig", newline="") as f:
+    with open_text(routes_path) as f:
         reader = csv.DictReader(f)
         required = {"route_id", "route_short_name", "route_type"}
         missing = required - set(reader.fieldnames or [])
@@ -98,42 +290,285 @@ def read_routes_min(routes_path: str) -> Dict[str, dict]:
     return out
 
 
-def write_geojson(path: str, features: List[dict]) -> None:
-    fc = {"type": "FeatureCollection", "features": features}
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(fc, f, ensure_ascii=False)
+def read_trips(trips_path: PathOrFile) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Streams trips.txt and returns (shape_id -> route_id, trip_id -> route_id).
+    A shape used by several routes is mapped to the route with most trips on it.
+    """
+    shape_routes: Dict[str, Counter] = defaultdict(Counter)
+    trip_to_route: Dict[str, str] = {}
+
+    with open_text(trips_path) as f:
+        reader = csv.DictReader(f)
+        required = {"route_id", "trip_id"}
+        missing = required - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"trips.txt mangler kolonner: {missing}")
+
+        for row in reader:
+            rid = row["route_id"].strip()
+            trip_to_route[row["trip_id"].strip()] = rid
+            sid = (row.get("shape_id") or "").strip()
+            if sid:
+                shape_routes[sid][rid] += 1
+
+    shape_to_route = {sid: counts.most_common(1)[0][0] for sid, counts in shape_routes.items()}
+    return shape_to_route, trip_to_route
+
+
+def parse_gtfs_time(value: str) -> Optional[int]:
+    """
+    "HH:MM:SS" -> seconds after midnight (GTFS allows hours >= 24). Empty -> None.
+    """
+    value = value.strip()
+    if not value:
+        return None
+    h, m, sec = value.split(":")
+    return int(h) * 3600 + int(m) * 60 + int(sec)
+
+
+def format_gtfs_time(seconds: int) -> str:
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _aggregate_stop_times_block(job) -> Tuple[Counter, Dict[str, Optional[int]], int]:
+    """
+    Worker: one block of stop_times.txt -> (trips per stop, first departure per trip, rows).
+    """
+    text, columns, ncols = job
+    trip_ids, stop_ids, departures = split_columns(text, columns, ncols)
+
+    trip_ids = [t.strip() for t in trip_ids]
+    stop_trips = Counter(stop for stop, _trip in set(zip((s.strip() for s in stop_ids), trip_ids)))
+
+    first_departure: Dict[str, Optional[int]] = {}
+    for trip, dep in zip(trip_ids, departures):
+        sec = parse_gtfs_time(dep)
+        prev = first_departure.get(trip)
+        if prev is None or (sec is not None and sec < prev):
+            first_departure[trip] = sec
+    return stop_trips, first_departure, len(trip_ids)
+
+
+def _map_bounded(executor, fn, items, window: int):
+    """
+    executor.map with at most `window` jobs in flight (bounded memory).
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def aggregate_stop_times(
+    stop_times_path: PathOrFile,
+    trip_to_route: Dict[str, str],
+    workers: int = 1,
+    progress: Optional[Progress] = None,
+) -> Tuple[Dict[str, int], Dict[str, dict]]:
+    """
+    Streams stop_times.txt in blocks across a process pool and returns
+    (stop_id -> number of trips serving the stop,
+     route_id -> {"trip_count", "first_departure", "last_departure"}).
+    Memory is bounded by the number of stops and trips, not by stop_times rows.
+    """
+    stop_trips: Counter = Counter()
+    first_departure: Dict[str, Optional[int]] = {}
+    rows = 0
+
+    with open_text(stop_times_path) as f:
+        header = read_header(f)
+        required = {"trip_id", "stop_id", "departure_time"}
+        missing = required - set(header)
+        if missing:
+            raise ValueError(f"stop_times.txt mangler kolonner: {missing}")
+        columns = [header.index(c) for c in ("trip_id", "stop_id", "departure_time")]
+        jobs = ((text, columns, len(header)) for text in iter_text_blocks(f, STOP_TIMES_BLOCK_ROWS))
+        if progress is not None:
+            progress.fraction = read_fraction(f)
+
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = _map_bounded(executor, _aggregate_stop_times_block, jobs, workers * 2)
+        else:
+            executor = None
+            results = map(_aggregate_stop_times_block, jobs)
+
+        try:
+            for counts, firsts, block_rows in results:
+                stop_trips.update(counts)
+                _merge_first_departures(first_departure, firsts)
+                rows += block_rows
+                if progress is not None:
+                    progress.update(rows)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    TIMER.count("stop_times_rows", rows)
+    if progress is not None:
+        progress.finish(rows)
+
+    route_stats: Dict[str, dict] = {}
+    for trip, sec in first_departure.items():
+        rid = trip_to_route.get(trip)
+        if rid is None:
+            continue
+        stats = route_stats.setdefault(rid, {"trip_count": 0, "first": None, "last": None})
+        stats["trip_count"] += 1
+        if sec is not None:
+            stats["first"] = sec if stats["first"] is None else min(stats["first"], sec)
+            stats["last"] = sec if stats["last"] is None else max(stats["last"], sec)
+
+    for stats in route_stats.values():
+        first, last = stats.pop("first"), stats.pop("last")
+        stats["first_departure"] = format_gtfs_time(first) if first is not None else ""
+        stats["last_departure"] = format_gtfs_time(last) if last is not None else ""
+
+    return dict(stop_trips), route_stats
+
+
+def _merge_first_departures(into: Dict[str, Optional[int]], firsts: Dict[str, Optional[int]]) -> None:
+    # A trip can be split across two blocks; keep the earliest departure
+    for trip, sec in firsts.items():
+        prev = into.get(trip)
+        if trip not in into or (sec is not None and (prev is None or sec < prev)):
+            into[trip] = sec
+
+
+def merge_route_stats(stats: List[dict]) -> Optional[dict]:
+    """
+    Stats of several routes that share one geometry: trip counts added up,
+    earliest first_departure and latest last_departure.
+    """
+    if not stats:
+        return None
+    firsts = [parse_gtfs_time(s["first_departure"]) for s in stats]
+    lasts = [parse_gtfs_time(s["last_departure"]) for s in stats]
+    firsts = [t for t in firsts if t is not None]
+    lasts = [t for t in lasts if t is not None]
+    return {
+        "trip_count": sum(s["trip_count"] for s in stats),
+        "first_departure": format_gtfs_time(min(firsts)) if firsts else "",
+        "last_departure": format_gtfs_time(max(lasts)) if lasts else "",
+    }
+
+
+def write_geojson(
+    path: str,
+    features: List[dict],
+    fmt: str = "geojson",
+    precision: Optional[int] = None,
+) -> None:
+    write_features(path, features, fmt=fmt, precision=precision)
+
+
+def shape_key(xy: np.ndarray, tolerance: Optional[float] = None) -> bytes:
+    """
+    Hash of a shape's coordinates. Identical point sequences give the same key.
+
+    With a tolerance (meters) the line is first simplified with Douglas-Peucker
+    and snapped to a grid of that size, so shapes that differ only by extra
+    in-between points or by less than the tolerance usually share a key.
+    """
+    if tolerance:
+        # Local equirectangular meters; cos(lat) from a fixed grid row so every
+        # shape in a region scales the same way
+        lat0 = round(float(xy[0, 1]))
+        scale = np.array([METERS_PER_DEGREE * math.cos(math.radians(lat0)), METERS_PER_DEGREE])
+        m = xy * scale
+        m = m[douglas_peucker_mask(m, tolerance)]
+        snapped = np.rint(m / tolerance).astype(np.int64)
+        keep = np.ones(len(snapped), dtype=bool)
+        keep[1:] = np.any(snapped[1:] != snapped[:-1], axis=1)
+        data = snapped[keep].tobytes()
+    else:
+        data = np.ascontiguousarray(xy).tobytes()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def group_duplicate_shapes(shapes: ShapeTable, tolerance: Optional[float] = None) -> List[List[int]]:
+    """
+    Indices of shapes grouped by shape_key, in order of first appearance.
+    Degenerate shapes (fewer than 2 points) are left out.
+    """
+    groups: Dict[bytes, List[int]] = {}
+    for i in range(len(shapes)):
+        xy = shapes.coords(i)
+        if len(xy) < 2:
+            continue
+        groups.setdefault(shape_key(xy, tolerance), []).append(i)
+    return list(groups.values())
 
 
 def make_routes_geojson(
-    shapes: Dict[str, List[Tuple[int, float, float]]],
+    shapes: ShapeTable,
     # Optional mapping if you can provide it later: shape_id -> route_id
     shape_to_route: Optional[Dict[str, str]] = None,
     route_meta_by_id: Optional[Dict[str, dict]] = None,
+    # Optional per-route trip counts from aggregate_stop_times
+    route_stats: Optional[Dict[str, dict]] = None,
+    # Collapse identical shapes into one feature (tolerance in meters merges near-duplicates)
+    dedupe: bool = False,
+    dedupe_tolerance: Optional[float] = None,
 ) -> List[dict]:
     feats: List[dict] = []
     shape_to_route = shape_to_route or {}
     route_meta_by_id = route_meta_by_id or {}
+    route_stats = route_stats or {}
 
-    for shape_id, pts in shapes.items():
-        if len(pts) < 2:
+    if dedupe or dedupe_tolerance:
+        groups = group_duplicate_shapes(shapes, dedupe_tolerance)
+    else:
+        groups = [[i] for i in range(len(shapes))]
+
+    for group in groups:
+        xy = shapes.coords(group[0])
+        if len(xy) < 2:
             # skip degenerate shapes
             continue
 
-        coords = [[lon, lat] for (_seq, lon, lat) in pts]
+        # One C-level conversion per shape straight from the column buffer
+        coords = xy.tolist()
 
+        shape_ids = [shapes.shape_ids[i] for i in group]
+        shape_id = shape_ids[0]
         props = {
             "shape_id": shape_id,
         }
 
-        # If we have mapping, attach minimal route properties
-        rid = shape_to_route.get(shape_id)
-        if rid:
+        route_ids = list(dict.fromkeys(
+            shape_to_route[sid] for sid in shape_ids if shape_to_route.get(sid)
+        ))
+        if dedupe or dedupe_tolerance:
+            # Every shape_id/route_id the geometry stands for
+            props["shape_ids"] = shape_ids
+            props["route_ids"] = route_ids
+
+        if len(route_ids) > 1:
+            # Shared geometry: no single route_id/name applies, so list the
+            # names and add up the stats of every route that drives it
+            props["route_short_names"] = [
+                route_meta_by_id.get(r, {}).get("route_short_name", "") for r in route_ids
+            ]
+            stats = merge_route_stats([route_stats[r] for r in route_ids if r in route_stats])
+            if stats:
+                props.update(stats)
+        elif route_ids:
+            # If we have mapping, attach minimal route properties
+            rid = route_ids[0]
             props["route_id"] = rid
             meta = route_meta_by_id.get(rid)
             if meta:
                 # keep only minimal
                 props["route_short_name"] = meta.get("route_short_name", "")
                 props["route_type"] = meta.get("route_type", "")
+            stats = route_stats.get(rid)
+            if stats:
+                props.update(stats)
 
         feats.append({
             "type": "Feature",
@@ -144,35 +579,187 @@ def make_routes_geojson(
     return feats
 
 
+def read_gtfs_file(job) -> Tuple[str, object, float]:
+    """
+    Runs one reader on one feed file: the explicit path if given, else the
+    member `name` of the GTFS zip/directory (opened here, so it also works in
+    a worker process). Returns (name, result or None if missing, seconds).
+    """
+    name, reader, gtfs, explicit, extra = job
+    start = time.perf_counter()
+    if explicit:
+        result = reader(explicit, *extra)
+    elif gtfs:
+        with open_gtfs_file(gtfs, name) as f:
+            result = reader(f, *extra) if f is not None else None
+    else:
+        result = None
+    return name, result, time.perf_counter() - start
+
+
+def read_gtfs_files(jobs: List[tuple], workers: int = 1) -> Dict[str, object]:
+    """
+    Parses several feed files concurrently, one worker process per file, so the
+    wall time is that of the largest file. Each worker streams its own member
+    straight from the zip; nothing is extracted to disk.
+    """
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            done = list(executor.map(read_gtfs_file, jobs))
+    else:
+        done = [read_gtfs_file(job) for job in jobs]
+
+    results = {}
+    for name, result, seconds in done:
+        if result is not None:
+            print(f"  {name}: {seconds:.1f} s")
+            TIMER.add(name, seconds)
+        results[name] = result
+    return results
+
+
+def attach_stop_attributes(
+    stops: List[dict],
+    shapes: ShapeTable,
+    shape_to_route: Dict[str, str],
+    radius: float,
+    cluster_distance: float,
+) -> None:
+    """
+    Adds nearest route distance, routes nearby and cluster id to every stop
+    (spatial joins done here instead of in the browser; see stop_index.py).
+    """
+    # Imported here so the plain conversion doesn't need shapely/pyproj
+    from stop_index import stop_attributes
+
+    lonlat = np.array([f["geometry"]["coordinates"] for f in stops], dtype=np.float64).reshape(-1, 2)
+    for feat, attrs in zip(stops, stop_attributes(lonlat, shapes, shape_to_route, radius, cluster_distance)):
+        feat["properties"].update(attrs)
+
+
+def attach_stop_trip_counts(stops: List[dict], stop_trips: Dict[str, int]) -> None:
+    for feat in stops:
+        props = feat["properties"]
+        props["trip_count"] = stop_trips.get(props["stop_id"], 0)
+
+
 def main():
     import argparse
 
     ap = argparse.ArgumentParser(
         description="Convert GTFS shapes+stops (+ optional route metadata) to GeoJSON."
     )
-    ap.add_argument("--shapes", required=True, help="Path to shapes.txt")
-    ap.add_argument("--stops", required=True, help="Path to stops.txt")
+    ap.add_argument(
+        "--gtfs",
+        required=False,
+        help="GTFS zip or directory. Files are picked from here unless given separately below",
+    )
+    ap.add_argument("--shapes", required=False, help="Path to shapes.txt")
+    ap.add_argument("--stops", required=False, help="Path to stops.txt")
     ap.add_argument("--routes", required=False, help="Path to routes.txt (optional metadata)")
+    ap.add_argument("--trips", required=False, help="Path to trips.txt (builds shape_id -> route_id)")
+    ap.add_argument(
+        "--stop_times",
+        required=False,
+        help="Path to stop_times.txt (trip counts per stop and per route)",
+    )
+    ap.add_argument(
+        "--no_stop_times",
+        action="store_true",
+        help="Skip stop_times.txt even if the feed has it",
+    )
     ap.add_argument("--outdir", default=".", help="Output directory")
     ap.add_argument(
         "--shape_to_route",
         required=False,
         help=(
-            "Optional CSV mapping shape_id,route_id if you have it. "
-            "Normally built from trips.txt; you can generate it separately."
+            "Optional CSV mapping shape_id,route_id. "
+            "Overrides the mapping built from trips.txt."
         ),
     )
+    ap.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="Collapse shapes with identical coordinates into one feature (lists shape_ids/route_ids)",
+    )
+    ap.add_argument(
+        "--dedupe_tolerance",
+        type=float,
+        default=None,
+        metavar="METERS",
+        help="Also merge near-identical shapes (simplified and snapped to this grid). Implies --dedupe",
+    )
+    ap.add_argument(
+        "--stop_attributes",
+        action="store_true",
+        help=(
+            "Precompute per stop: nearest_route_m, nearest_route_id, route_ids_nearby "
+            "and cluster_id (needs shapely)"
+        ),
+    )
+    ap.add_argument(
+        "--nearby_radius",
+        type=float,
+        default=50.0,
+        metavar="METERS",
+        help="Radius for route_ids_nearby (default 50)",
+    )
+    ap.add_argument(
+        "--cluster_distance",
+        type=float,
+        default=50.0,
+        metavar="METERS",
+        help="Stops closer than this end up in the same cluster_id (default 50)",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes used to read the GTFS files and aggregate stop_times.txt (default 1 = serial)",
+    )
+    add_output_arguments(ap)
+    add_profiling_arguments(ap)
     args = ap.parse_args()
 
+    if not args.gtfs and not (args.shapes and args.stops):
+        ap.error("Oppgi --gtfs, eller både --shapes og --stops")
+
+    with profile_run(args, TIMER, "gtfs_to_geojson") as info:
+        convert(args, info)
+
+
+def convert(args, info: dict) -> None:
+    """
+    The conversion itself, for the parsed arguments of main().
+    Totals for the --profile report are put in `info`.
+    """
     os.makedirs(args.outdir, exist_ok=True)
 
-    shapes = read_shapes(args.shapes)
-    stops_features = read_stops(args.stops)
+    # shapes, stops, routes and trips are independent: parse them side by side
+    files = read_gtfs_files([
+        ("shapes.txt", read_shapes, args.gtfs, args.shapes, ()),
+        ("stops.txt", read_stops, args.gtfs, args.stops, ()),
+        ("routes.txt", read_routes_min, args.gtfs, args.routes, ()),
+        ("trips.txt", read_trips, args.gtfs, args.trips, ()),
+    ], args.workers)
 
-    route_meta = read_routes_min(args.routes) if args.routes else {}
+    shapes = files["shapes.txt"]
+    stops_features = files["stops.txt"]
+    if shapes is None or stops_features is None:
+        raise ValueError("Fant ikke shapes.txt og stops.txt i GTFS-feeden")
+    TIMER.count("shape_points", len(shapes.xy))
 
-    # Optional mapping file: shape_id,route_id
+    route_meta = files["routes.txt"] or {}
+
+    # shape_id -> route_id from trips.txt (trip_id -> route_id is used for stop_times)
     mapping: Dict[str, str] = {}
+    trip_to_route: Dict[str, str] = {}
+    trips = files["trips.txt"]
+    if trips is not None:
+        mapping, trip_to_route = trips
+        print(f"Leste trips.txt: {len(trip_to_route)} turer, {len(mapping)} shapes koblet til ruter")
+
+    # Optional mapping file: shape_id,route_id
     if args.shape_to_route:
         with open(args.shape_to_route, "r", encoding="utf-8-sig", newline="") as f:
             r = csv.DictReader(f)
@@ -181,17 +768,47 @@ def main():
             for row in r:
                 mapping[row["shape_id"].strip()] = row["route_id"].strip()
 
-    routes_features = make_routes_geojson(
-        shapes=shapes,
-        shape_to_route=mapping,
-        route_meta_by_id=route_meta,
-    )
-
-    routes_out = os.path.join(args.outdir, "routes.geojson")
-    stops_out = os.path.join(args.outdir, "stops.geojson")
-
-    write_geojson(routes_out, routes_features)
-    write_geojson(stops_out, stops_features)
+    route_stats: Dict[str, dict] = {}
+    if not args.no_stop_times:
+        # Needs trips.txt first; the aggregation is itself spread over the workers
+        progress = Progress("rader") if args.progress else None
+        job = (
+            "stop_times.txt", aggregate_stop_times, args.gtfs, args.stop_times,
+            (trip_to_route, args.workers, progress),
+        )
+        _name, aggregated, seconds = read_gtfs_file(job)
+        if aggregated is not None:
+            TIMER.add("stop_times.txt", seconds)
+            stop_trips, route_stats = aggregated
+            attach_stop_trip_counts(stops_features, stop_trips)
+            print(
+                f"Leste stop_times.txt på {seconds:.1f} s: "
+                f"{sum(stop_trips.values())} stopp-besøk, {len(route_stats)} ruter med turer"
+            )
+
+    if args.stop_attributes:
+        with TIMER("stop_attributes"):
+            attach_stop_attributes(stops_features, shapes, mapping, args.nearby_radius, args.cluster_distance)
+
+    with TIMER("routes_features"):
+        routes_features = make_routes_geojson(
+            shapes=shapes,
+            shape_to_route=mapping,
+            route_meta_by_id=route_meta,
+            route_stats=route_stats,
+            dedupe=args.dedupe,
+            dedupe_tolerance=args.dedupe_tolerance,
+        )
+    if args.dedupe or args.dedupe_tolerance:
+        print(f"Slo sammen {len(shapes)} shapes til {len(routes_features)} features")
+
+    routes_out = replace_extension(os.path.join(args.outdir, "routes.geojson"), args.format)
+    stops_out = replace_extension(os.path.join(args.outdir, "stops.geojson"), args.format)
+
+    with TIMER("serialize"):
+        write_geojson(routes_out, routes_features, fmt=args.format, precision=args.precision)
+        write_geojson(stops_out, stops_features, fmt=args.format, precision=args.precision)
+    info.update(features=len(routes_features) + len(stops_features))
 
     print(f"Skrev: {routes_out} ({len(routes_features)} features)")
     print(f"Skrev: {stops_out} ({len(stops_features)} features)")
@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+Builds a z/x/y Mapbox Vector Tile (MVT) pyramid from converter output.
+
+Input is anything geojson_writer.read_features understands (.geojson,
+.geojsonl, .fgb). Output is either a directory (out/z/x/y.pbf) or an
+MBTiles SQLite file (gzip-compressed tiles, TMS row order).
+
+Per zoom level the geometries are simplified with the shared-arc
+topology from simplify.py (tolerance in tile units, so neighbouring
+polygons stay gap-free), clipped to each tile with a small buffer, and
+encoded. Tiles are encoded in parallel across processes.
+
+Example:
+
+    python dataManipulation/make_vector_tiles.py arealbruk.geojson tiles/ \
+        --minzoom 10 --maxzoom 15 --properties featureType typeLabel
+    python dataManipulation/make_vector_tiles.py arealbruk.geojson arealbruk.mbtiles
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import math
+import os
+import sqlite3
+import struct
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString, MultiLineString, MultiPoint, MultiPolygon, Point, Polygon
+
+from geojson_writer import FORMAT_EXTENSIONS, read_features
+from simplify import Topology
+
+EXTENT = 4096
+MAX_LAT = 85.05112878
+
+# MVT GeomType
+MVT_POINT = 1
+MVT_LINESTRING = 2
+MVT_POLYGON = 3
+
+
+# ----------------- Projection -----------------
+
+def lonlat_to_world(xy: np.ndarray) -> np.ndarray:
+    """
+    lon/lat -> Web Mercator "world" coordinates in [0, 1], y pointing down.
+    Raises ValueError for coordinates that can't be lon/lat (e.g. UTM meters).
+    """
+    outside = (np.abs(xy[:, 0]) > 180.0) | (np.abs(xy[:, 1]) > 90.0)
+    if outside.any():
+        x, y = xy[np.argmax(outside)]
+        raise ValueError(
+            f"Koordinaten ({x}, {y}) er ikke lon/lat. Vector tiles trenger EPSG:4326 "
+            "(konverter uten --target-crs)"
+        )
+    lon = xy[:, 0]
+    lat = np.clip(xy[:, 1], -MAX_LAT, MAX_LAT)
+    x = (lon + 180.0) / 360.0
+    y = 0.5 - np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) / (2 * np.pi)
+    return np.column_stack([x, y])
+
+
+def world_geometry(geom: Optional[dict]) -> Optional[dict]:
+    """
+    GeoJSON geometry (lists, lon/lat) -> same structure with numpy arrays in world coordinates.
+    """
+    if geom is None:
+        return None
+    t = geom["type"]
+    c = geom["coordinates"]
+
+    def arr(points):
+        return lonlat_to_world(np.asarray([p[:2] for p in points], dtype=np.float64).reshape(-1, 2))
+
+    if t == "Point":
+        return {"type": t, "coordinates": arr([c])}
+    if t in ("LineString", "MultiPoint"):
+        return {"type": t, "coordinates": arr(c)}
+    if t in ("Polygon", "MultiLineString"):
+        return {"type": t, "coordinates": [arr(part) for part in c]}
+    if t == "MultiPolygon":
+        return {"type": t, "coordinates": [[arr(ring) for ring in poly] for poly in c]}
+    return None
+
+
+def to_shapely(geom: Optional[dict]):
+    if geom is None:
+        return None
+    t = geom["type"]
+    c = geom["coordinates"]
+    if t == "Point":
+        return Point(c[0])
+    if t == "MultiPoint":
+        return MultiPoint(c)
+    if t == "LineString":
+        return LineString(c) if len(c) >= 2 else None
+    if t == "MultiLineString":
+        return MultiLineString([line for line in c if len(line) >= 2])
+    if t == "Polygon":
+        return Polygon(c[0], c[1:])
+    if t == "MultiPolygon":
+        return MultiPolygon([(poly[0], poly[1:]) for poly in c])
+    return None
+
+
+def geometry_bbox(geom: dict) -> Tuple[float, float, float, float]:
+    t = geom["type"]
+    c = geom["coordinates"]
+    if t in ("Point", "LineString", "MultiPoint"):
+        parts = [c]
+    elif t in ("Polygon", "MultiLineString"):
+        parts = c
+    else:
+        parts = [ring for poly in c for ring in poly]
+    xy = np.concatenate(parts)
+    return float(xy[:, 0].min()), float(xy[:, 1].min()), float(xy[:, 0].max()), float(xy[:, 1].max())
+
+
+# ----------------- Protobuf / MVT-koding -----------------
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) if n >= 0 else ((-n) << 1) - 1
+
+
+def _field(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number: int, data: bytes) -> bytes:
+    return _field(number, 2) + _varint(len(data)) + data
+
+
+def _packed_field(number: int, values: Sequence[int]) -> bytes:
+    return _bytes_field(number, b"".join(_varint(v) for v in values))
+
+
+def _encode_value(value) -> bytes:
+    if isinstance(value, bool):
+        return _field(7, 0) + _varint(1 if value else 0)
+    if isinstance(value, int):
+        if value >= 0:
+            return _field(5, 0) + _varint(value)
+        return _field(6, 0) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _field(3, 1) + struct.pack("<d", value)
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False)
+    return _bytes_field(1, value.encode("utf-8"))
+
+
+def _ring_area(ring: np.ndarray) -> float:
+    x = ring[:, 0]
+    y = ring[:, 1]
+    return float(np.sum(x[:-1] * y[1:] - x[1:] * y[:-1])) / 2
+
+
+class _GeometryEncoder:
+    """
+    MVT command stream (MoveTo/LineTo/ClosePath with zigzag deltas).
+    The cursor carries over between parts, as the spec requires.
+    """
+
+    def __init__(self):
+        self.commands: List[int] = []
+        self.cx = 0
+        self.cy = 0
+
+    def _points(self, pts: np.ndarray) -> None:
+        for x, y in pts.tolist():
+            self.commands.append(_zigzag(x - self.cx))
+            self.commands.append(_zigzag(y - self.cy))
+            self.cx, self.cy = x, y
+
+    def points(self, pts: np.ndarray) -> None:
+        self.commands.append(1 | (len(pts) << 3))
+        self._points(pts)
+
+    def line(self, pts: np.ndarray) -> None:
+        self.commands.append(1 | (1 << 3))
+        self._points(pts[:1])
+        self.commands.append(2 | ((len(pts) - 1) << 3))
+        self._points(pts[1:])
+
+    def ring(self, pts: np.ndarray) -> None:
+        # pts uten gjentatt sluttpunkt
+        self.line(pts)
+        self.commands.append(7 | (1 << 3))
+
+
+def _dedupe(pts: np.ndarray) -> np.ndarray:
+    if len(pts) < 2:
+        return pts
+    keep = np.ones(len(pts), dtype=bool)
+    keep[1:] = np.any(pts[1:] != pts[:-1], axis=1)
+    return pts[keep]
+
+
+def _tile_coords(coords, tx: int, ty: int, scale: float) -> np.ndarray:
+    xy = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    return np.rint(np.column_stack([xy[:, 0] * scale - tx * EXTENT, xy[:, 1] * scale - ty * EXTENT])).astype(np.int64)
+
+
+def encode_geometry(geom, tx: int, ty: int, z: int) -> Tuple[Optional[int], List[int]]:
+    """
+    A clipped shapely geometry (world coordinates) -> (MVT geom type, command list).
+    """
+    scale = EXTENT * (2 ** z)
+    enc = _GeometryEncoder()
+
+    parts = list(getattr(geom, "geoms", [geom]))
+    points = [p for p in parts if p.geom_type == "Point"]
+    lines = [p for p in parts if p.geom_type == "LineString"]
+    polygons = [p for p in parts if p.geom_type == "Polygon"]
+
+    if polygons:
+        for poly in polygons:
+            exterior = _dedupe(_tile_coords(poly.exterior.coords, tx, ty, scale))
+            if len(exterior) < 4 or _ring_area(exterior) == 0:
+                continue
+            # Ytterring med positivt areal (med klokka når y peker ned), hull negativt
+            if _ring_area(exterior) < 0:
+                exterior = exterior[::-1]
+            enc.ring(exterior[:-1])
+            for interior in poly.interiors:
+                hole = _dedupe(_tile_coords(interior.coords, tx, ty, scale))
+                if len(hole) < 4 or _ring_area(hole) == 0:
+                    continue
+                if _ring_area(hole) > 0:
+                    hole = hole[::-1]
+                enc.ring(hole[:-1])
+        return (MVT_POLYGON, enc.commands) if enc.commands else (None, [])
+
+    if lines:
+        for line in lines:
+            pts = _dedupe(_tile_coords(line.coords, tx, ty, scale))
+            if len(pts) >= 2:
+                enc.line(pts)
+        return (MVT_LINESTRING, enc.commands) if enc.commands else (None, [])
+
+    if points:
+        pts = np.concatenate([_tile_coords(p.coords, tx, ty, scale) for p in points])
+        enc.points(pts)
+        return MVT_POINT, enc.commands
+
+    return None, []
+
+
+def encode_layer(name: str, features: List[Tuple[int, List[int], dict]]) -> bytes:
+    keys: Dict[str, int] = {}
+    values: Dict[bytes, int] = {}
+    body = bytearray()
+
+    for geom_type, commands, props in features:
+        tags = []
+        for k, v in props.items():
+            if v is None:
+                continue
+            ki = keys.setdefault(k, len(keys))
+            encoded = _encode_value(v)
+            vi = values.setdefault(encoded, len(values))
+            tags += [ki, vi]
+        feature = bytearray()
+        if tags:
+            feature += _packed_field(2, tags)
+        feature += _field(3, 0) + _varint(geom_type)
+        feature += _packed_field(4, commands)
+        body += _bytes_field(2, bytes(feature))
+
+    layer = bytearray()
+    layer += _field(15, 0) + _varint(2)
+    layer += _bytes_field(1, name.encode("utf-8"))
+    layer += body
+    for k in keys:
+        layer += _bytes_field(3, k.encode("utf-8"))
+    for v in values:
+        layer += _bytes_field(4, v)
+    layer += _field(5, 0) + _varint(EXTENT)
+    return _bytes_field(3, bytes(layer))
+
+
+# ----------------- Parallell tiling -----------------
+# Én prosesspool per zoomnivå. Geometriene for zoomen gis til initializer,
+# og hver jobb er en liste med (x, y, feature-indekser).
+
+_zoom_geoms = None
+_zoom_props = None
+_zoom_layer = None
+_zoom_buffer = 0.0
+
+
+def _init_zoom_worker(geoms, props, layer, buffer):
+    global _zoom_geoms, _zoom_props, _zoom_layer, _zoom_buffer
+    _zoom_geoms = geoms
+    _zoom_props = props
+    _zoom_layer = layer
+    _zoom_buffer = buffer
+
+
+def _encode_tiles(job):
+    z, tiles = job
+    n = 2 ** z
+    out = []
+    for x, y, indices in tiles:
+        pad = _zoom_buffer / EXTENT
+        bounds = ((x - pad) / n, (y - pad) / n, (x + 1 + pad) / n, (y + 1 + pad) / n)
+        clipped = shapely.clip_by_rect(_zoom_geoms[indices], *bounds)
+
+        features = []
+        for i, geom in zip(indices, clipped):
+            if geom is None or geom.is_empty:
+                continue
+            geom_type, commands = encode_geometry(geom, x, y, z)
+            if geom_type is not None:
+                features.append((geom_type, commands, _zoom_props[i]))
+
+        if features:
+            out.append((z, x, y, encode_layer(_zoom_layer, features)))
+    return out
+
+
+def tiles_for_zoom(bboxes: np.ndarray, z: int, buffer: float) -> Dict[Tuple[int, int], List[int]]:
+    """
+    Which features (indices) touch which tile at zoom z, from their world bboxes.
+    """
+    n = 2 ** z
+    pad = buffer / EXTENT
+    tiles: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    x0 = np.clip(np.floor(bboxes[:, 0] * n - pad), 0, n - 1).astype(int)
+    y0 = np.clip(np.floor(bboxes[:, 1] * n - pad), 0, n - 1).astype(int)
+    x1 = np.clip(np.floor(bboxes[:, 2] * n + pad), 0, n - 1).astype(int)
+    y1 = np.clip(np.floor(bboxes[:, 3] * n + pad), 0, n - 1).astype(int)
+    for i in range(len(bboxes)):
+        for x in range(x0[i], x1[i] + 1):
+            for y in range(y0[i], y1[i] + 1):
+                tiles[(x, y)].append(i)
+    return tiles
+
+
+# ----------------- Output -----------------
+
+class DirectorySink:
+    def __init__(self, path: str):
+        self.path = path
+
+    def put(self, z: int, x: int, y: int, data: bytes) -> None:
+        folder = os.path.join(self.path, str(z), str(x))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"{y}.pbf"), "wb") as f:
+            f.write(data)
+
+    def close(self, metadata: dict) -> None:
+        with open(os.path.join(self.path, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+
+class MBTilesSink:
+    def __init__(self, path: str):
+        if os.path.exists(path):
+            os.remove(path)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            """
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+            CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+            """
+        )
+
+    def put(self, z: int, x: int, y: int, data: bytes) -> None:
+        # MBTiles bruker TMS-rekkefølge (y fra bunnen)
+        self.db.execute(
+            "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+            (z, x, (2 ** z - 1) - y, gzip.compress(data)),
+        )
+
+    def close(self, metadata: dict) -> None:
+        rows = {k: v if isinstance(v, str) else json.dumps(v) for k, v in metadata.items()}
+        self.db.executemany("INSERT INTO metadata VALUES (?, ?)", rows.items())
+        self.db.commit()
+        self.db.close()
+
+
+def input_epsg(path: str) -> Optional[int]:
+    """
+    CRS stored in the input (only FlatGeobuf has one; GeoJSON is lon/lat by spec).
+    """
+    if path.endswith(FORMAT_EXTENSIONS["flatgeobuf"]):
+        from flatgeobuf import FlatGeobufReader
+
+        with FlatGeobufReader(path) as reader:
+            return reader.epsg
+    return None
+
+
+def build_tiles(
+    input_path: str,
+    output: str,
+    minzoom: int,
+    maxzoom: int,
+    properties: Optional[List[str]],
+    layer: str,
+    tolerance: float,
+    buffer: float,
+    workers: int,
+) -> Dict[int, int]:
+    epsg = input_epsg(input_path)
+    if epsg not in (None, 4326):
+        raise ValueError(
+            f"{input_path} er i EPSG:{epsg}; vector tiles trenger EPSG:4326 (konverter uten --target-crs)"
+        )
+    feats = list(read_features(input_path))
+
+    geoms = []
+    props = []
+    for f in feats:
+        g = world_geometry(f.get("geometry"))
+        if g is None:
+            continue
+        p = f.get("properties") or {}
+        if properties is not None:
+            p = {k: p[k] for k in properties if k in p}
+        geoms.append(g)
+        props.append(p)
+
+    if not geoms:
+        raise ValueError(f"Fant ingen geometrier i {input_path}")
+
+    bboxes = np.array([geometry_bbox(g) for g in geoms])
+    lonlat_bounds = [
+        float(bboxes[:, 0].min() * 360 - 180),
+        float(math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * bboxes[:, 3].max()))))),
+        float(bboxes[:, 2].max() * 360 - 180),
+        float(math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * bboxes[:, 1].min()))))),
+    ]
+    print(f"Leste {len(geoms)} features fra {input_path}")
+
+    topology = Topology(geoms)
+    sink = MBTilesSink(output) if output.endswith(".mbtiles") else DirectorySink(output)
+    counts = {}
+
+    for z in range(minzoom, maxzoom + 1):
+        # Toleranse i tile-enheter -> verdenskoordinater
+        simple = topology.simplified(tolerance / (EXTENT * 2 ** z)) if tolerance > 0 else geoms
+        shapes = np.array([to_shapely(g) for g in simple], dtype=object)
+
+        tiles = tiles_for_zoom(bboxes, z, buffer)
+        items = [(x, y, np.array(idx)) for (x, y), idx in tiles.items()]
+        batch = max(1, math.ceil(len(items) / (max(workers, 1) * 8)))
+        jobs = [(z, items[i:i + batch]) for i in range(0, len(items), batch)]
+
+        counts[z] = 0
+        if workers > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_zoom_worker,
+                initargs=(shapes, props, layer, buffer),
+            ) as executor:
+                for result in executor.map(_encode_tiles, jobs):
+                    for tile in result:
+                        sink.put(*tile)
+                        counts[z] += 1
+        else:
+            _init_zoom_worker(shapes, props, layer, buffer)
+            for job in jobs:
+                for tile in _encode_tiles(job):
+                    sink.put(*tile)
+                    counts[z] += 1
+
+        print(f"  z{z}: {counts[z]} tiles")
+
+    fields = sorted({k for p in props for k in p})
+    metadata = {
+        "name": layer,
+        "format": "pbf",
+        "minzoom": str(minzoom),
+        "maxzoom": str(maxzoom),
+        "bounds": ",".join(f"{v:.6f}" for v in lonlat_bounds),
+        "center": "{:.6f},{:.6f},{}".format(
+            (lonlat_bounds[0] + lonlat_bounds[2]) / 2, (lonlat_bounds[1] + lonlat_bounds[3]) / 2, minzoom
+        ),
+        "json": json.dumps({
+            "vector_layers": [{
+                "id": layer,
+                "fields": {k: "String" for k in fields},
+                "minzoom": minzoom,
+                "maxzoom": maxzoom,
+            }]
+        }),
+    }
+    sink.close(metadata)
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Lag en z/x/y vector tile-pyramide (MVT) fra GeoJSON/GeoJSONSeq/FlatGeobuf."
+    )
+    ap.add_argument("input", help="Fil fra gml_to_geojson.py / gtfs_to_geojson.py")
+    ap.add_argument("output", help="Mappe (z/x/y.pbf) eller .mbtiles-fil")
+    ap.add_argument("--minzoom", type=int, default=8)
+    ap.add_argument("--maxzoom", type=int, default=14)
+    ap.add_argument(
+        "--properties",
+        nargs="*",
+        default=None,
+        help="Bare ta med disse properties i tiles (f.eks. featureType typeLabel). Standard: alle",
+    )
+    ap.add_argument("--layer", default=None, help="Lagnavn i tiles (standard: filnavnet)")
+    ap.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.0,
+        help="Forenklingstoleranse i tile-enheter (1 = 1/4096 av en tile). 0 = ingen forenkling",
+    )
+    ap.add_argument("--buffer", type=float, default=64, help="Buffer rundt hver tile i tile-enheter")
+    ap.add_argument("--workers", type=int, default=1, help="Antall prosesser (1 = ingen parallellisering)")
+    args = ap.parse_args()
+
+    layer = args.layer or os.path.splitext(os.path.basename(args.input))[0]
+    counts = build_tiles(
+        args.input,
+        args.output,
+        args.minzoom,
+        args.maxzoom,
+        args.properties,
+        layer,
+        args.tolerance,
+        args.buffer,
+        args.workers,
+    )
+    print(f"Skrev {sum(counts.values())} tiles til {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Profiling and progress reporting for the converters (gml_to_geojson.py,
+gtfs_to_geojson.py), turned on with the same flags in both:
+
+- --progress:           a line on stderr every few seconds with features/s,
+                        and percent/ETA when the total (or the share of the
+                        file read so far) is known
+- --profile:            cumulative wall time per stage and counters such as
+                        vertices transformed, printed at the end
+- --profile-json FIL:   the same stage report as JSON
+- --pstats FIL:         the whole run under cProfile (read it with
+                        `python -m pstats FIL`)
+
+The converters call the shared StageTimer around every stage. A disabled
+timer hands out one shared no-op context, so the hooks can stay in the hot
+loop at close to zero cost. Stage times measured in worker processes are
+sent back with the results and added up, so with --workers a stage can add
+up to more than the wall time.
+"""
+from __future__ import annotations
+
+import cProfile
+import json
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("seconds", "name", "start")
+
+    def __init__(self, seconds: Dict[str, float], name: str):
+        self.seconds = seconds
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds[self.name] += time.perf_counter() - self.start
+        return False
+
+
+class StageTimer:
+    """
+    Accumulates wall time per stage name, and named counters.
+
+        with timer("parse"):
+            ...
+        timer.count("vertices", n)
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+
+    def __call__(self, stage: str):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self.seconds, stage)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counts[name] += n
+
+    def add(self, stage: str, seconds: float) -> None:
+        """
+        Adds a duration measured elsewhere (e.g. returned by a worker).
+        """
+        if self.enabled:
+            self.seconds[stage] += seconds
+
+    def iterate(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """
+        Yields from items, timing only the work done to produce each item
+        (e.g. iterparse), not what the caller does with it.
+        """
+        if not self.enabled:
+            yield from items
+            return
+        it = iter(items)
+        seconds = self.seconds
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                seconds[stage] += time.perf_counter() - start
+                return
+            seconds[stage] += time.perf_counter() - start
+            yield item
+
+    def take(self) -> Optional[dict]:
+        """
+        Returns what has been measured so far and starts over
+        (used by worker processes to send their share back with each result).
+        """
+        if not self.enabled:
+            return None
+        out = {"seconds": dict(self.seconds), "counts": dict(self.counts)}
+        self.seconds.clear()
+        self.counts.clear()
+        return out
+
+    def reset(self) -> None:
+        """
+        Forgets everything measured so far (a new run in the same process).
+        """
+        self.seconds.clear()
+        self.counts.clear()
+
+    def merge(self, taken: Optional[dict]) -> None:
+        if not taken:
+            return
+        for name, seconds in taken["seconds"].items():
+            self.seconds[name] += seconds
+        for name, n in taken["counts"].items():
+            self.counts[name] += n
+
+    def as_dict(self) -> Dict[str, float]:
+        return {k: round(v, 4) for k, v in self.seconds.items()}
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}t{seconds // 60 % 60:02d}m"
+
+
+class Progress:
+    """
+    Prints progress to stderr at most every `interval` seconds.
+
+    `total` is the number of items if known up front; otherwise `fraction`
+    can be a function returning how much of the input has been read (0..1),
+    e.g. the file position while streaming. Without either only the count
+    and the rate are shown.
+    """
+
+    def __init__(
+        self,
+        label: str = "features",
+        total: Optional[int] = None,
+        fraction: Optional[Callable[[], float]] = None,
+        interval: float = 2.0,
+        enabled: bool = True,
+    ):
+        self.label = label
+        self.total = total
+        self.fraction = fraction
+        self.interval = interval
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self._next = self.start + interval
+
+    def update(self, done: int) -> None:
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if now < self._next:
+            return
+        self._next = now + self.interval
+        self._print(done, now)
+
+    def finish(self, done: int) -> None:
+        if self.enabled:
+            self._print(done, time.perf_counter(), final=True)
+
+    def _share(self, done: int) -> Optional[float]:
+        if self.total:
+            return min(done / self.total, 1.0)
+        if self.fraction is not None:
+            try:
+                return min(max(self.fraction(), 0.0), 1.0)
+            except (OSError, ValueError):
+                return None
+        return None
+
+    def _print(self, done: int, now: float, final: bool = False) -> None:
+        elapsed = now - self.start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        line = f"  {done:>10} {self.label}  {rate:>9.0f}/s  {format_duration(elapsed)}"
+        share = None if final else self._share(done)
+        if share:
+            line += f"  {100 * share:5.1f}%  ETA {format_duration(elapsed * (1 - share) / share)}"
+        print(line, file=sys.stderr, flush=True)
+
+
+def add_profiling_arguments(ap) -> None:
+    """
+    Adds --progress / --profile / --profile-json / --pstats (same flags in both converters).
+    """
+    ap.add_argument(
+        "--progress",
+        action="store_true",
+        help="Vis fremdrift (features/s, prosent og ETA) på stderr underveis",
+    )
+    ap.add_argument(
+        "--profile",
+        action="store_true",
+        help="Mål tid per steg og antall punkter, og skriv en rapport til slutt",
+    )
+    ap.add_argument(
+        "--profile-json",
+        default=None,
+        metavar="FIL",
+        help="Skriv steg-rapporten som JSON (gir --profile)",
+    )
+    ap.add_argument(
+        "--pstats",
+        default=None,
+        metavar="FIL",
+        help="Kjør under cProfile og lagre statistikken (les med python -m pstats FIL). Bare hovedprosessen",
+    )
+
+
+@contextmanager
+def profile_run(args, timer: StageTimer, name: str) -> Iterator[dict]:
+    """
+    Turns on the timer/cProfile as asked for by the profiling arguments.
+    Yields a dict the converter can fill with totals (features, input, ...),
+    which ends up in the report printed and/or written at the end.
+    The timer starts from zero, so runs that share a process (batch_convert.py
+    reuses its workers) don't add up each other's stages.
+    """
+    timer.reset()
+    timer.enabled = bool(args.profile or args.profile_json)
+    profiler = cProfile.Profile() if args.pstats else None
+    info: dict = {}
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield info
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    seconds = time.perf_counter() - start
+
+    if profiler is not None:
+        profiler.dump_stats(args.pstats)
+        print(f"Skrev cProfile-statistikk til {args.pstats}")
+
+    if not timer.enabled:
+        return
+
+    report = {
+        "converter": name,
+        "wall_seconds": round(seconds, 3),
+        **info,
+        "stages": timer.as_dict(),
+        "counts": dict(timer.counts),
+    }
+    features = info.get("features")
+    if features is not None and seconds > 0:
+        report["features_per_s"] = round(features / seconds, 1)
+
+    print(f"\nProfil ({seconds:.2f} s totalt, steg summert over alle prosesser):")
+    for stage, stage_seconds in sorted(timer.seconds.items(), key=lambda kv: -kv[1]):
+        print(f"  {stage:<24}{stage_seconds:>9.3f} s  {100 * stage_seconds / seconds:>5.1f}%")
+    for counter, n in timer.counts.items():
+        print(f"  {counter:<24}{n:>11}")
+    if "features_per_s" in report:
+        print(f"  {'features/s':<24}{report['features_per_s']:>11}")
+
+    if args.profile_json:
+        with open(args.profile_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Skrev steg-rapport til {args.profile_json}")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Dictionary encoding of feature properties (gml_to_geojson.py --dict-properties).
+
+FKB features repeat the same strings over and over: featureType names,
+codeSpace URLs, navnerom, dates, codes. With the dictionary encoding every
+distinct string value of a key is stored once in a shared lookup table, and
+the features only carry its integer code:
+
+    feature:     {"featureType": 0, "navnerom": 0, "lokalId": "b3f1...", "area_m2": 2500.0}
+    dictionary:  {"keys": {"featureType": ["Alpinbakke", ...], "navnerom": ["http://..."]}}
+
+Rules, so decoding is unambiguous:
+
+- only string values are encoded; numbers and other JSON values stay as they are
+- an int value for a key that is in the dictionary is a code, a string is a
+  literal value
+- a key stops getting new codes when it has `max_values` distinct values
+  (ids and names are mostly unique; coding them would only add a table),
+  values after that are written as literals
+
+The dictionary is written next to the output as <output stem>.dictionary.json.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_MAX_VALUES = 1024
+DICTIONARY_SUFFIX = ".dictionary.json"
+
+
+def dictionary_path(output: str) -> str:
+    """
+    arealbruk.geojson -> arealbruk.dictionary.json
+    """
+    return os.path.splitext(output)[0] + DICTIONARY_SUFFIX
+
+
+def prune_properties(props: dict, keep: Iterable[str], always: Iterable[str] = ("id",)) -> dict:
+    """
+    Only the allow-listed keys (plus `always`), in their original order.
+    """
+    keep = set(keep) | set(always)
+    return {k: v for k, v in props.items() if k in keep}
+
+
+class PropertyDictionary:
+    """
+    Assigns integer codes to string property values while streaming.
+
+        dictionary = PropertyDictionary()
+        for feature in features:
+            writer.write({**feature, "properties": dictionary.encode(feature["properties"])})
+        dictionary.write(dictionary_path(output))
+    """
+
+    def __init__(self, max_values: int = DEFAULT_MAX_VALUES):
+        self.max_values = max_values
+        self._codes: Dict[str, Dict[str, int]] = {}
+        self._values: Dict[str, List[str]] = {}
+        self.encoded = 0
+        self.literal = 0
+
+    def encode(self, props: dict) -> dict:
+        out = {}
+        for key, value in props.items():
+            if not isinstance(value, str):
+                out[key] = value
+                continue
+            codes = self._codes.get(key)
+            if codes is None:
+                codes = self._codes[key] = {}
+                self._values[key] = []
+            code = codes.get(value)
+            if code is None:
+                values = self._values[key]
+                if len(values) >= self.max_values:
+                    out[key] = value
+                    self.literal += 1
+                    continue
+                code = codes[value] = len(values)
+                values.append(value)
+            out[key] = code
+            self.encoded += 1
+        return out
+
+    def to_json(self) -> dict:
+        return {
+            "version": 1,
+            "max_values": self.max_values,
+            "keys": {k: v for k, v in self._values.items() if v},
+        }
+
+    def write(self, path: str) -> int:
+        """
+        Writes the dictionary as compact JSON and returns its size in bytes.
+        """
+        text = json.dumps(self.to_json(), ensure_ascii=False, separators=(",", ":"))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return len(text.encode("utf-8"))
+
+    def stats(self) -> dict:
+        return {
+            "keys": sum(1 for v in self._values.values() if v),
+            "values": sum(len(v) for v in self._values.values()),
+            "encoded": self.encoded,
+            "literal": self.literal,
+        }
+
+
+def load_dictionary(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def decode_properties(props: dict, dictionary: dict) -> dict:
+    """
+    Reverses PropertyDictionary.encode with the loaded dictionary JSON.
+    """
+    keys = dictionary["keys"]
+    out = {}
+    for key, value in props.items():
+        values: Optional[List[str]] = keys.get(key)
+        if values is not None and isinstance(value, int) and not isinstance(value, bool):
+            value = values[value]
+        out[key] = value
+    return out
+
+
+def main():
+    import argparse
+
+    from geojson_writer import FORMAT_EXTENSIONS, open_writer, read_features
+
+    ap = argparse.ArgumentParser(
+        description="Pakk ut en fil skrevet med --dict-properties til vanlige properties."
+    )
+    ap.add_argument("input", help="GeoJSON/GeoJSONSeq/FlatGeobuf med kodede properties")
+    ap.add_argument("output", help="Fil som skrives (samme format som input)")
+    ap.add_argument("--dictionary", default=None, help=f"Ordbok (standard: <input>{DICTIONARY_SUFFIX})")
+    args = ap.parse_args()
+
+    dictionary = load_dictionary(args.dictionary or dictionary_path(args.input))
+    fmt = next((f for f, ext in FORMAT_EXTENSIONS.items() if args.input.endswith(ext)), "geojson")
+    with open_writer(args.output, fmt=fmt) as writer:
+        for feature in read_features(args.input):
+            writer.write({**feature, "properties": decode_properties(feature.get("properties") or {}, dictionary)})
+    print(f"Skrev {writer.count} features til {args.output}")
+
+
+if __name__ == "__main__":
+    main()
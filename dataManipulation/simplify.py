@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Topology-aware line/polygon simplification (Douglas-Peucker on shared arcs).
+
+FKB area layers are a polygon mosaic: neighbours share their boundaries
+vertex for vertex. Simplifying each ring on its own moves those shared
+edges differently on each side and opens gaps/overlaps. Instead I:
+
+1. give every distinct vertex an id (exact coordinate match),
+2. mark junctions: vertices that are visited with different neighbours
+   (where three or more polygons meet, or where a shared edge ends),
+   plus the end points of open lines,
+3. cut every ring/line at the junctions into arcs, and store each arc once
+   in a canonical direction (a shared edge is the same arc for both sides),
+4. simplify each arc once with its end points fixed, and rebuild the rings.
+
+Geometries are the numpy-based ones from gml_to_geojson.source_geometry_from_feature
+(coordinates in the projected source CRS), so the tolerance is in meters.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# One ring/line as a list of (arc index, reversed)
+ArcRefs = List[Tuple[int, bool]]
+
+
+def _part_arrays(geom: Optional[dict]) -> List[Tuple[np.ndarray, bool]]:
+    """
+    (coordinate array, closed) for every ring/line in the geometry.
+    Points are not part of the topology.
+    """
+    if geom is None:
+        return []
+    t = geom["type"]
+    c = geom["coordinates"]
+    if t == "LineString":
+        return [(c, False)]
+    if t == "MultiLineString":
+        return [(line, False) for line in c]
+    if t == "Polygon":
+        return [(ring, True) for ring in c]
+    if t == "MultiPolygon":
+        return [(ring, True) for poly in c for ring in poly]
+    return []
+
+
+def segment_distances(pts: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Distance from each point in pts to the segment a-b.
+    """
+    ab = b - a
+    ap = pts - a
+    len2 = float(ab @ ab)
+    if len2 == 0.0:
+        return np.hypot(ap[:, 0], ap[:, 1])
+    t = np.clip((ap @ ab) / len2, 0.0, 1.0)
+    proj = a + t[:, None] * ab
+    d = pts - proj
+    return np.hypot(d[:, 0], d[:, 1])
+
+
+def douglas_peucker_mask(xy: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Boolean mask of the vertices Douglas-Peucker keeps. End points are always kept.
+    Closed arcs (first == last) are split at the vertex farthest from the start.
+    """
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if n < 3:
+        return keep
+
+    stack = []
+    if np.array_equal(xy[0], xy[-1]):
+        far = 1 + int(np.argmax(np.hypot(*(xy[1:-1] - xy[0]).T)))
+        keep[far] = True
+        stack.extend([(0, far), (far, n - 1)])
+    else:
+        stack.append((0, n - 1))
+
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        d = segment_distances(xy[a + 1:b], xy[a], xy[b])
+        i = int(np.argmax(d))
+        if d[i] > tolerance:
+            m = a + 1 + i
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+
+    return keep
+
+
+class Topology:
+    """
+    Shared-arc topology for a list of source geometries.
+
+    After construction:
+    - vertices: (n, 2) array with every distinct vertex
+    - arcs:     list of vertex-id arrays (each shared edge stored once)
+    - parts:    for every geometry, for every ring/line: list of (arc index, reversed)
+    """
+
+    def __init__(self, geoms: List[Optional[dict]]):
+        self.geoms = geoms
+
+        part_arrays = [_part_arrays(g) for g in geoms]
+        bodies = []
+        closed_flags = []
+        for parts in part_arrays:
+            for xy, closed in parts:
+                # Rings: drop the closing vertex; the topology treats them as cycles
+                body = xy[:-1] if closed and len(xy) > 1 and np.array_equal(xy[0], xy[-1]) else xy
+                bodies.append(np.ascontiguousarray(body, dtype=np.float64))
+                closed_flags.append(closed)
+
+        lengths = np.array([len(b) for b in bodies], dtype=np.int64)
+        offsets = np.zeros(len(bodies) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        if len(bodies) and offsets[-1]:
+            all_xy = np.concatenate(bodies)
+        else:
+            all_xy = np.empty((0, 2), dtype=np.float64)
+
+        # 1) Vertex ids (exact match on the two float64 values)
+        keys = all_xy.view(np.dtype((np.void, 16))).ravel()
+        _, first_idx, ids = np.unique(keys, return_index=True, return_inverse=True)
+        ids = ids.ravel().astype(np.int64)
+        self.vertices = all_xy[first_idx]
+
+        # 2) Junctions
+        self.junction = self._find_junctions(ids, offsets, lengths, closed_flags)
+
+        # 3) Arcs
+        self.arcs: List[np.ndarray] = []
+        self._arc_index: Dict[bytes, int] = {}
+        self.parts: List[List[ArcRefs]] = []
+
+        k = 0
+        for parts in part_arrays:
+            geom_parts = []
+            for _xy, closed in parts:
+                body_ids = ids[offsets[k]:offsets[k + 1]]
+                geom_parts.append(self._cut(body_ids, closed))
+                k += 1
+            self.parts.append(geom_parts)
+
+    def _find_junctions(self, ids, offsets, lengths, closed_flags) -> np.ndarray:
+        junction = np.zeros(len(self.vertices), dtype=bool)
+        if not len(ids):
+            return junction
+
+        nonempty = lengths > 0
+        starts = offsets[:-1][nonempty]
+        ends = offsets[1:][nonempty] - 1
+        closed = np.array(closed_flags, dtype=bool)[nonempty]
+
+        prev_ids = np.roll(ids, 1)
+        next_ids = np.roll(ids, -1)
+        prev_ids[starts] = np.where(closed, ids[ends], -1)
+        next_ids[ends] = np.where(closed, ids[starts], -1)
+
+        # End points of open lines are always junctions
+        junction[ids[starts[~closed]]] = True
+        junction[ids[ends[~closed]]] = True
+
+        # A vertex visited with different neighbour pairs is a junction
+        lo = np.minimum(prev_ids, next_ids)
+        hi = np.maximum(prev_ids, next_ids)
+        visits = np.unique(np.stack([ids, lo, hi], axis=1), axis=0)
+        pair_counts = np.bincount(visits[:, 0], minlength=len(self.vertices))
+        junction |= pair_counts > 1
+        return junction
+
+    def _register(self, arc_ids: np.ndarray) -> Tuple[int, bool]:
+        fwd = arc_ids.tobytes()
+        rev_ids = arc_ids[::-1]
+        rev = rev_ids.tobytes()
+        reversed_ = rev < fwd
+        key = rev if reversed_ else fwd
+        idx = self._arc_index.get(key)
+        if idx is None:
+            idx = self._arc_index[key] = len(self.arcs)
+            self.arcs.append(np.ascontiguousarray(rev_ids if reversed_ else arc_ids))
+        return idx, reversed_
+
+    def _cut(self, body_ids: np.ndarray, closed: bool) -> ArcRefs:
+        if not len(body_ids):
+            return []
+
+        cuts = np.flatnonzero(self.junction[body_ids])
+
+        if closed:
+            if not len(cuts):
+                # Ring without junctions: start at the smallest vertex id so that
+                # identical rings always give the same arc
+                start = int(np.argmin(body_ids))
+                ring = np.concatenate([body_ids[start:], body_ids[:start], body_ids[start:start + 1]])
+                return [self._register(ring)]
+            start = int(cuts[0])
+            ring = np.concatenate([body_ids[start:], body_ids[:start], body_ids[start:start + 1]])
+            cuts = np.append(cuts - start, len(body_ids))
+            return [
+                self._register(ring[a:b + 1])
+                for a, b in zip(cuts[:-1], cuts[1:])
+            ]
+
+        cuts = np.union1d(cuts, [0, len(body_ids) - 1])
+        if len(cuts) == 1:
+            return [self._register(body_ids)]
+        return [
+            self._register(body_ids[a:b + 1])
+            for a, b in zip(cuts[:-1], cuts[1:])
+        ]
+
+    def arc_coordinates(self, arc_index: int) -> np.ndarray:
+        return self.vertices[self.arcs[arc_index]]
+
+    def part_ids(self, refs: ArcRefs, arcs: Optional[List[np.ndarray]] = None) -> np.ndarray:
+        """
+        Vertex ids of one ring/line, rebuilt from its arcs.
+        """
+        arcs = self.arcs if arcs is None else arcs
+        pieces = []
+        for i, (arc, reversed_) in enumerate(refs):
+            a = arcs[arc][::-1] if reversed_ else arcs[arc]
+            pieces.append(a if i == 0 else a[1:])
+        if not pieces:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(pieces)
+
+    def simplified(self, tolerance: float) -> List[Optional[dict]]:
+        """
+        Simplified copies of the input geometries (same structure, source CRS).
+        Rings that collapse below 3 distinct vertices are dropped; a polygon
+        whose exterior collapses becomes None.
+        """
+        arcs = [
+            arc[douglas_peucker_mask(self.vertices[arc], tolerance)]
+            for arc in self.arcs
+        ]
+
+        out = []
+        for geom, parts in zip(self.geoms, self.parts):
+            if geom is None or geom["type"] in ("Point", "MultiPoint"):
+                out.append(geom)
+                continue
+            coords = [self.vertices[self.part_ids(refs, arcs)] for refs in parts]
+            out.append(_rebuild(geom, coords))
+        return out
+
+
+def _valid_ring(xy: np.ndarray) -> bool:
+    return len(xy) >= 4
+
+
+def _rebuild(geom: dict, coords: List[np.ndarray]) -> Optional[dict]:
+    t = geom["type"]
+    if t == "LineString":
+        return {"type": t, "coordinates": coords[0]}
+    if t == "MultiLineString":
+        return {"type": t, "coordinates": coords}
+
+    if t == "Polygon":
+        rings = len(geom["coordinates"])
+        poly = _rebuild_polygon(coords[:rings])
+        return {"type": t, "coordinates": poly} if poly else None
+
+    # MultiPolygon
+    polys = []
+    pos = 0
+    for poly in geom["coordinates"]:
+        rebuilt = _rebuild_polygon(coords[pos:pos + len(poly)])
+        pos += len(poly)
+        if rebuilt:
+            polys.append(rebuilt)
+    return {"type": t, "coordinates": polys} if polys else None
+
+
+def _rebuild_polygon(rings: List[np.ndarray]) -> Optional[List[np.ndarray]]:
+    if not rings or not _valid_ring(rings[0]):
+        return None
+    return [rings[0]] + [r for r in rings[1:] if _valid_ring(r)]
+
+
+def count_vertices(geom: Optional[dict]) -> int:
+    if geom is None:
+        return 0
+    if geom["type"] == "Point":
+        return 1
+    if geom["type"] == "MultiPoint":
+        return len(geom["coordinates"])
+    return sum(len(xy) for xy, _closed in _part_arrays(geom))
+
+
+def tolerance_for_zoom(zoom: int, lat: float, tile_size: int = 256) -> float:
+    """
+    Ground size of one screen pixel (meters) at `zoom` in Web Mercator.
+    Simplifying with this tolerance is invisible at that zoom level.
+    """
+    return 40075016.686 * math.cos(math.radians(lat)) / (tile_size * 2 ** zoom)
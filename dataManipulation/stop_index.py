@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Build-time spatial joins for GTFS stops (used by gtfs_to_geojson.py --stop_attributes).
+
+The app would otherwise buffer/intersect stops against route lines in the
+browser, which Turf does as an O(stops x lines) scan. Here the route shape
+segments and the stops go into shapely STR-trees once, and every stop gets:
+
+- nearest_route_m:  distance in meters to the nearest route shape
+- nearest_route_id: route of that shape (if the shape is mapped to a route)
+- route_ids_nearby: routes with a shape within `radius` meters
+- cluster_id:       stops closer than `cluster_distance` meters (directly or
+                    through a chain of stops) share an id, e.g. the platforms
+                    of one station
+
+Distances are computed in the UTM zone of the feed's center, so they are
+in meters.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+
+def utm_crs_for(lon: float, lat: float) -> str:
+    zone = int((lon + 180) // 6) % 60 + 1
+    return f"EPSG:{(32600 if lat >= 0 else 32700) + zone}"
+
+
+def project(xy: np.ndarray, transformer: Transformer) -> np.ndarray:
+    if not len(xy):
+        return np.empty((0, 2))
+    x, y = transformer.transform(xy[:, 0], xy[:, 1])
+    return np.column_stack([x, y])
+
+
+def connected_labels(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Connected components for n nodes with edges a[i]-b[i].
+    Labels are 0..k-1 in order of each component's first node.
+    """
+    labels = np.arange(n)
+    if len(a):
+        while True:
+            # Pull the smallest label across every edge, then jump pointers
+            low = np.minimum(labels[a], labels[b])
+            before = labels.copy()
+            np.minimum.at(labels, a, low)
+            np.minimum.at(labels, b, low)
+            labels = labels[labels]
+            if np.array_equal(labels, before):
+                break
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.argsort(np.argsort(first))
+    return order[inverse.ravel()]
+
+
+def stop_attributes(
+    stops_lonlat: np.ndarray,
+    shapes,
+    shape_to_route: Optional[Dict[str, str]] = None,
+    radius: float = 50.0,
+    cluster_distance: float = 50.0,
+) -> List[dict]:
+    """
+    Per-stop properties (see module docstring), in the order of stops_lonlat.
+    `shapes` is the ShapeTable from gtfs_to_geojson.read_shapes.
+    """
+    shape_to_route = shape_to_route or {}
+    n = len(stops_lonlat)
+    if not n:
+        return []
+
+    center = stops_lonlat.mean(axis=0)
+    transformer = Transformer.from_crs("EPSG:4326", utm_crs_for(*center), always_xy=True)
+
+    stop_xy = project(stops_lonlat, transformer)
+    points = shapely.points(stop_xy)
+
+    # Route shapes go into the tree as single segments, not whole lines:
+    # a long line has a huge envelope that matches almost every stop
+    counts = np.diff(shapes.offsets)
+    shape_of_row = np.repeat(np.arange(len(counts)), counts)
+    starts = np.flatnonzero(shape_of_row[1:] == shape_of_row[:-1])
+    seg_shape = shape_of_row[starts]
+    shape_routes: List[Optional[str]] = [shape_to_route.get(sid) for sid in shapes.shape_ids]
+
+    out = [{} for _ in range(n)]
+
+    if len(starts):
+        xy = project(shapes.xy, transformer)
+        segments = shapely.linestrings(np.stack([xy[starts], xy[starts + 1]], axis=1))
+        seg_tree = shapely.STRtree(segments)
+
+        # On ties (e.g. duplicate shapes) the shape that comes first in the file wins
+        (stop_idx, seg_idx), dist = seg_tree.query_nearest(points, return_distance=True, all_matches=True)
+        nearest_shape = seg_shape[seg_idx]
+        order = np.lexsort((nearest_shape, stop_idx))
+        first = order[np.r_[True, stop_idx[order][1:] != stop_idx[order][:-1]]]
+        for s, shape, d in zip(stop_idx[first].tolist(), nearest_shape[first].tolist(), dist[first].tolist()):
+            out[s]["nearest_route_m"] = round(d, 1)
+            out[s]["nearest_route_id"] = shape_routes[shape] or ""
+
+        # (stop, shape) pairs within the radius, each pair once
+        stop_idx, seg_idx = seg_tree.query(points, predicate="dwithin", distance=radius)
+        pairs = np.unique(np.stack([stop_idx, seg_shape[seg_idx]], axis=1), axis=0)
+        nearby: List[Dict[str, None]] = [{} for _ in range(n)]
+        for s, shape in pairs.tolist():
+            rid = shape_routes[shape]
+            if rid:
+                nearby[s][rid] = None
+        for s in range(n):
+            out[s]["route_ids_nearby"] = sorted(nearby[s])
+
+    stop_tree = shapely.STRtree(points)
+    a, b = stop_tree.query(points, predicate="dwithin", distance=cluster_distance)
+    for s, label in enumerate(connected_labels(n, a, b).tolist()):
+        out[s]["cluster_id"] = label
+
+    return out
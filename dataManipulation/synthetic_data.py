@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Synthetic FKB-style GML and GTFS feeds of any size, for benchmarks (benchmark.py).
+
+The GML is a mosaic of square polygons in EPSG:25832 around Trondheim, so
+neighbours share their edges the way FKB-Arealbruk does. Each feature has
+the usual FKB attributes (identifikasjon, kvalitet, arealbrukstype with
+codeSpace, some gml:name). A fraction of the features get holes, are
+MultiSurfaces, or are points/lines instead of polygons.
+
+The GTFS feed has shapes, stops, routes, trips and stop_times with the
+column layout of real feeds, written as a directory and/or a zip.
+
+Output is deterministic for a given seed.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import zipfile
+from typing import List, Optional, Tuple
+
+X0, Y0 = 569000.0, 7034000.0
+CELL = 50.0
+LAT0, LON0 = 63.40, 10.35
+
+FEATURE_TYPES = ["Alpinbakke", "SportIdrettPlass", "Park", "Industriområde", "Gravplass"]
+SRS = "urn:ogc:def:crs:EPSG::25832"
+
+GML_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml/3.2" '
+    'xmlns:app="http://skjema.geonorge.no/SOSI/produktspesifikasjon/FKB-Arealbruk/5.0" '
+    'xmlns:xlink="http://www.w3.org/1999/xlink">\n'
+)
+
+
+def _square_ring(i: int, j: int, per_edge: int, dx: float = 0.0) -> List[Tuple[float, float]]:
+    """
+    Closed ring around grid cell (i, j) with per_edge points on every edge.
+    Neighbouring cells produce exactly the same points on their shared edge.
+    """
+    a = (X0 + i * CELL + dx, Y0 + j * CELL)
+    b = (a[0] + CELL, a[1])
+    c = (a[0] + CELL, a[1] + CELL)
+    d = (a[0], a[1] + CELL)
+    pts = []
+    for (ax, ay), (bx, by) in ((a, b), (b, c), (c, d), (d, a)):
+        pts += [(ax + (bx - ax) * k / per_edge, ay + (by - ay) * k / per_edge) for k in range(per_edge)]
+    return pts + [a]
+
+
+def _pos_list(pts) -> str:
+    return '<gml:posList srsDimension="2">' + " ".join(f"{x:.2f} {y:.2f}" for x, y in pts) + "</gml:posList>"
+
+
+def _polygon_xml(ring, holes, gid: str) -> str:
+    inner = "".join(
+        f"<gml:interior><gml:LinearRing>{_pos_list(h)}</gml:LinearRing></gml:interior>" for h in holes
+    )
+    return (
+        f'<gml:Polygon gml:id="{gid}" srsName="{SRS}"><gml:exterior><gml:LinearRing>'
+        f"{_pos_list(ring)}</gml:LinearRing></gml:exterior>{inner}</gml:Polygon>"
+    )
+
+
+def _surface_xml(ring, gid: str) -> str:
+    return (
+        f'<gml:surfaceMember><gml:Surface gml:id="{gid}"><gml:patches><gml:PolygonPatch>'
+        f"<gml:exterior><gml:LinearRing>{_pos_list(ring)}</gml:LinearRing></gml:exterior>"
+        f"</gml:PolygonPatch></gml:patches></gml:Surface></gml:surfaceMember>"
+    )
+
+
+def write_fkb_gml(
+    path: str,
+    features: int,
+    vertices: int = 24,
+    holes: float = 0.1,
+    multisurface: float = 0.1,
+    points: float = 0.05,
+    lines: float = 0.05,
+    seed: int = 1,
+) -> int:
+    """
+    Writes a synthetic FKB GML file and returns the number of polygon ring
+    vertices written (closing vertices included).
+
+    vertices:     points per exterior ring (rounded down to a multiple of 4, plus closing)
+    holes:        fraction of polygons with one hole
+    multisurface: fraction of features written as a two-part MultiSurface
+    points/lines: fraction of features with a Point / LineString geometry
+    """
+    rng = random.Random(seed)
+    side = int(features ** 0.5) + 1
+    per_edge = max(1, vertices // 4)
+    n_vertices = 0
+
+    with open(path, "w", encoding="utf-8") as w:
+        w.write(GML_HEADER)
+        w.write(
+            f'<gml:boundedBy><gml:Envelope srsName="{SRS}"><gml:lowerCorner>{X0} {Y0}</gml:lowerCorner>'
+            f"<gml:upperCorner>{X0 + side * CELL} {Y0 + side * CELL}</gml:upperCorner></gml:Envelope></gml:boundedBy>\n"
+        )
+
+        for k in range(features):
+            i, j = k % side, k // side
+            ftype = FEATURE_TYPES[k % len(FEATURE_TYPES)]
+            ring = _square_ring(i, j, per_edge)
+            minx, miny = ring[0]
+            maxx, maxy = minx + CELL, miny + CELL
+
+            # boundedBy follows the geometry, like in real FKB files
+            r = rng.random()
+            if r < points:
+                minx, miny = maxx, maxy = minx + 5, miny + 5
+                geom = (
+                    f'<app:posisjon><gml:Point gml:id="p{k}" srsName="{SRS}">'
+                    f"<gml:pos>{minx} {miny}</gml:pos></gml:Point></app:posisjon>"
+                )
+            elif r < points + lines:
+                maxy = miny
+                geom = (
+                    f'<app:senterlinje><gml:LineString gml:id="l{k}" srsName="{SRS}">'
+                    f"{_pos_list(ring[:per_edge + 1])}</gml:LineString></app:senterlinje>"
+                )
+            elif r < points + lines + multisurface:
+                # Second part far outside the mosaic, so it doesn't overlap anything
+                far = _square_ring(i, j, per_edge, dx=side * CELL * 2)
+                maxx = far[0][0] + CELL
+                geom = (
+                    f'<app:område><gml:MultiSurface gml:id="m{k}" srsName="{SRS}">'
+                    f"{_surface_xml(ring, f's{k}a')}{_surface_xml(far, f's{k}b')}"
+                    f"</gml:MultiSurface></app:område>"
+                )
+                n_vertices += 2 * len(ring)
+            else:
+                hole = []
+                if rng.random() < holes:
+                    cx, cy = minx + 10, miny + 10
+                    hole = [[(cx, cy), (cx, cy + 5), (cx + 5, cy + 5), (cx + 5, cy), (cx, cy)]]
+                geom = f"<app:område>{_polygon_xml(ring, hole, f'g{k}')}</app:område>"
+                n_vertices += len(ring) + 5 * len(hole)
+
+            gid = f' gml:id="{ftype}.{k}"' if k % 7 else ""
+            name = f"<gml:name>Navn {k}</gml:name>" if k % 4 == 0 else ""
+            w.write(
+                f"<gml:featureMember><app:{ftype}{gid}>"
+                f'<gml:boundedBy><gml:Envelope srsName="{SRS}"><gml:lowerCorner>{minx} {miny}</gml:lowerCorner>'
+                f"<gml:upperCorner>{maxx} {maxy}</gml:upperCorner></gml:Envelope></gml:boundedBy>"
+                f"<app:identifikasjon><app:Identifikasjon><app:lokalId>{k:08d}-abcd</app:lokalId>"
+                f"<app:navnerom>http://data.geonorge.no/SFKB/FKB-Arealbruk/so</app:navnerom>"
+                f"<app:versjonId>2025-02-12</app:versjonId></app:Identifikasjon></app:identifikasjon>"
+                f"<app:oppdateringsdato>2025-02-12T22:59:15</app:oppdateringsdato>"
+                f"<app:kvalitet><app:Posisjonskvalitet><app:datafangstmetode>fot</app:datafangstmetode>"
+                f"<app:nøyaktighet>{rng.randint(10, 60)}</app:nøyaktighet></app:Posisjonskvalitet></app:kvalitet>"
+                f'<app:arealbrukstype codeSpace="http://skjema.geonorge.no/SOSI/kodeliste/arealbruk">{k % 13}</app:arealbrukstype>'
+                f"{name}{geom}</app:{ftype}></gml:featureMember>\n"
+            )
+
+        w.write("</gml:FeatureCollection>\n")
+
+    return n_vertices
+
+
+GTFS_FILES = ("agency.txt", "routes.txt", "stops.txt", "shapes.txt", "trips.txt", "stop_times.txt")
+
+
+def write_gtfs(
+    out_dir: str,
+    shapes: int,
+    points_per_shape: int = 200,
+    stops: int = 1000,
+    trips_per_shape: int = 3,
+    stops_per_trip: int = 10,
+    shapes_per_route: int = 4,
+    zip_path: Optional[str] = None,
+    seed: int = 2,
+) -> dict:
+    """
+    Writes a synthetic GTFS feed to out_dir (and to zip_path if given).
+    Returns the row counts per file.
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    routes = max(1, shapes // shapes_per_route)
+    counts = {}
+
+    def path(name):
+        return os.path.join(out_dir, name)
+
+    with open(path("agency.txt"), "w", encoding="utf-8", newline="") as f:
+        f.write("agency_id,agency_name,agency_url,agency_timezone\n")
+        f.write("ATB,AtB,https://www.atb.no,Europe/Oslo\n")
+    counts["agency.txt"] = 1
+
+    with open(path("routes.txt"), "w", encoding="utf-8", newline="") as f:
+        f.write("route_id,agency_id,route_short_name,route_long_name,route_type\n")
+        for r in range(routes):
+            f.write(f"R{r},ATB,{r},Linje {r},3\n")
+    counts["routes.txt"] = routes
+
+    with open(path("stops.txt"), "w", encoding="utf-8", newline="") as f:
+        f.write("stop_id,stop_name,stop_lat,stop_lon\n")
+        for s in range(stops):
+            f.write(f"NSR:{s},Stopp {s},{LAT0 + rng.random() * 0.1:.6f},{LON0 + rng.random() * 0.2:.6f}\n")
+    counts["stops.txt"] = stops
+
+    with open(path("shapes.txt"), "w", encoding="utf-8", newline="") as f:
+        f.write("shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence,shape_dist_traveled\n")
+        for s in range(shapes):
+            # Every other pair of shapes runs the same path (direction/day variants)
+            base = s // 2
+            lat, lon = LAT0 + (base % 50) * 0.002, LON0 + (base // 50) * 0.002
+            for k in range(points_per_shape):
+                f.write(f"S{s},{lat + k * 1e-4:.6f},{lon + k * 1.2e-4:.6f},{k + 1},{k * 10}\n")
+    counts["shapes.txt"] = shapes * points_per_shape
+
+    trips = 0
+    with open(path("trips.txt"), "w", encoding="utf-8", newline="") as f:
+        f.write("route_id,service_id,trip_id,shape_id\n")
+        for s in range(shapes):
+            for _ in range(trips_per_shape):
+                f.write(f"R{s % routes},WD,T{trips},S{s}\n")
+                trips += 1
+    counts["trips.txt"] = trips
+
+    with open(path("stop_times.txt"), "w", encoding="utf-8", newline="") as f:
+        f.write("trip_id,arrival_time,departure_time,stop_id,stop_sequence\n")
+        for t in range(trips):
+            start = 5 * 3600 + (t * 97) % (18 * 3600)
+            for k in range(stops_per_trip):
+                sec = start + k * 120
+                hhmmss = f"{sec // 3600:02d}:{sec % 3600 // 60:02d}:{sec % 60:02d}"
+                f.write(f"T{t},{hhmmss},{hhmmss},NSR:{(t * 7 + k) % stops},{k + 1}\n")
+    counts["stop_times.txt"] = trips * stops_per_trip
+
+    if zip_path:
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
+            for name in GTFS_FILES:
+                z.write(path(name), name)
+
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lag syntetiske FKB-GML- og GTFS-filer for testing/benchmark.")
+    sub = ap.add_subparsers(dest="kind", required=True)
+
+    g = sub.add_parser("gml", help="FKB-aktig GML")
+    g.add_argument("output")
+    g.add_argument("--features", type=int, default=10_000)
+    g.add_argument("--vertices", type=int, default=24, help="Punkter per ytterring")
+    g.add_argument("--holes", type=float, default=0.1, help="Andel polygoner med hull")
+    g.add_argument("--multisurface", type=float, default=0.1, help="Andel MultiSurface")
+    g.add_argument("--points", type=float, default=0.05, help="Andel punkter")
+    g.add_argument("--lines", type=float, default=0.05, help="Andel linjer")
+    g.add_argument("--seed", type=int, default=1)
+
+    t = sub.add_parser("gtfs", help="GTFS-feed (mappe, og zip med --zip)")
+    t.add_argument("output", help="Mappe")
+    t.add_argument("--zip", default=None, help="Skriv også en zip hit")
+    t.add_argument("--shapes", type=int, default=1000)
+    t.add_argument("--points", type=int, default=200, help="Punkter per shape")
+    t.add_argument("--stops", type=int, default=1000)
+    t.add_argument("--trips-per-shape", type=int, default=3)
+    t.add_argument("--stops-per-trip", type=int, default=10)
+    t.add_argument("--seed", type=int, default=2)
+
+    args = ap.parse_args()
+    if args.kind == "gml":
+        n = write_fkb_gml(
+            args.output, args.features, args.vertices, args.holes,
+            args.multisurface, args.points, args.lines, args.seed,
+        )
+        print(f"Skrev {args.features} features ({n} polygonpunkter) til {args.output}")
+    else:
+        counts = write_gtfs(
+            args.output, args.shapes, args.points, args.stops,
+            args.trips_per_shape, args.stops_per_trip, zip_path=args.zip, seed=args.seed,
+        )
+        print(f"Skrev GTFS til {args.output}: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
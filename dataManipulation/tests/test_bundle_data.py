@@ -0,0 +1,35 @@
+import json
+import os
+import zipfile
+
+from bundle_data import find_inputs, main
+from geojson_writer import write_features
+
+
+def _write_inputs(directory):
+    os.makedirs(directory, exist_ok=True)
+    for name in ("a", "b"):
+        write_features(os.path.join(directory, f"{name}.geojson"), [{
+            "type": "Feature",
+            "properties": {"navn": name},
+            "geometry": {"type": "Point", "coordinates": [10.0, 63.0]},
+        }])
+
+
+def test_rebundling_the_output_directory_skips_bundle_files(tmp_path):
+    data = str(tmp_path / "data")
+    _write_inputs(data)
+    zip_path = str(tmp_path / "data.zip")
+
+    main([data, "--output-dir", data, "--zip", zip_path, "--no-brotli"])
+    first = open(zip_path, "rb").read()
+    main([data, "--output-dir", data, "--zip", zip_path, "--no-brotli"])
+
+    manifest = json.load(open(os.path.join(data, "manifest.json"), encoding="utf-8"))
+    assert sorted(manifest["files"]) == ["a.geojson", "b.geojson"]
+    assert [os.path.basename(p) for p in find_inputs([data])] == ["a.geojson", "b.geojson"]
+    # Same data, same zip
+    assert open(zip_path, "rb").read() == first
+    with zipfile.ZipFile(zip_path) as zf:
+        assert zf.namelist() == ["data/a.geojson", "data/b.geojson"]
+    assert not [n for n in os.listdir(data) if n.endswith(".tmp")]
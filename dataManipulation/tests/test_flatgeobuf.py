@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+from flatgeobuf import FlatGeobufReader, FlatGeobufWriter
+
+
+def _point(i):
+    return {
+        "type": "Feature",
+        "properties": {"id": f"f{i}"},
+        "geometry": {"type": "Point", "coordinates": [10.0 + i / 100, 63.0]},
+    }
+
+
+def test_failed_write_leaves_no_file(tmp_path):
+    path = str(tmp_path / "out.fgb")
+    with pytest.raises(RuntimeError):
+        with FlatGeobufWriter(path) as writer:
+            writer.write(_point(0))
+            raise RuntimeError("stopp")
+    assert os.listdir(tmp_path) == []
+
+
+def test_write_is_readable(tmp_path):
+    path = str(tmp_path / "out.fgb")
+    with FlatGeobufWriter(path, epsg=25832) as writer:
+        for i in range(3):
+            writer.write(_point(i))
+    assert os.listdir(tmp_path) == ["out.fgb"]
+    with FlatGeobufReader(path) as reader:
+        assert reader.features_count == 3
+        assert reader.epsg == 25832
+
+
+def _square(i, j):
+    x, y = 10.0 + i * 0.01, 63.0 + j * 0.01
+    ring = [[x, y], [x + 0.008, y], [x + 0.008, y + 0.008], [x, y + 0.008], [x, y]]
+    return {
+        "type": "Feature",
+        "properties": {"id": f"f{i}_{j}"},
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+    }
+
+
+def _overlaps(feature, bbox):
+    xy = np.asarray(feature["geometry"]["coordinates"][0])
+    return (
+        xy[:, 0].max() >= bbox[0] and xy[:, 0].min() <= bbox[2]
+        and xy[:, 1].max() >= bbox[1] and xy[:, 1].min() <= bbox[3]
+    )
+
+
+@pytest.mark.parametrize("node_size", [2, 16])
+def test_query_matches_brute_force(tmp_path, node_size):
+    path = str(tmp_path / "out.fgb")
+    features = [_square(i, j) for i in range(30) for j in range(20)]
+    with FlatGeobufWriter(path, node_size=node_size) as writer:
+        writer.write_all(features)
+
+    with FlatGeobufReader(path) as reader:
+        for bbox in ([10.05, 63.05, 10.12, 63.08], [10.0, 63.0, 10.0, 63.0], [9.0, 62.0, 9.5, 62.5], [9, 62, 11, 64]):
+            found = sorted(f["properties"]["id"] for f in reader.query(bbox))
+            assert found == sorted(f["properties"]["id"] for f in features if _overlaps(f, bbox))
@@ -0,0 +1,121 @@
+import json
+import os
+
+import pytest
+
+from geojson_writer import FORMAT_EXTENSIONS, FeatureWriter, LayeredWriter, feature_size, open_writer, read_features
+from synthetic_data import write_fkb_gml
+import gml_to_geojson
+
+
+def _features(n):
+    return [
+        {
+            "type": "Feature",
+            "properties": {"id": f"f{i}", "navn": f"Navn {i}"},
+            "geometry": {"type": "Point", "coordinates": [10.0 + i / 100, 63.0]},
+        }
+        for i in range(n)
+    ]
+
+
+def _mixed_features():
+    square = [[10.0, 63.0], [10.1, 63.0], [10.1, 63.1], [10.0, 63.1], [10.0, 63.0]]
+    hole = [[10.02, 63.02], [10.02, 63.04], [10.04, 63.04], [10.04, 63.02], [10.02, 63.02]]
+    shifted = [[x + 0.2, y] for x, y in square]
+    geometries = [
+        {"type": "Point", "coordinates": [10.5, 63.5]},
+        {"type": "LineString", "coordinates": [[10.0, 63.0], [10.2, 63.1], [10.4, 63.0]]},
+        {"type": "Polygon", "coordinates": [square, hole]},
+        {"type": "MultiPolygon", "coordinates": [[square], [shifted, hole]]},
+    ]
+    return [
+        {
+            "type": "Feature",
+            "properties": {"id": f"f{i}", "navn": "Bekk ø", "antall": i, "area_m2": 12.5 * i, "aktiv": i % 2 == 0},
+            "geometry": geom,
+        }
+        for i, geom in enumerate(geometries)
+    ]
+
+
+def test_failed_write_leaves_no_file(tmp_path):
+    path = str(tmp_path / "out.geojson")
+    with pytest.raises(RuntimeError):
+        with FeatureWriter(path) as writer:
+            writer.write_all(_features(3))
+            raise RuntimeError("stopp")
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_write_keeps_previous_output(tmp_path):
+    path = str(tmp_path / "out.geojson")
+    with FeatureWriter(path) as writer:
+        writer.write_all(_features(2))
+    before = open(path, "rb").read()
+    with pytest.raises(RuntimeError):
+        with FeatureWriter(path) as writer:
+            writer.write_all(_features(5))
+            raise RuntimeError("stopp")
+    assert open(path, "rb").read() == before
+    assert os.listdir(tmp_path) == ["out.geojson"]
+
+
+def test_truncated_gml_leaves_no_output(tmp_path):
+    gml = str(tmp_path / "fkb.gml")
+    write_fkb_gml(gml, 300)
+    data = open(gml, "rb").read()
+    with open(gml, "wb") as f:
+        f.write(data[: len(data) * 3 // 5])
+    output = str(tmp_path / "out.geojson")
+
+    with pytest.raises(Exception):
+        gml_to_geojson.main(["--input", gml, "--output", output, "--stream", "--chunk-size", "10"])
+    assert not os.path.exists(output)
+    assert not os.path.exists(output + ".tmp")
+
+
+def test_completed_write_is_valid(tmp_path):
+    path = str(tmp_path / "out.geojson")
+    with FeatureWriter(path) as writer:
+        writer.write_all(_features(4))
+    assert len(json.load(open(path, encoding="utf-8"))["features"]) == 4
+    assert list(read_features(path)) == _features(4)
+
+
+def test_failed_layered_write_leaves_no_files(tmp_path):
+    directory = str(tmp_path / "lag")
+    with pytest.raises(RuntimeError):
+        with LayeredWriter(directory, "navn") as writer:
+            writer.write_all(_features(3))
+            raise RuntimeError("stopp")
+    assert os.listdir(directory) == []
+
+
+def test_layered_write_round_trip(tmp_path):
+    directory = str(tmp_path / "lag")
+    with LayeredWriter(directory, "navn", fmt="geojsonseq") as writer:
+        writer.write_all(_features(3))
+    manifest = writer.manifest
+    assert sorted(os.listdir(directory)) == sorted(
+        [LayeredWriter.MANIFEST_NAME] + [layer["file"] for layer in manifest["layers"]]
+    )
+    back = [f for layer in manifest["layers"] for f in read_features(os.path.join(directory, layer["file"]))]
+    assert sorted(back, key=lambda f: f["properties"]["id"]) == _features(3)
+
+
+@pytest.mark.parametrize("fmt", ["geojson", "geojsonseq", "flatgeobuf"])
+def test_feature_size_matches_write(tmp_path, fmt):
+    path = str(tmp_path / ("out" + FORMAT_EXTENSIONS[fmt]))
+    with open_writer(path, fmt, precision=3) as writer:
+        for feature in _features(3):
+            assert writer.write(feature) == feature_size(feature, fmt, precision=3)
+
+
+@pytest.mark.parametrize("fmt", sorted(FORMAT_EXTENSIONS))
+def test_write_read_round_trip(tmp_path, fmt):
+    path = str(tmp_path / ("out" + FORMAT_EXTENSIONS[fmt]))
+    with open_writer(path, fmt) as writer:
+        writer.write_all(_mixed_features())
+    # FlatGeobuf stores features in Hilbert order
+    assert sorted(read_features(path), key=lambda f: f["properties"]["id"]) == _mixed_features()
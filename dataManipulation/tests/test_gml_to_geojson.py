@@ -0,0 +1,133 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from lxml import etree
+
+import gml_to_geojson
+from gml_to_geojson import classify_feature, feature_crs, parse_coords, source_geometry_from_feature
+from synthetic_data import write_fkb_gml
+
+GML = "http://www.opengis.net/gml/3.2"
+
+
+def _feature(poslist, member_attrs="", geom_attrs=""):
+    xml = f"""<gml:FeatureCollection xmlns:gml="{GML}" xmlns:app="urn:app">
+      <gml:featureMember {member_attrs}><app:Veg><app:senterlinje>
+        <gml:LineString gml:id="l1" {geom_attrs}><gml:posList>{poslist}</gml:posList></gml:LineString>
+      </app:senterlinje></app:Veg></gml:featureMember></gml:FeatureCollection>"""
+    root = etree.fromstring(xml)
+    return root.find(f"{{{GML}}}featureMember")[0]
+
+
+def _coords(feat_el):
+    geom_els, _props = classify_feature(feat_el)
+    src, dim = feature_crs(geom_els, "EPSG:25832")
+    return src, dim, source_geometry_from_feature(feat_el, geom_els, dim)["coordinates"]
+
+
+def test_3d_poslist_in_2d_crs_without_srs_dimension():
+    # 4 punkter x y z = 12 tall: går opp i både 2 og 3, og EPSG:25832 er 2D
+    feat = _feature("1 2 100 3 4 100 5 6 100 7 8 100", geom_attrs='srsName="EPSG:25832"')
+    src, dim, xy = _coords(feat)
+    assert (src, dim) == ("EPSG:25832", None)
+    np.testing.assert_array_equal(xy, [[1, 2], [3, 4], [5, 6], [7, 8]])
+
+
+def test_explicit_srs_dimension_wins_over_the_guess():
+    feat = _feature("1 2 3 4 5 6", geom_attrs='srsName="EPSG:25832" srsDimension="2"')
+    _src, dim, xy = _coords(feat)
+    assert dim == 2
+    np.testing.assert_array_equal(xy, [[1, 2], [3, 4], [5, 6]])
+
+
+def test_srs_name_and_dimension_from_feature_member():
+    feat = _feature("1 2 3 4 5 6", member_attrs='srsName="urn:ogc:def:crs:EPSG::25833" srsDimension="2"')
+    src, dim, xy = _coords(feat)
+    assert (src, dim) == ("EPSG:25833", 2)
+    np.testing.assert_array_equal(xy, [[1, 2], [3, 4], [5, 6]])
+
+
+def test_parse_coords_guess():
+    np.testing.assert_array_equal(parse_coords(np.arange(6.0)), [[0, 1], [3, 4]])
+    np.testing.assert_array_equal(parse_coords(np.arange(4.0)), [[0, 1], [2, 3]])
+    np.testing.assert_array_equal(parse_coords(np.arange(6.0), 2), [[0, 1], [2, 3], [4, 5]])
+
+
+def _convert(tmp_path, *extra, features=200, name="out.geojson"):
+    gml_path = str(tmp_path / "fkb.gml")
+    if not os.path.exists(gml_path):
+        write_fkb_gml(gml_path, features)
+    output = str(tmp_path / name)
+    gml_to_geojson.main(["--input", gml_path, "--output", output, *extra])
+    return output
+
+
+def _ring_from_arcs(refs, arcs):
+    ring = []
+    for ref in refs:
+        arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+        ring.extend(arc if not ring else arc[1:])
+    return ring
+
+
+def _assert_same_ring(ring, expected):
+    # Arcs can start the ring at another vertex (a junction); compare without the closing point
+    ring, expected = np.asarray(ring)[:-1], np.asarray(expected)[:-1]
+    assert ring.shape == expected.shape
+    start = int(np.argmin(np.abs(expected - ring[0]).sum(axis=1)))
+    np.testing.assert_allclose(ring, np.roll(expected, -start, axis=0))
+
+
+def test_cache_export_matches_fresh_run(tmp_path):
+    fresh = open(_convert(tmp_path, "--stream", name="fresh.geojson"), "rb").read()
+    cache = str(tmp_path / "cache")
+    first = _convert(tmp_path, "--stream", "--cache", cache, name="first.geojson")
+    assert os.listdir(cache)
+    second = _convert(tmp_path, "--stream", "--cache", cache, name="second.geojson")
+    assert open(first, "rb").read() == fresh
+    assert open(second, "rb").read() == fresh
+
+
+def test_topojson_decodes_to_the_geojson_geometries(tmp_path):
+    topo_path = str(tmp_path / "out.topojson")
+    output = _convert(tmp_path, "--topojson", topo_path, "--quantization", "0")
+    features = json.load(open(output, encoding="utf-8"))["features"]
+    topo = json.load(open(topo_path, encoding="utf-8"))
+    (objects,) = topo["objects"].values()
+    geometries = objects["geometries"]
+    assert len(geometries) == len(features)
+
+    for obj, feature in zip(geometries, features):
+        geom = feature["geometry"]
+        assert obj["type"] == geom["type"]
+        assert obj["properties"] == feature["properties"]
+        if geom["type"] in ("Point", "MultiPoint"):
+            np.testing.assert_allclose(obj["coordinates"], geom["coordinates"])
+        elif geom["type"] == "LineString":
+            np.testing.assert_allclose(_ring_from_arcs(obj["arcs"], topo["arcs"]), geom["coordinates"])
+        else:
+            polygons = [obj["arcs"]] if geom["type"] == "Polygon" else obj["arcs"]
+            coords = [geom["coordinates"]] if geom["type"] == "Polygon" else geom["coordinates"]
+            for poly_arcs, poly in zip(polygons, coords, strict=True):
+                for refs, ring in zip(poly_arcs, poly, strict=True):
+                    _assert_same_ring(_ring_from_arcs(refs, topo["arcs"]), ring)
+
+
+def test_dissolve_keeps_total_area(tmp_path):
+    shapely = pytest.importorskip("shapely")
+    output = _convert(tmp_path, "--target-crs", "EPSG:25832", "--dissolve", "featureType")
+    features = json.load(open(output, encoding="utf-8"))["features"]
+    dissolved = json.load(open(gml_to_geojson.variant_path(output, "dissolved_featureType"), encoding="utf-8"))["features"]
+
+    by_type = {}
+    for f in features:
+        if f["geometry"]["type"] in ("Polygon", "MultiPolygon"):
+            by_type.setdefault(f["properties"]["featureType"], []).append(shapely.geometry.shape(f["geometry"]))
+    assert [f["properties"]["featureType"] for f in dissolved] == sorted(by_type)
+    for f in dissolved:
+        shapes = by_type[f["properties"]["featureType"]]
+        assert f["properties"]["feature_count"] == len(shapes)
+        expected = shapely.union_all(shapes)
+        assert shapely.geometry.shape(f["geometry"]).symmetric_difference(expected).area < 1e-3 * expected.area
@@ -0,0 +1,59 @@
+import csv
+import os
+from collections import defaultdict
+
+import pytest
+
+import gtfs_to_geojson
+from gtfs_to_geojson import aggregate_stop_times, format_gtfs_time, merge_route_stats, parse_gtfs_time, read_trips
+from synthetic_data import write_gtfs
+
+
+def _brute_force(gtfs_dir, trip_to_route):
+    trips_per_stop = defaultdict(set)
+    first = {}
+    with open(os.path.join(gtfs_dir, "stop_times.txt"), encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            trips_per_stop[row["stop_id"]].add(row["trip_id"])
+            sec = parse_gtfs_time(row["departure_time"])
+            first[row["trip_id"]] = sec if row["trip_id"] not in first else min(first[row["trip_id"]], sec)
+
+    per_route = defaultdict(list)
+    for trip, sec in first.items():
+        per_route[trip_to_route[trip]].append(sec)
+    routes = {
+        rid: {
+            "trip_count": len(secs),
+            "first_departure": format_gtfs_time(min(secs)),
+            "last_departure": format_gtfs_time(max(secs)),
+        }
+        for rid, secs in per_route.items()
+    }
+    return {stop: len(trips) for stop, trips in trips_per_stop.items()}, routes
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_aggregate_stop_times_matches_brute_force(tmp_path, monkeypatch, workers):
+    gtfs_dir = str(tmp_path / "gtfs")
+    write_gtfs(gtfs_dir, shapes=40, points_per_shape=5, stops=50)
+    _shape_to_route, trip_to_route = read_trips(os.path.join(gtfs_dir, "trips.txt"))
+    # Small blocks, so trips are split across blocks (and workers)
+    monkeypatch.setattr(gtfs_to_geojson, "STOP_TIMES_BLOCK_ROWS", 7)
+
+    stop_trips, route_stats = aggregate_stop_times(
+        os.path.join(gtfs_dir, "stop_times.txt"), trip_to_route, workers=workers
+    )
+    assert (stop_trips, route_stats) == _brute_force(gtfs_dir, trip_to_route)
+
+
+def test_merge_route_stats():
+    stats = [
+        {"trip_count": 3, "first_departure": "06:10:00", "last_departure": "22:00:00"},
+        {"trip_count": 2, "first_departure": "05:45:00", "last_departure": "25:30:00"},
+        {"trip_count": 1, "first_departure": "", "last_departure": ""},
+    ]
+    assert merge_route_stats(stats) == {
+        "trip_count": 6, "first_departure": "05:45:00", "last_departure": "25:30:00",
+    }
+    assert merge_route_stats(stats[2:]) == {"trip_count": 1, "first_departure": "", "last_departure": ""}
+    assert merge_route_stats([]) is None
@@ -0,0 +1,34 @@
+import argparse
+import json
+
+from profiling import StageTimer, add_profiling_arguments, profile_run
+
+
+def _run(timer, path, n):
+    ap = argparse.ArgumentParser()
+    add_profiling_arguments(ap)
+    args = ap.parse_args(["--profile-json", str(path)])
+    with profile_run(args, timer, "test") as info:
+        for _ in range(n):
+            with timer("steg"):
+                pass
+            timer.count("punkter", 10)
+        info["features"] = n
+    return json.load(open(path, encoding="utf-8"))
+
+
+def test_profile_counters_do_not_leak_between_runs(tmp_path):
+    timer = StageTimer(enabled=False)
+    first = _run(timer, tmp_path / "a.json", 3)
+    second = _run(timer, tmp_path / "b.json", 2)
+    assert first["counts"] == {"punkter": 30}
+    assert second["counts"] == {"punkter": 20}
+    assert second["stages"]["steg"] <= second["wall_seconds"]
+
+
+def test_take_starts_over():
+    timer = StageTimer()
+    timer.count("punkter", 5)
+    timer.add("steg", 1.5)
+    assert timer.take() == {"seconds": {"steg": 1.5}, "counts": {"punkter": 5}}
+    assert timer.take() == {"seconds": {}, "counts": {}}
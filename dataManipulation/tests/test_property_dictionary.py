@@ -0,0 +1,31 @@
+import json
+
+from property_dictionary import PropertyDictionary, decode_properties, dictionary_path, load_dictionary
+
+
+def _props(i):
+    return {
+        "id": f"id{i}",
+        "featureType": ["Park", "Gravplass", "Idrettsanlegg"][i % 3],
+        "kode": i % 4,
+        "area_m2": 10.5 * i,
+        "aktiv": i % 2 == 0,
+        "navn": None,
+        "bbox": [1, 2, 3, 4],
+    }
+
+
+def test_decode_reverses_encode(tmp_path):
+    dictionary = PropertyDictionary(max_values=5)
+    props = [_props(i) for i in range(20)]
+    encoded = [dictionary.encode(p) for p in props]
+    path = dictionary_path(str(tmp_path / "arealbruk.geojson"))
+    dictionary.write(path)
+
+    # Through JSON, like the files the converter writes
+    loaded = load_dictionary(path)
+    encoded = json.loads(json.dumps(encoded))
+    assert [decode_properties(p, loaded) for p in encoded] == props
+    # featureType got codes, ids passed max_values and are partly literals
+    assert all(isinstance(p["featureType"], int) for p in encoded)
+    assert dictionary.stats()["literal"] == 15
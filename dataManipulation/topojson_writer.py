@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+TopoJSON output built on the shared-arc topology from simplify.py.
+
+In an FKB area layer almost every polygon edge is shared with a neighbour,
+so GeoJSON stores (and the converter reprojects) those coordinates twice.
+Here every arc is stored once and referenced from both sides (~i for the
+reversed direction), and:
+
+- reprojection runs once over Topology.vertices, so every distinct vertex
+  is transformed exactly once no matter how many rings use it,
+- coordinates are quantized to a Q x Q integer grid over the bbox
+  (the "transform" member) and arcs are delta-encoded.
+
+Input geometries are the numpy source-CRS ones from
+gml_to_geojson.source_geometry_from_feature.
+"""
+from __future__ import annotations
+
+import json
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from simplify import Topology, count_vertices
+
+DEFAULT_QUANTIZATION = 100_000
+
+
+def _arc_refs(refs) -> List[int]:
+    # TopoJSON: reversed arc i is written as ~i (= -i - 1)
+    return [~arc if reversed_ else arc for arc, reversed_ in refs]
+
+
+def _geometry_object(geom: Optional[dict], parts, points) -> dict:
+    """
+    One TopoJSON geometry object. `parts` are the arc refs per ring/line from
+    Topology.parts, `points` the encoded positions for Point/MultiPoint.
+    """
+    if geom is None:
+        return {"type": None}
+    t = geom["type"]
+    if t == "Point":
+        return {"type": t, "coordinates": points[0]}
+    if t == "MultiPoint":
+        return {"type": t, "coordinates": points}
+    if t == "LineString":
+        return {"type": t, "arcs": _arc_refs(parts[0])}
+    if t == "MultiLineString":
+        return {"type": t, "arcs": [_arc_refs(p) for p in parts]}
+    if t == "Polygon":
+        return {"type": t, "arcs": [_arc_refs(p) for p in parts]}
+
+    # MultiPolygon: parts is flat over all rings; split per polygon
+    polys = []
+    pos = 0
+    for poly in geom["coordinates"]:
+        polys.append([_arc_refs(p) for p in parts[pos:pos + len(poly)]])
+        pos += len(poly)
+    return {"type": t, "arcs": polys}
+
+
+class _Encoder:
+    """
+    Quantizes lon/lat to the integer grid (or rounds, when quantization is off).
+    """
+
+    def __init__(self, bbox: Sequence[float], quantization: int, precision: Optional[int]):
+        self.quantization = quantization
+        self.precision = precision
+        x0, y0, x1, y1 = bbox
+        if quantization:
+            kx = (x1 - x0) / (quantization - 1) if x1 > x0 else 1.0
+            ky = (y1 - y0) / (quantization - 1) if y1 > y0 else 1.0
+            self.translate = np.array([x0, y0])
+            self.scale = np.array([kx, ky])
+
+    def transform_member(self) -> Optional[dict]:
+        if not self.quantization:
+            return None
+        return {"scale": self.scale.tolist(), "translate": self.translate.tolist()}
+
+    def positions(self, xy: np.ndarray) -> list:
+        if self.quantization:
+            return np.rint((xy - self.translate) / self.scale).astype(np.int64).tolist()
+        if self.precision is not None:
+            xy = np.round(xy, self.precision)
+        return xy.tolist()
+
+    def arc(self, xy: np.ndarray) -> list:
+        if not self.quantization:
+            return self.positions(xy)
+
+        q = np.rint((xy - self.translate) / self.scale).astype(np.int64)
+        # Points that land on the same grid cell add nothing; keep the end points
+        keep = np.ones(len(q), dtype=bool)
+        keep[1:] = np.any(q[1:] != q[:-1], axis=1)
+        keep[-1] = True
+        q = q[keep]
+        delta = q.copy()
+        delta[1:] -= q[:-1]
+        return delta.tolist()
+
+
+def build_topojson(
+    geoms: List[Optional[dict]],
+    properties: List[dict],
+    transformer,
+    object_name: str,
+    quantization: int = DEFAULT_QUANTIZATION,
+    precision: Optional[int] = None,
+    topology: Optional[Topology] = None,
+) -> dict:
+    """
+    TopoJSON Topology dict for source geometries and their properties.
+    A Topology already built for the same geometries (e.g. for --simplify)
+    can be passed in to avoid building it twice.
+    """
+    topology = topology or Topology(geoms)
+
+    # Every distinct vertex is reprojected once; arcs index into this
+    if len(topology.vertices):
+        lon, lat = transformer.transform(topology.vertices[:, 0], topology.vertices[:, 1])
+        vertices = np.column_stack([lon, lat])
+    else:
+        vertices = np.empty((0, 2))
+
+    # Points are not part of the topology; transform them in one call as well
+    point_parts = [
+        g["coordinates"] if g is not None and g["type"] in ("Point", "MultiPoint") else None
+        for g in geoms
+    ]
+    stacked = [p for p in point_parts if p is not None]
+    if stacked:
+        xy = np.concatenate(stacked)
+        lon, lat = transformer.transform(xy[:, 0], xy[:, 1])
+        point_xy = np.column_stack([lon, lat])
+    else:
+        point_xy = np.empty((0, 2))
+
+    used = np.concatenate([vertices[np.concatenate(topology.arcs)] if topology.arcs else vertices[:0], point_xy])
+    if len(used):
+        bbox = [*used.min(axis=0).tolist(), *used.max(axis=0).tolist()]
+    else:
+        bbox = [0.0, 0.0, 0.0, 0.0]
+
+    enc = _Encoder(bbox, quantization, precision)
+    arcs = [enc.arc(vertices[arc]) for arc in topology.arcs]
+
+    objects = []
+    pos = 0
+    for geom, parts, points, props in zip(geoms, topology.parts, point_parts, properties):
+        encoded_points = None
+        if points is not None:
+            encoded_points = enc.positions(point_xy[pos:pos + len(points)])
+            pos += len(points)
+        obj = _geometry_object(geom, parts, encoded_points)
+        if "id" in props:
+            obj["id"] = props["id"]
+        obj["properties"] = props
+        objects.append(obj)
+
+    out = {"type": "Topology"}
+    if enc.transform_member():
+        out["transform"] = enc.transform_member()
+    out["bbox"] = bbox
+    out["objects"] = {object_name: {"type": "GeometryCollection", "geometries": objects}}
+    out["arcs"] = arcs
+    return out
+
+
+def write_topojson(path: str, topo: dict) -> int:
+    """
+    Writes compact TopoJSON and returns the file size in bytes.
+    """
+    text = json.dumps(topo, ensure_ascii=False, separators=(",", ":"))
+    data = text.encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def topology_stats(topology: Topology, geoms: List[Optional[dict]]) -> dict:
+    """
+    Vertex counts before/after sharing: how many coordinates GeoJSON stores,
+    how many distinct vertices there are (= transform work), and arc sharing.
+    """
+    refs = np.bincount(
+        [arc for parts in topology.parts for refs in parts for arc, _r in refs],
+        minlength=len(topology.arcs),
+    ) if topology.arcs else np.zeros(0, dtype=np.int64)
+    return {
+        "vertices": sum(count_vertices(g) for g in geoms),
+        "unique_vertices": int(len(topology.vertices)),
+        "arcs": len(topology.arcs),
+        "shared_arcs": int(np.count_nonzero(refs > 1)),
+    }